@@ -20,4 +20,9 @@ SHC_COLORS = ["#ef0008", "#d67300", "#e7c600", "#0084e7", "#6b6b6b", "#9c21b5",
 IMAGE_PATHS = read_config("images", "app")
 
 APP_CATEGORIES = read_config("stat_categories", "app")
+DERIVED_STATS = read_config("derived_stats", "app")
+TEAM_ROLLUPS = read_config("team_rollups", "app")
+for derived_name, derived_stat in DERIVED_STATS.items():
+    APP_CATEGORIES.setdefault(derived_stat["category"], []).append(derived_name)
+    IMAGE_PATHS[derived_name] = {"img_path": derived_stat["image"]}
 logger = logging.getLogger(__name__)
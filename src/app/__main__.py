@@ -2,9 +2,14 @@
 
 import sys
 
+from src import IMAGE_PATHS
+
 from .app import init_dash_app
+from .sprites import build_sprites, sprites_stale
 
 if __name__ == "__main__":
     check_per_s = float(sys.argv[1])
+    if sprites_stale():
+        build_sprites(IMAGE_PATHS)
     app = init_dash_app(1 / check_per_s)
     app.run_server(port=8050, debug=True)
@@ -0,0 +1,104 @@
+"""This script contains the callbacks of the cross match analytics page."""
+
+import logging
+
+import plotly.express as px
+import plotly.graph_objects as go
+from dash import Input, Output, callback
+
+from src.storage import (
+    final_values_by_lord,
+    months_to_threshold,
+    stat_curves_by_map,
+    stored_maps,
+    values_at_year,
+)
+
+logger = logging.getLogger(__name__)
+
+
+@callback(Output("analytics-maps", "options"), Input("analytics-stat", "id"))
+def list_maps(_) -> list[str]:
+    """Fill the map filter with the maps of all stored matches.
+
+    Returns:
+        list[str]: map names
+    """
+    return stored_maps()
+
+
+@callback(
+    Output("analytics-map-curves", "figure"),
+    Output("analytics-lord-dist", "figure"),
+    Output("analytics-thresholds", "figure"),
+    Input("analytics-stat", "value"),
+    Input("analytics-maps", "value"),
+)
+def update_stat_graphs(stat: str, maps: list[str] | None) -> tuple[go.Figure, go.Figure, go.Figure]:
+    """Plot the per map curves, per lord distribution and threshold times of a stat.
+
+    Args:
+        stat (str): selected stat
+        maps (list[str] | None): selected maps, all if empty
+
+    Returns:
+        tuple[go.Figure, go.Figure, go.Figure]: map curves, lord distribution and threshold figures
+    """
+    curves_df = stat_curves_by_map(stat, maps)
+    curves_fig = px.line(
+        curves_df,
+        x="game_year",
+        y="value",
+        color="map_name",
+        hover_data=["num_matches"],
+        title=f"Average {stat} by map",
+        labels={"game_year": "Game year", "value": stat, "map_name": "Map"},
+    )
+    lord_df = final_values_by_lord(stat, maps)
+    lord_fig = px.box(
+        lord_df,
+        x="lord_name",
+        y="final_value",
+        title=f"Final {stat} per lord",
+        labels={"lord_name": "Lord", "final_value": stat},
+    )
+    threshold_df = months_to_threshold(stat, maps)
+    threshold_fig = px.bar(
+        threshold_df.astype({"threshold": str}),
+        x="lord_name",
+        y="months",
+        color="threshold",
+        barmode="group",
+        hover_data=["num_reached"],
+        title=f"Months to reach {stat} thresholds",
+        labels={"lord_name": "Lord", "months": "Months"},
+    )
+    return curves_fig, lord_fig, threshold_fig
+
+
+@callback(
+    Output("analytics-year-dist", "figure"),
+    Input("analytics-stat", "value"),
+    Input("analytics-maps", "value"),
+    Input("analytics-year", "value"),
+)
+def update_year_graph(stat: str, maps: list[str] | None, game_year: int) -> go.Figure:
+    """Plot the distribution of a stat at a given game year.
+
+    Args:
+        stat (str): selected stat
+        maps (list[str] | None): selected maps, all if empty
+        game_year (int): game years since match start
+
+    Returns:
+        go.Figure: histogram per map
+    """
+    year_df = values_at_year(stat, game_year, maps)
+    return px.histogram(
+        year_df,
+        x="value",
+        color="map_name",
+        barmode="overlay",
+        title=f"{stat} at year {game_year}",
+        labels={"value": stat, "map_name": "Map"},
+    )
@@ -0,0 +1,177 @@
+"""This script contains the read-only HTTP API serving the live match history to external clients."""
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import flask
+import pandas as pd
+
+from src.collector import Collector, CollectorPool
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """LRU cache of rendered API responses, valid as long as the history cursor did not move.
+
+    The cache is shared by the requests of all game instances, every access holds `lock`.
+    """
+
+    def __init__(self, max_entries: int = 64) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_entries (int, optional): maximum number of cached responses. Defaults to 64.
+        """
+        self.max_entries = max_entries
+        self.entries: OrderedDict[tuple, tuple[str, str]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple, etag: str) -> str | None:
+        """Get a cached response body.
+
+        Args:
+            key (tuple): endpoint and query arguments
+            etag (str): entity tag of the current history
+
+        Returns:
+            str | None: response body, None if not cached for this history
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: tuple, etag: str, body: str) -> None:
+        """Store a response body.
+
+        Args:
+            key (tuple): endpoint and query arguments
+            etag (str): entity tag of the history the body was rendered from
+            body (str): response body
+        """
+        with self.lock:
+            self.entries[key] = (etag, body)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+def cursor_etag(cursor: dict) -> str:
+    """Build the entity tag of a history cursor, changing with every stored tick, lord or map settings change."""
+    return "{instance}-{match}-{layout}-{version}-{meta}".format(**cursor)
+
+
+def render(df: pd.DataFrame, cursor: dict, fmt: str) -> str:
+    """Render a data frame as CSV or as JSON records together with the history cursor.
+
+    Args:
+        df (pd.DataFrame): data to render
+        cursor (dict): history cursor the data was read at
+        fmt (str): `json` or `csv`
+
+    Returns:
+        str: response body
+    """
+    if fmt == "csv":
+        return df.to_csv(index=False)
+    return f'{{"cursor":{json.dumps(cursor)},"data":{df.to_json(orient="records")}}}'
+
+
+def register_api(server: flask.Flask, collectors: CollectorPool, cache: ResponseCache | None = None) -> None:
+    """Add the stats API endpoints to the Flask server of the app.
+
+    All endpoints serve the histories kept by the collectors and never read game memory. Responses
+    carry an ETag derived from the history cursor, so clients polling with `If-None-Match` get an
+    empty 304 response until a new tick was stored. The cursor is read and the body is built while
+    holding the collector lock, a cached body always belongs to the ETag it is stored with. Series
+    accept a `since` tick, the `version` of the returned cursor is the `since` of the next poll.
+
+    Endpoints:
+        /api/instances: process ids of the tracked game instances
+        /api/match: history cursor, lords, map settings and stat columns
+        /api/latest: stats of every lord at the latest tick
+        /api/series/<column>?since=N: one stat of every lord since tick N
+
+    `/api/latest` and `/api/series` return CSV with `format=csv`. All endpoints but `/api/instances`
+    serve the game instance given by the `instance` argument, the first instance by default.
+
+    Args:
+        server (flask.Flask): Flask server of the dash app
+        collectors (CollectorPool): collectors of all game instances
+        cache (ResponseCache | None, optional): cache of rendered responses. Defaults to a new cache.
+    """
+    cache = cache or ResponseCache()
+    mimetypes = {"json": "application/json", "csv": "text/csv"}
+
+    def selected() -> Collector:
+        return collectors.get(flask.request.args.get("instance", type=int))
+
+    def respond(collector: Collector, key: tuple, fmt: str, build: Callable[[dict], str]) -> flask.Response:
+        if fmt not in mimetypes:
+            flask.abort(400, f"Unknown format {fmt}.")
+        key = (collector.pid, *key)
+        with collector.lock:
+            cursor = collector.cursor()
+            etag = cursor_etag(cursor)
+            body = None
+            if etag not in flask.request.if_none_match:
+                body = cache.get(key, etag)
+                if body is None:
+                    body = build(cursor)
+                    cache.put(key, etag, body)
+        if body is None:
+            response = flask.Response(status=304)
+        else:
+            response = flask.Response(body, mimetype=mimetypes[fmt])
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    @server.route("/api/instances")
+    def api_instances() -> flask.Response:
+        return flask.Response(json.dumps({"instances": collectors.instances()}), mimetype="application/json")
+
+    @server.route("/api/match")
+    def api_match() -> flask.Response:
+        collector = selected()
+
+        def build(cursor: dict) -> str:
+            lords = collector.lords.to_json(orient="records")
+            map_settings = collector.map_settings.drop(columns="year_month", errors="ignore").to_json(orient="records")
+            return (
+                f'{{"cursor":{json.dumps(cursor)},"lords":{lords},"map_settings":{map_settings},'
+                f'"columns":{json.dumps(collector.history.columns)}}}'
+            )
+
+        return respond(collector, ("match",), "json", build)
+
+    @server.route("/api/latest")
+    def api_latest() -> flask.Response:
+        collector = selected()
+        fmt = flask.request.args.get("format", "json")
+        return respond(
+            collector,
+            ("latest", fmt),
+            fmt,
+            lambda cursor: render(collector.frame(since=collector.history.latest_time or 0), cursor, fmt),
+        )
+
+    @server.route("/api/series/<column>")
+    def api_series(column: str) -> flask.Response:
+        collector = selected()
+        fmt = flask.request.args.get("format", "json")
+        since = flask.request.args.get("since", type=int)
+        if column not in collector.history.column_index:
+            flask.abort(404, f"Unknown stat {column}.")
+        return respond(
+            collector,
+            ("series", column, since, fmt),
+            fmt,
+            lambda cursor: render(collector.frame([column], since), cursor, fmt),
+        )
@@ -3,22 +3,37 @@
 import dash
 import dash_bootstrap_components as dbc
 import diskcache
-import numpy as np
+import flask
 from dash import dcc, html
 from dash.long_callback import DiskcacheLongCallbackManager
 
-from . import data_callbacks, graph_callbacks, ui_callbacks  # noqa: F401
+from . import (  # noqa: F401
+    analytics_callbacks,
+    data_callbacks,
+    graph_callbacks,
+    ui_callbacks,
+)
+from .api import register_api
+from .sprites import HASHED_NAME
+from .stream import register_stream
+
+ASSET_MAX_AGE = 365 * 24 * 3600
 
 
 def init_dash_app(read_interval: float = 10) -> dash.Dash:
-    """Initialize the dash app with the desired read interval per second.
+    """Initialize the dash app with the desired read interval.
+
+    Ticks of every running game instance are read by a background collector and pushed to the
+    browsers, independent of the number of connected clients.
 
     Args:
-        read_interval (float, optional): ticks of interval component per second. Defaults to 10.
+        read_interval (float, optional): seconds between two reads. Defaults to 10.
 
     Returns:
         dash.Dash: dash app object
     """
+    collectors = data_callbacks.collectors
+    collectors.interval = read_interval
     cache = diskcache.Cache("./cache")
     long_callback_manager = DiskcacheLongCallbackManager(cache)
     app = dash.Dash(
@@ -28,6 +43,25 @@ def init_dash_app(read_interval: float = 10) -> dash.Dash:
         long_callback_manager=long_callback_manager,
         update_title="",
     )
+    register_stream(app.server, collectors)
+    register_api(app.server, collectors)
+
+    @app.server.before_request
+    def start_collector() -> None:
+        # Started with the first request, so only the serving process reads the game
+        collectors.start()
+
+    @app.server.after_request
+    def cache_static_assets(response: flask.Response) -> flask.Response:
+        # Content hashed and fingerprinted assets never change under their url
+        request = flask.request
+        if request.path.startswith("/assets/") and (HASHED_NAME.search(request.path) or "m" in request.args):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = ASSET_MAX_AGE
+            response.cache_control.immutable = True
+        return response
+
     nav_link_style = {
         "margin": "1em 1em",
         "textAlign": "center",
@@ -46,6 +80,12 @@ def init_dash_app(read_interval: float = 10) -> dash.Dash:
                         active="exact",
                         style=nav_link_style,
                     ),
+                    dbc.NavLink(
+                        "Analytics",
+                        href="/analytics",
+                        active="exact",
+                        style=nav_link_style,
+                    ),
                     dbc.NavLink(
                         "Settings",
                         href="/settings",
@@ -55,7 +95,15 @@ def init_dash_app(read_interval: float = 10) -> dash.Dash:
                 ],
                 vertical=False,
                 pills=True,
-            )
+            ),
+            dcc.Dropdown(
+                id="instance-select",
+                placeholder="No game running",
+                clearable=False,
+                persistence=True,
+                persistence_type="session",
+                style={"minWidth": "16em"},
+            ),
         ],
         style={
             "padding-left": "10em",
@@ -71,14 +119,17 @@ def init_dash_app(read_interval: float = 10) -> dash.Dash:
         children=[
             navbar,
             dbc.Row(html.Div(dash.page_container)),
-            dcc.Interval(id="game_read", interval=np.round(1000 * read_interval)),
             dcc.Interval(id="1_min", interval=1000 * 60),
             dcc.Interval(id="10_min", interval=1000 * 10 * 60),
+            dcc.Interval(id="instance_poll", interval=1000 * 5),
             dcc.Store("cards_store_train", storage_type="session"),
             dcc.Store("cards_store_game", storage_type="session"),
             dcc.Store("settings_store", storage_type="session"),
             dcc.Store("game_store", storage_type="memory"),
+            dcc.Store("tick_store", storage_type="memory"),
+            dcc.Store("stream_store", storage_type="memory"),
             dcc.Store("last_tick_store", storage_type="session"),
+            dcc.Store("team_tick_store", storage_type="memory"),
             dcc.Store("lord_store", storage_type="session"),
             dcc.Store("map_store", storage_type="session"),
         ],
@@ -0,0 +1,14 @@
+/* Highlight the clicked stat category and show its stats without a server round-trip. */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    categories: {
+        toggle: function (nClicks, categoryIds, groupIds) {
+            const triggered = dash_clientside.callback_context.triggered;
+            const propId = triggered.length ? triggered[0].prop_id : ".";
+            const clicked = propId.startsWith("{") ? JSON.parse(propId.slice(0, propId.lastIndexOf("."))).index : null;
+            return [
+                categoryIds.map((id) => (id.index === clicked ? "cat-div highlight" : "cat-div")),
+                groupIds.map((id) => (id.index === clicked ? "subcat-group active" : "subcat-group")),
+            ];
+        },
+    },
+});
@@ -0,0 +1,279 @@
+/* Receive the binary tick frames pushed by the server and append new ticks to the stat and team graphs.
+ *
+ * The frame stream is decoded as written by `src/parser/frames.py`: schema records, cursor records
+ * and frames of zigzag varint encoded codes, stored as deltas to the previous frame.
+ */
+const RECONNECT_MS = 2000;
+const FRAME_VERSION = 1;
+const SCHEMA_HEADER_SIZE = 12;
+const CURSOR_HEADER_SIZE = 8;
+const FRAME_HEADER_SIZE = 34;
+// Cursor fields whose change invalidates the graphs, see `RESET_KEYS` in `src/app/stream.py`
+const RESET_KEYS = ["instance", "match", "layout", "meta"];
+// Prefix of the team rollup columns, whose rows are keyed by the team number
+const TEAM_PREFIX = "team:";
+
+function unzigzag(value) {
+    // Plain arithmetic instead of bit operations, which would truncate the values to 32 bits
+    return value % 2 === 0 ? value / 2 : -(value + 1) / 2;
+}
+
+function FrameDecoder() {
+    this.buffer = new Uint8Array(0);
+    this.schemas = {};
+    this.previous = null;
+    this.text = new TextDecoder();
+}
+
+/* Decode all complete records received so far, in stream order. */
+FrameDecoder.prototype.feed = function (chunk) {
+    const buffer = new Uint8Array(this.buffer.length + chunk.length);
+    buffer.set(this.buffer);
+    buffer.set(chunk, this.buffer.length);
+    const view = new DataView(buffer.buffer);
+    const records = [];
+    let pos = 0;
+    while (buffer.length - pos >= 4) {
+        const magic = String.fromCharCode(...buffer.subarray(pos, pos + 4));
+        let end;
+        if (magic === "SCHM") {
+            if (buffer.length - pos < SCHEMA_HEADER_SIZE) break;
+            end = pos + SCHEMA_HEADER_SIZE + view.getUint32(pos + 8, true);
+            if (end > buffer.length) break;
+            const schema = JSON.parse(this.text.decode(buffer.subarray(pos + SCHEMA_HEADER_SIZE, end)));
+            schema.scale = schema.decimals.map((decimals) => 10 ** decimals);
+            this.schemas[view.getUint32(pos + 4, true)] = schema;
+        } else if (magic === "CURS") {
+            if (buffer.length - pos < CURSOR_HEADER_SIZE) break;
+            end = pos + CURSOR_HEADER_SIZE + view.getUint32(pos + 4, true);
+            if (end > buffer.length) break;
+            records.push({cursor: JSON.parse(this.text.decode(buffer.subarray(pos + CURSOR_HEADER_SIZE, end)))});
+        } else if (magic === "SHCF") {
+            if (buffer.length - pos < FRAME_HEADER_SIZE) break;
+            end = pos + FRAME_HEADER_SIZE + view.getUint32(pos + 30, true);
+            if (end > buffer.length) break;
+            const schema = this.schemas[view.getUint32(pos + 6, true)];
+            if (view.getUint8(pos + 4) !== FRAME_VERSION || schema === undefined) {
+                throw new Error("Unsupported frame version or unknown schema.");
+            }
+            const keyframe = view.getUint8(pos + 5) !== 0;
+            const count = view.getUint16(pos + 26, true) * view.getUint16(pos + 28, true);
+            if (!keyframe && (this.previous === null || this.previous.length !== count)) {
+                throw new Error("Delta frame without its preceding frame.");
+            }
+            const codes = new Float64Array(count);
+            let offset = pos + FRAME_HEADER_SIZE;
+            for (let i = 0; i < count; i++) {
+                let value = 0;
+                let scale = 1;
+                let byte;
+                do {
+                    byte = buffer[offset++];
+                    value += (byte & 0x7f) * scale;
+                    scale *= 128;
+                } while (byte >= 0x80);
+                codes[i] = keyframe ? unzigzag(value) : this.previous[i] + unzigzag(value);
+            }
+            this.previous = codes;
+            records.push({
+                time: view.getUint32(pos + 10, true),
+                month: view.getInt32(pos + 14, true),
+                cols: view.getUint16(pos + 28, true),
+                schema: schema,
+                codes: codes,
+            });
+        } else {
+            throw new Error("Corrupt frame stream at offset " + pos + ".");
+        }
+        pos = end;
+    }
+    this.buffer = buffer.slice(pos);
+    return records;
+};
+
+/* Get the stat value of a decoded frame, null if missing. */
+function frameValue(frame, row, col) {
+    const code = frame.codes[row * frame.cols + col];
+    return code === 0 ? null : unzigzag(code - 1) / frame.schema.scale[col];
+}
+
+/* Place a new tick within its game month like the plotted ticks, estimating the ticks of the open
+ * month by the tick count of the previous month. */
+function tickX(monthStarts, time, month) {
+    const start = monthStarts[month] ?? time;
+    const previous = monthStarts[month - 1];
+    const expected = previous !== undefined ? start - previous : time - start + 1;
+    const position = Math.min((time - start) / Math.max(expected, 1), 0.99);
+    const firstDay = new Date(0);
+    firstDay.setUTCFullYear(Math.floor(month / 12), month % 12, 1);
+    const nextDay = new Date(firstDay.getTime());
+    nextDay.setUTCMonth(nextDay.getUTCMonth() + 1);
+    const x = new Date(firstDay.getTime() + (nextDay.getTime() - firstDay.getTime()) * position);
+    return x.toISOString().slice(0, 23);
+}
+
+/* Check whether two cursors describe the same history, apart from the number of ticks. */
+function sameHistory(cursor, other) {
+    return !!cursor && !!other && RESET_KEYS.every((key) => (cursor[key] ?? null) === (other[key] ?? null));
+}
+
+/* A graph extended with one column of the decoded ticks, holding the ticks before `version`. */
+function streamGraph(id, column, version, traceIndex, cursor) {
+    return {id: id, column: column, version: version, traceIndex: traceIndex, cursor: cursor, lastValues: {}};
+}
+
+/* Collect the values of a frame that changed since the last point of every trace of a graph. */
+function collectPoints(graph, record, x, points) {
+    if (record.time < graph.version) {
+        return;
+    }
+    graph.version = record.time + 1;
+    const col = record.schema.columns.indexOf(graph.column);
+    if (col < 0) {
+        return;
+    }
+    for (let row = 0; row < record.codes.length / record.cols; row++) {
+        const index = graph.traceIndex(row + 1);
+        const value = frameValue(record, row, col);
+        if (index === undefined || value === null || graph.lastValues[index] === value) {
+            continue;
+        }
+        graph.lastValues[index] = value;
+        const trace = points[index] || (points[index] = {x: [], y: []});
+        trace.x.push(x);
+        trace.y.push(value);
+    }
+}
+
+function extendGraph(graph, points) {
+    const indices = Object.keys(points);
+    if (indices.length && document.getElementById(graph.id)) {
+        dash_clientside.set_props(graph.id, {
+            extendData: [
+                {x: indices.map((index) => points[index].x), y: indices.map((index) => points[index].y)},
+                indices.map(Number),
+            ],
+        });
+    }
+}
+
+function openFrameStream(instance) {
+    const params = new URLSearchParams({history: 0});
+    if (instance !== null && instance !== undefined) {
+        params.set("instance", instance);
+    }
+    if (window.tickCursor) {
+        params.set("cursor", JSON.stringify(window.tickCursor));
+    }
+    const stream = {controller: new AbortController(), decoder: new FrameDecoder(), monthStarts: {}};
+
+    function reconnect(delay) {
+        window.tickReconnect = setTimeout(function () {
+            if (window.tickStream === stream) {
+                window.tickStream = openFrameStream(instance);
+            }
+        }, delay);
+    }
+
+    function apply(records) {
+        const statPoints = {};
+        const teamPoints = {};
+        let version = null;
+        records.forEach(function (record) {
+            if (record.cursor) {
+                const {cursor, reset, months, starts} = record.cursor;
+                months.forEach((month, i) => (stream.monthStarts[month] = starts[i]));
+                const moved = !window.tickCursor || cursor.version > window.tickCursor.version;
+                window.tickCursor = cursor;
+                if (reset || window.graphStale) {
+                    // The graphs are rebuilt server side, which reconnects the stream with the new cursor
+                    window.graphStale = true;
+                    dash_clientside.set_props("game_store", {data: cursor});
+                } else if (moved) {
+                    version = cursor.version;
+                }
+                return;
+            }
+            if (!(record.month in stream.monthStarts)) {
+                stream.monthStarts[record.month] = record.time;
+            }
+            if (window.graphStale) {
+                return;
+            }
+            const x = tickX(stream.monthStarts, record.time, record.month);
+            collectPoints(window.statGraph, record, x, statPoints);
+            if (window.teamGraph) {
+                collectPoints(window.teamGraph, record, x, teamPoints);
+            }
+        });
+        extendGraph(window.statGraph, statPoints);
+        if (window.teamGraph) {
+            extendGraph(window.teamGraph, teamPoints);
+        }
+        if (version !== null) {
+            dash_clientside.set_props("tick_store", {data: version});
+        }
+    }
+
+    fetch("/stream/frames?" + params.toString(), {signal: stream.controller.signal})
+        .then(async function (response) {
+            if (!response.ok) {
+                throw new Error("Frame stream failed with status " + response.status + ".");
+            }
+            const reader = response.body.getReader();
+            for (;;) {
+                const {done, value} = await reader.read();
+                if (done) {
+                    break;
+                }
+                apply(stream.decoder.feed(value));
+            }
+            // The stream ends after a reset, it is reopened to notice the first ticks of a new match
+            reconnect(0);
+        })
+        .catch(function (error) {
+            // The stream is reopened with the last received cursor, so no tick is appended twice
+            if (error.name !== "AbortError") {
+                reconnect(RECONNECT_MS);
+            }
+        });
+    return stream;
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    stream: {
+        connect: function (lastTick, teamTick, instance) {
+            const [column, cursor] = lastTick || ["popularity", null];
+            const [teamColumn, teamCursor, teams] = teamTick || [null, null, []];
+            if (window.tickStream) {
+                window.tickStream.controller.abort();
+            }
+            clearTimeout(window.tickReconnect);
+            const triggered = (dash_clientside.callback_context || {}).triggered_id;
+            if (triggered !== "team_tick_store" || !window.statGraph) {
+                // A graph built from another game instance is rebuilt from scratch
+                const sameInstance = cursor && typeof cursor === "object" && (cursor.instance ?? null) === (instance ?? null);
+                window.tickCursor = sameInstance ? cursor : null;
+                window.graphStale = !sameInstance;
+                window.statGraph = streamGraph("stat-display", column, sameInstance ? cursor.version : 0, (pId) => pId - 1);
+            }
+            if (triggered !== "last_tick_store" || !window.teamGraph) {
+                const traceIndex = (team) => (teams.indexOf(team) >= 0 ? teams.indexOf(team) : undefined);
+                window.teamGraph = teamTick
+                    ? streamGraph("team-display", TEAM_PREFIX + teamColumn, teamCursor.version, traceIndex, teamCursor)
+                    : null;
+            }
+            // The team graph is extended only while it shows the same history as the stat graph
+            if (window.teamGraph && !sameHistory(window.teamGraph.cursor, window.tickCursor)) {
+                window.teamGraph = null;
+            }
+            // The stream resumes after the last tick of the graph that is behind
+            if (window.tickCursor) {
+                const version = Math.min(window.statGraph.version, window.teamGraph ? window.teamGraph.version : Infinity);
+                window.tickCursor = {...window.tickCursor, version: version};
+            }
+            window.tickStream = openFrameStream(instance);
+            return dash_clientside.no_update;
+        },
+    },
+});
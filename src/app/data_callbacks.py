@@ -1,129 +1,75 @@
 """This script contains the callbacks used in the apps data collection."""
 
 import logging
+from typing import Any
 
-import numpy as np
-import pandas as pd
-from dash import Input, Output, State, callback
+from dash import ClientsideFunction, Input, Output, State, callback, clientside_callback, no_update
 from dash.exceptions import PreventUpdate
 
-from src import PROCESS_NAME
-from src.parser.building import Building
-from src.parser.lord import Lord
-from src.parser.read_data import read_config
-from src.parser.state_machine import StateMachine
-from src.parser.unit import Unit
+from src.collector import CollectorPool
 
 logger = logging.getLogger(__name__)
-build_config = read_config("building", "memory")
-b = Building.from_dict(build_config)
-lord_config = read_config("lord", "memory")
-lord = Lord.from_dict(lord_config)
-unit_config = read_config("unit", "memory")
-unit = Unit.from_dict(unit_config)
-sm = StateMachine()
-
-
-@callback(Output("game_store", "data"), Input("game_read", "n_intervals"), State("game_store", "data"))
-def read_data_from_memory(n_intervals: int, data: list | None) -> list:
-    """Read values from game memory.
+collectors = CollectorPool()
+
+# New ticks are pushed as binary frames, decoded and appended to the stat and team graphs in the
+# browser, the server is only asked to rebuild the graphs through `game_store` when the stream sends
+# a reset record.
+clientside_callback(
+    ClientsideFunction(namespace="stream", function_name="connect"),
+    Output("stream_store", "data"),
+    Input("last_tick_store", "data"),
+    Input("team_tick_store", "data"),
+    Input("instance-select", "value"),
+)
+
+
+@callback(
+    Output("instance-select", "options"),
+    Output("instance-select", "value"),
+    Input("instance_poll", "n_intervals"),
+    State("instance-select", "value"),
+    State("instance-select", "options"),
+)
+def update_instances(_, selected: int | None, current: list[dict] | None) -> tuple[Any, Any]:
+    """List the tracked game instances, keeping the selected one while it is running.
+
+    Unchanged options and selection are not sent back, so the poll does not trigger the callbacks
+    listening to the dropdown.
 
     Args:
-        n_intervals (int): number of intervals passed
-        data (list | None): currently stored game data
+        selected (int | None): selected game process id
+        current (list[dict] | None): current dropdown options
 
     Returns:
-        list: game data
+        tuple[Any, Any]: dropdown options and selected game process id, `no_update` if unchanged
     """
-    data = data or []
-    game_data = pd.DataFrame(data)
-    state = sm.update_state(PROCESS_NAME)
-    if state == "game":
-        lord_glob_df = lord.get_lord_global_stats()
-        lord_det_df = lord.get_lord_detailed_stats()
-        buildings_df = b.calculate_all_stats()
-        unit_df = unit.calculate_units()
-        cur_tick_df = (
-            pd.concat([lord_glob_df, lord_det_df], axis=1)
-            .merge(buildings_df, how="left", on="p_ID")
-            .merge(unit_df, how="left", on="p_ID")
-        )
-        cur_tick_df["time"] = n_intervals
-        game_data = pd.concat(
-            [game_data, cur_tick_df],
-            ignore_index=True,
-        )
-        return game_data.to_dict("records")
-    elif state == "lobby":
-        game_data = pd.DataFrame()
-    return game_data.to_dict("records")
-
-
-@callback(Output("map_store", "data"), Input("game_read", "n_intervals"), State("map_store", "data"))
-def read_map_data_from_memory(n_intervals: int, data: list | None) -> list:
-    """Read values from game memory.
-
-    Args:
-        n_intervals (int): number of intervals passed
-        data (list | None): currently stored game data
-
-    Returns:
-        list: game data
-    """
-    data = data or []
-    map_data = pd.DataFrame(data)
-    state = sm.update_state(PROCESS_NAME)
-    if state == "game":
-        lord_glob_df = lord.get_map_settings()
-        lord_glob_df["end_month"] = lord_glob_df["end_month"] + 1
-        lord_glob_df["start_month"] = lord_glob_df["start_month"] + 1
-        lord_glob_df["year_month"] = (
-            lord_glob_df["end_year"].astype(str) + "-" + lord_glob_df["end_month"].astype(str)
-        ).astype("datetime64[s]")
-        if ((lord_glob_df["start_year"] == 0) | (lord_glob_df["end_year"] == 0)).any():
-            raise PreventUpdate()
-        if not map_data.empty and map_data[lord_glob_df.columns.to_list()].tail(1).reset_index(drop=True).equals(
-            lord_glob_df
-        ):
-            raise PreventUpdate()
-        lord_glob_df["time"] = n_intervals
-        map_data = pd.concat(
-            [map_data, lord_glob_df],
-            ignore_index=True,
-        )
-        return map_data.to_dict("records")
-    elif state == "lobby":
-        map_data = pd.DataFrame()
-    return map_data.to_dict("records")
-
-
-@callback(Output("lord_store", "data"), Input("game_read", "n_intervals"), State("lord_store", "data"))
-def save_lord_names(n_intervals: int, data: list | None) -> list:
-    """Store the lord names into app memory.
+    options: list[dict[str, Any]] = []
+    for pid in collectors.instances():
+        collector = collectors.get(pid)
+        with collector.lock:
+            lord_names = collector.lords["lord_names"]
+        label = f"Game {pid}" + (f" ({lord_names.iloc[0]})" if len(lord_names) else "")
+        options.append({"label": label, "value": pid})
+    values = [option["value"] for option in options]
+    value = selected if selected in values else (values[0] if values else None)
+    return (options if options != current else no_update), (value if value != selected else no_update)
+
+
+@callback(Output("lord_store", "data"), Output("map_store", "data"), Input("game_store", "data"))
+def sync_match_state(cursor: dict | None) -> tuple[list, list]:
+    """Store the lord names and map settings read by the collector into app memory.
 
     Args:
-        n_intervals (int): number of intervals passed
-        data (list | None): last stored lord names
+        cursor (dict | None): history cursor of the last reset record
 
     Raises:
-        PreventUpdate: No update needed
+        PreventUpdate: No history cursor yet
 
     Returns:
-        list: lord names list
+        tuple[list, list]: lord names list and map data
     """
-    if isinstance(data, list) and any(data):
-        old_df = pd.DataFrame(data)
-    else:
-        old_df = pd.DataFrame()
-    state = sm.update_state(PROCESS_NAME)
-    if state != "stats":
-        lord.get_active_lords()
-        if lord.num_lords == 0:
-            raise PreventUpdate()
-        lord.get_lord_names()
-        lord_df = pd.DataFrame(
-            {"p_ID": np.arange(1, lord.num_lords + 1), "lord_names": lord.lord_names, "teams": lord.teams}
-        )
-        if not lord_df.equals(old_df):
-            return lord_df.to_dict("records")
-    raise PreventUpdate()
+    if cursor is None:
+        raise PreventUpdate()
+    collector = collectors.get(cursor.get("instance"))
+    with collector.lock:
+        return collector.lords.to_dict("records"), collector.map_settings.to_dict("records")
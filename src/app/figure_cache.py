@@ -0,0 +1,164 @@
+"""This script contains an LRU cache of the per lord graph traces of each stat column."""
+
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+Traces = dict[int, tuple[np.ndarray, np.ndarray, np.ndarray]]
+
+
+def trace_points(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    """Remove outliers and spread the plotted ticks of every game month evenly over that month.
+
+    Outliers are detected on all ticks, while only ticks with a `year_month` are plotted.
+
+    Args:
+        df (pd.DataFrame): ticks sorted by `p_ID` and `time` with a `year_month` column
+        column (str): stat column to plot
+
+    Returns:
+        pd.DataFrame: `p_ID`, `time`, `x` and `y` of every plotted point
+    """
+    tolerance = 5
+    values = df[column]
+    same_lord = df["p_ID"].shift(1) == df["p_ID"]
+    is_outlier = (
+        ((values.shift(1) - values).abs() > tolerance)
+        & ((values.shift(-1) - values).abs() > tolerance)
+        & ((values.shift(1) - values.shift(-1)).abs() <= tolerance)
+        & same_lord
+    ) | (values > 10**9)
+    df = df.loc[~is_outlier & df["year_month"].notna(), ["p_ID", "time", "year_month", column]]
+    year_month = df["year_month"].astype("datetime64[s]")
+    month_groups = df.groupby(["p_ID", year_month], sort=False)
+    month_pos = month_groups.cumcount() / month_groups["time"].transform("size")
+    month_len = (year_month + pd.DateOffset(months=1)) - year_month
+    return pd.DataFrame(
+        {
+            "p_ID": df["p_ID"].to_numpy(),
+            "time": df["time"].to_numpy(),
+            "x": (year_month + month_len * month_pos).to_numpy(),
+            "y": df[column].to_numpy(dtype=float),
+        }
+    )
+
+
+class CachedTraces:
+    """Traces of one stat column, with the tail that may still change on the next tick."""
+
+    def __init__(self, traces: Traces, version: int, open_from: int, context_from: int) -> None:
+        """Initialize the cache entry.
+
+        Args:
+            traces (Traces): times, x and y values per lord
+            version (int): data version the traces were built from
+            open_from (int): first tick of the last game month, points from here on are rebuilt
+            context_from (int): tick before `open_from`, needed for the outlier check
+        """
+        self.traces = traces
+        self.version = version
+        self.open_from = open_from
+        self.context_from = context_from
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the trace arrays."""
+        return sum(arr.nbytes for trace in self.traces.values() for arr in trace)
+
+
+class FigureCache:
+    """LRU cache of plotted traces keyed by match and stat column, updated incrementally with new ticks.
+
+    The cache is shared by all callback threads, every access holds `lock`.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2**20) -> None:
+        """Initialize the cache.
+
+        Args:
+            max_bytes (int, optional): memory cap of all cached traces. Defaults to 64 MiB.
+        """
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[tuple[tuple, str], CachedTraces] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def traces(self, match_key: tuple, column: str, df: pd.DataFrame, version: int) -> Traces:
+        """Get the traces of a column, building or extending the cached entry as needed.
+
+        Args:
+            match_key (tuple): identifier of the match
+            column (str): stat column to plot
+            df (pd.DataFrame): all ticks of the match sorted by `p_ID` and `time`
+            version (int): data version of `df`, increasing with every new tick
+
+        Returns:
+            Traces: times, x and y values per lord, a copy not changed by later extensions
+        """
+        key = (match_key, column)
+        with self.lock:
+            entry = self.entries.get(key)
+            # A history reset after the version was read leaves no ticks to extend the entry with
+            if entry is None or entry.version > version or not (df["time"] >= entry.context_from).any():
+                entry = self._build(df, column, version)
+                self.entries[key] = entry
+            elif entry.version < version:
+                self._extend(entry, df, column, version)
+            self.entries.move_to_end(key)
+            self._evict()
+            return dict(entry.traces)
+
+    def clear_match(self, match_key: tuple) -> None:
+        """Drop all entries of a match.
+
+        Args:
+            match_key (tuple): identifier of the match
+        """
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == match_key]:
+                del self.entries[key]
+
+    @staticmethod
+    def _open_range(df: pd.DataFrame) -> tuple[int, int]:
+        df = df.dropna(subset=["year_month"])
+        year_month = df["year_month"].astype("datetime64[s]")
+        open_from = int(df.loc[year_month == year_month.max(), "time"].min())
+        before = df.loc[df["time"] < open_from, "time"]
+        return open_from, int(before.max()) if not before.empty else open_from
+
+    def _build(self, df: pd.DataFrame, column: str, version: int) -> CachedTraces:
+        points = trace_points(df, column)
+        traces = {
+            int(p_id): (group["time"].to_numpy(), group["x"].to_numpy(), group["y"].to_numpy())
+            for p_id, group in points.groupby("p_ID")
+        }
+        return CachedTraces(traces, version, *self._open_range(df))
+
+    def _extend(self, entry: CachedTraces, df: pd.DataFrame, column: str, version: int) -> None:
+        window = df.loc[df["time"] >= entry.context_from]
+        points = trace_points(window, column)
+        points = points.loc[points["time"] >= entry.open_from]
+        groups = dict(list(points.groupby("p_ID")))
+        empty = (np.empty(0, int), np.empty(0, "datetime64[s]"), np.empty(0))
+        for p_id in set(entry.traces) | {int(p_id) for p_id in groups}:
+            times, x, y = entry.traces.get(p_id, empty)
+            keep = np.searchsorted(times, entry.open_from)
+            group = groups.get(p_id, points.iloc[:0])
+            entry.traces[p_id] = (
+                np.concatenate((times[:keep], group["time"].to_numpy())),
+                np.concatenate((x[:keep], group["x"].to_numpy())),
+                np.concatenate((y[:keep], group["y"].to_numpy())),
+            )
+        entry.version = version
+        entry.open_from, entry.context_from = self._open_range(window)
+
+    def _evict(self) -> None:
+        total = sum(entry.nbytes for entry in self.entries.values())
+        while total > self.max_bytes and len(self.entries) > 1:
+            key, entry = self.entries.popitem(last=False)
+            total -= entry.nbytes
+            logger.debug(f"Evicted cached traces of {key[1]}.")
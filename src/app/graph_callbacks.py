@@ -3,6 +3,7 @@
 import logging
 
 import dash
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from dash import ALL, Input, Output, State, callback, ctx
@@ -10,7 +11,25 @@ from dash.exceptions import PreventUpdate
 
 from src import SHC_COLORS
 
+from .data_callbacks import collectors
+from .figure_cache import FigureCache
+
 logger = logging.getLogger(__name__)
+figure_cache = FigureCache()
+EVENT_WINDOW = 300
+MAX_SCRUBBER_MARKS = 12
+
+
+def month_starts(months: pd.Series) -> np.ndarray:
+    """Get the first day of game months, in seconds resolution as game years precede the nanosecond range.
+
+    Args:
+        months (pd.Series): game months, year * 12 + zero based month
+
+    Returns:
+        np.ndarray: datetime64[s] dates
+    """
+    return (months.to_numpy(dtype=np.int64) - 1970 * 12).astype("datetime64[M]").astype("datetime64[s]")
 
 
 @callback(
@@ -19,86 +38,58 @@ logger = logging.getLogger(__name__)
     Input("game_store", "data"),
     Input({"type": "graph-switch", "index": ALL}, "n_clicks"),
     State("last_tick_store", "data"),
-    State("lord_store", "data"),
-    State("map_store", "data"),
     State("stat-display", "figure"),
 )
-def update_graph(
-    game_data, _, last_tick_store, lord_data, map_data, current_fig
-) -> tuple[go.Figure | dash.Patch, tuple[str, int]]:
-    """Update the display graph based on game and lord data."""
-    last_tick_store = last_tick_store or ("popularity", None)
-    column, last_tick = last_tick_store
-    figure = go.Figure(current_fig) if current_fig else go.Figure()
+def update_graph(game_data, _, last_tick_store, current_fig) -> tuple[go.Figure | dash.Patch, tuple[str, dict]]:
+    """Rebuild the display graph from the match history.
 
-    if not (game_data and lord_data and ctx.triggered_id and map_data):
+    New ticks are pushed to the browser and appended client side, this callback only runs when
+    the client was asked to rebuild the graph or the stat was switched. The history serves every
+    tick range at the finest retained resolution. Traces are served from the figure cache, so
+    switching back to a recently viewed stat only processes the ticks that arrived since it was
+    last shown. The cache entries are rebuilt whenever older ticks were coarsened, keeping their
+    size bounded like the history itself. The stored cursor is read together with the ticks, so
+    the stream resumes right after the last plotted tick.
+    """
+    last_tick_store = last_tick_store or ("popularity", None)
+    column, shown = last_tick_store
+    if not game_data or not ctx.triggered_id:
         raise PreventUpdate()
-
     if isinstance(ctx.triggered_id, dict):
         column = ctx.triggered_id.get("index", column)
-    map_df = pd.DataFrame(map_data).drop(columns=["map_name", "advantage_setting", "start_year", "start_month"])
-    df: pd.DataFrame = pd.DataFrame(game_data).sort_values(["p_ID", "time"])
-    df = df.merge(pd.DataFrame(lord_data), on="p_ID", how="left")
-
-    # Identify and remove outliers
-    tolerance = 5
-    df["is_outlier"] = (
-        ((df[column].shift(1) - df[column]).abs() > tolerance)
-        & ((df[column].shift(-1) - df[column]).abs() > tolerance)
-        & ((df[column].shift(1) - df[column].shift(-1)).abs() <= tolerance)
-        & (df["p_ID"].shift(1) == df["p_ID"])
-    ) | (df[column] > 10**9)
-    df = df[~df["is_outlier"]].merge(map_df, "left", on="time").dropna(subset=["end_year", "end_month"])
-    if df.empty:
+    collector = collectors.get(game_data.get("instance"))
+    with collector.lock:
+        cursor = collector.cursor()
+        lord_df = collector.lords.set_index("p_ID")
+        df = collector.frame([column])
+    if lord_df.empty or column not in df.columns or df.empty:
         raise PreventUpdate()
-    # Patch or add data to the figure
-    if current_fig is not None and ctx.triggered_id == "game_store":
+    df["year_month"] = month_starts(df["month"])
+    match_key = (cursor["instance"], cursor["match"], cursor["layout"])
+    traces = figure_cache.traces(match_key, column, df, cursor["version"])
+
+    # Patch the new data into the figure, unless the match, the lords or the map settings changed
+    same_match = isinstance(shown, dict) and all(
+        shown.get(key) == cursor.get(key) for key in ("instance", "match", "meta")
+    )
+    if current_fig is not None and ctx.triggered_id == "game_store" and same_match:
         patched_figure = dash.Patch()
-        if last_tick:
-            last_timestamp = pd.Series(
-                [
-                    *(
-                        (map_df.loc[(map_df["time"] == last_tick), "year_month"]).astype("datetime64[s]")
-                        - pd.DateOffset(months=1)
-                    ).values,
-                    map_df.year_month.astype("datetime64[s]").min(),
-                ]
-            ).max()
-
-        for p_id, group in df.groupby("p_ID"):
-            assert isinstance(p_id, int)
-            first_row = group.loc[group.year_month.astype("datetime64[s]") <= last_timestamp]
-            # get size of first row for plot trimming
-            group = group.loc[first_row.iloc[-1].name :]
-            df_first = group["year_month"].drop_duplicates(keep="first")
-            df_last = group["year_month"].drop_duplicates(keep="last")
-            df_dates = pd.concat([df_first.iloc[:1].to_frame(), df_last.iloc[1:].to_frame()]).astype("datetime64[s]")
-            group.loc[:, "year_month"] = group.year_month.drop_duplicates(keep=False)
-            group.loc[df_dates.index, "year_month"] = df_dates
-            group.loc[:, "year_month"] = group["year_month"].astype("datetime64[s]").interpolate("linear")
-            patched_figure["data"][p_id - 1]["x"] = figure["data"][p_id - 1]["x"][0 : first_row.shape[0]]
-            patched_figure["data"][p_id - 1]["y"] = figure["data"][p_id - 1]["y"][0 : first_row.shape[0]]
-            patched_figure["data"][p_id - 1]["x"].extend(group["year_month"].tolist())
-            patched_figure["data"][p_id - 1]["y"].extend(group[column].tolist())
-
-        return patched_figure, (column, df["time"].max())
+        for p_id, (_, x, y) in traces.items():
+            patched_figure["data"][p_id - 1]["x"] = x
+            patched_figure["data"][p_id - 1]["y"] = y
+        return patched_figure, (column, cursor)
+
     figure = go.Figure()
-    for p_id, group in df.groupby("p_ID"):
-        assert isinstance(p_id, int)
-        team = group["teams"].iloc[0] if not group["teams"].isnull().all() else None
+    for p_id, (_, x, y) in traces.items():
+        team = lord_df["teams"].get(p_id)
+        team = team if pd.notna(team) else None
         legendgroup = f"Team {team}" if team else "No team"
-        df_first = group["year_month"].drop_duplicates(keep="first")
-        df_last = group["year_month"].drop_duplicates(keep="last")
-        group["year_month"] = pd.concat([df_first.iloc[:-1].to_frame(), df_last.iloc[-1:].to_frame()]).astype(
-            "datetime64[s]"
-        )
-        group["year_month"] = group["year_month"].interpolate()
         figure.add_trace(
             go.Scatter(
-                x=group["year_month"],
-                y=group[column],
+                x=x,
+                y=y,
                 mode="lines",
-                name=group["lord_names"].iloc[0],
+                name=lord_df["lord_names"].get(p_id),
                 marker_color=SHC_COLORS[p_id - 1],
                 legendgroup=legendgroup,
                 legendgrouptitle_text=legendgroup,
@@ -115,8 +106,6 @@ def update_graph(
     )
     figure.update_xaxes(
         tickmode="auto",  # Automatically adjust tick frequency
-        tickvals=df["time"],  # Use numeric values for tick positions
-        ticktext=df["year_month"],  # Map numeric values to 'year-month' labels
         tickformatstops=[
             # Show the year-month format for larger time intervals (e.g., months or years)
             dict(dtickrange=["M1", "M12"], value="%b-%Y"),
@@ -124,4 +113,226 @@ def update_graph(
         ],
     )
 
-    return figure, (column, df["time"].max())
+    return figure, (column, cursor)
+
+
+@callback(
+    Output("team-display", "figure"),
+    Output("team_tick_store", "data"),
+    Input("last_tick_store", "data"),
+    Input("team-stat", "value"),
+    State("instance-select", "value"),
+)
+def update_team_graph(
+    last_tick_store, column: str, instance: int | None
+) -> tuple[go.Figure, tuple[str, dict, list[int]]]:
+    """Plot a team rollup series, served from the figure cache like the per lord series.
+
+    New team ticks are pushed over the frame stream together with the lord ticks and appended
+    client side, the graph is only rebuilt together with the stat graph or when another column is
+    selected.
+
+    Args:
+        last_tick_store: column and cursor of the stat graph
+        column (str): team total or average column
+        instance (int | None): selected game instance
+
+    Raises:
+        PreventUpdate: No team tick stored yet
+
+    Returns:
+        tuple[go.Figure, tuple[str, dict, list[int]]]: team series figure, and the column, cursor and
+            team of every trace for the stream
+    """
+    if last_tick_store is None:
+        raise PreventUpdate()
+    collector = collectors.get(instance)
+    team_history = collector.team_history
+    with collector.lock:
+        cursor = collector.cursor()
+        match_key = ("teams", cursor["instance"], team_history.match_id, team_history.layout_version)
+        df = collector.team_frame([column])
+    if column not in df.columns or df.empty:
+        raise PreventUpdate()
+    df["year_month"] = month_starts(df["month"])
+    traces = figure_cache.traces(match_key, column, df.rename(columns={"team": "p_ID"}), cursor["version"])
+    figure = go.Figure()
+    for team, (_, x, y) in traces.items():
+        figure.add_trace(go.Scatter(x=x, y=y, mode="lines", name=f"Team {team}", marker_color=SHC_COLORS[team - 1]))
+    figure.update_layout(title=f"{column} per team", yaxis_title=column, hovermode="x unified")
+    return figure, (column, cursor, list(traces))
+
+
+@callback(Output("heatmap-player", "options"), Input("lord_store", "data"))
+def update_heatmap_players(lord_data: list | None) -> list[dict]:
+    """List the lords selectable for the unit heatmap.
+
+    Args:
+        lord_data (list | None): stored lord names
+
+    Returns:
+        list[dict]: dropdown options
+    """
+    return [{"label": row["lord_names"], "value": row["p_ID"]} for row in lord_data or []]
+
+
+@callback(
+    Output("unit-heatmap", "figure"),
+    Input("tick_store", "data"),
+    Input("heatmap-player", "value"),
+    State("instance-select", "value"),
+)
+def update_heatmap(_, p_id: int | None, instance: int | None) -> go.Figure:
+    """Plot the unit position heatmap of one lord or of all lords.
+
+    Args:
+        p_id (int | None): selected lord, all lords if None
+        instance (int | None): selected game instance
+
+    Returns:
+        go.Figure: heatmap figure
+    """
+    collector = collectors.get(instance)
+    heatmap = collector.heatmap
+    with collector.lock:
+        grid = heatmap.grid(p_id).copy()
+    color = SHC_COLORS[p_id - 1] if p_id else "#000000"
+    figure = go.Figure(
+        go.Heatmap(
+            z=grid,
+            x=(heatmap.x_edges[:-1] + heatmap.x_edges[1:]) / 2,
+            y=(heatmap.y_edges[:-1] + heatmap.y_edges[1:]) / 2,
+            colorscale=[[0, "rgba(255, 255, 255, 0)"], [1, color]],
+            showscale=False,
+        )
+    )
+    figure.update_layout(title="Unit positions", yaxis={"scaleanchor": "x", "autorange": "reversed"})
+    return figure
+
+
+@callback(Output("event-timeline", "figure"), Input("tick_store", "data"), State("instance-select", "value"))
+def update_event_timeline(version: int | None, instance: int | None) -> go.Figure:
+    """Plot the unit and building events of the most recent ticks.
+
+    Args:
+        version (int | None): number of stored ticks
+        instance (int | None): selected game instance
+
+    Raises:
+        PreventUpdate: No tick stored yet
+
+    Returns:
+        go.Figure: event timeline figure
+    """
+    if version is None:
+        raise PreventUpdate()
+    collector = collectors.get(instance)
+    with collector.lock:
+        events = collector.event_frame(since=max(version - EVENT_WINDOW, 0))
+        lord_names = collector.lords.set_index("p_ID")["lord_names"]
+    figure = go.Figure()
+    for event, group in events.groupby("event", observed=True):
+        figure.add_trace(
+            go.Scatter(
+                x=group["time"],
+                y=group["p_ID"].map(lord_names),
+                mode="markers",
+                name=event,
+                marker={"size": 6 + 2 * group["count"].to_numpy() ** 0.5, "opacity": 0.6},
+                customdata=group[["name", "count", "value"]],
+                hovertemplate="%{customdata[1]} %{customdata[0]}<br>hp lost: %{customdata[2]}",
+            )
+        )
+    figure.update_layout(title="Events", xaxis_title="Tick", hovermode="closest")
+    return figure
+
+
+@callback(
+    Output("date-scrubber", "min"),
+    Output("date-scrubber", "max"),
+    Output("date-scrubber", "marks"),
+    Output("date-scrubber", "value"),
+    Input("tick_store", "data"),
+    State("date-scrubber", "min"),
+    State("date-scrubber", "max"),
+    State("date-scrubber", "value"),
+    State("instance-select", "value"),
+)
+def update_date_scrubber(
+    version: int | None, current_min: int, current_max: int, value: list[int] | None, instance: int | None
+) -> tuple[int, int, dict, list[int]]:
+    """Extend the game date scrubber to the months stored so far.
+
+    Args:
+        version (int | None): number of stored ticks
+        current_min (int): first selectable game month
+        current_max (int): last selectable game month
+        value (list[int] | None): selected game months
+        instance (int | None): selected game instance
+
+    Raises:
+        PreventUpdate: No tick stored yet or no new month
+
+    Returns:
+        tuple[int, int, dict, list[int]]: first and last game month, year marks and selected months
+    """
+    collector = collectors.get(instance)
+    with collector.lock:
+        months = collector.history.dates.months.copy()
+    if version is None or not len(months) or (int(months[0]), int(months[-1])) == (current_min, current_max):
+        raise PreventUpdate()
+    first, last = int(months[0]), int(months[-1])
+    years = range(first // 12 + (first % 12 > 0), last // 12 + 1)
+    step = max(len(years) // MAX_SCRUBBER_MARKS, 1)
+    marks = {month: f"{month // 12}-{month % 12 + 1:02d}" for month in (first, last)}
+    marks.update({year * 12: str(year) for year in years[::step]})
+    if not value or value[1] == current_max:
+        # Follow the most recent month unless the user scrubbed back
+        value = [value[0] if value else first, last]
+    return first, last, marks, [min(max(month, first), last) for month in value]
+
+
+@callback(
+    Output("date-compare", "figure"),
+    Input("date-scrubber", "value"),
+    Input("last_tick_store", "data"),
+    State("instance-select", "value"),
+)
+def update_date_compare(
+    value: list[int] | None, last_tick_store: tuple[str, dict] | None, instance: int | None
+) -> go.Figure:
+    """Compare the stats of all lords at the two game dates selected on the scrubber.
+
+    Args:
+        value (list[int] | None): selected game months
+        last_tick_store (tuple[str, dict] | None): stat column shown in the display graph
+        instance (int | None): selected game instance
+
+    Raises:
+        PreventUpdate: No game dates selected yet
+
+    Returns:
+        go.Figure: grouped bar figure of the stat per lord and date
+    """
+    if not value:
+        raise PreventUpdate()
+    column = (last_tick_store or ("popularity", None))[0]
+    collector = collectors.get(instance)
+    with collector.lock:
+        lord_names = collector.lords.set_index("p_ID")["lord_names"]
+        moments = {month: collector.moment(month, [column]) for month in sorted(set(value))}
+    figure = go.Figure()
+    for month, moment in moments.items():
+        if column not in moment.columns:
+            continue
+        figure.add_trace(
+            go.Bar(
+                x=moment["p_ID"].map(lord_names),
+                y=moment[column],
+                name=f"{month // 12}-{month % 12 + 1:02d}",
+                marker_color=[SHC_COLORS[p_id - 1] for p_id in moment["p_ID"]],
+                marker_opacity=1 if month == value[-1] else 0.5,
+            )
+        )
+    figure.update_layout(title=f"{column} by game date", barmode="group", yaxis_title=column)
+    return figure
@@ -0,0 +1,480 @@
+"""Measure how many dashboard viewers one machine can serve by replaying a recorded match.
+
+The dash app is started in a child process, its collector reading the ticks of a capture file
+instead of the game. Every simulated viewer loads the dashboard page, follows the tick stream and
+fires the server callbacks a browser fires on each pushed event, through the real dash endpoints.
+The report lists the throughput and latency percentiles of every callback together with the cpu
+and memory use of the server process.
+
+Usage:
+    python -m src.app.loadtest CAPTURE [--clients N] [--duration SECONDS] [--rate N] [--port N] [--csv PATH]
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import pathlib
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+import psutil
+
+from src.collector import Collector
+from src.parser.capture import CaptureReader
+from src.parser.frames import FrameReader
+from src.parser.state_machine import StateMachine
+
+from .app import init_dash_app
+from .data_callbacks import collectors
+
+logger = logging.getLogger(__name__)
+
+PAGES_CALLBACK = ".._pages_content.children..._pages_store.data.."
+# Instance key of the replayed match, no game process has this id
+REPLAY_INSTANCE = 0
+STREAM_TIMEOUT = 30
+STREAM_READ_BYTES = 2**16
+
+
+class ReplayStateMachine(StateMachine):
+    """Stand-in for the game state machine feeding the records of a capture to the collector's readers.
+
+    Every update loads the next record, once all records were replayed the collector is sent to the
+    lobby and the capture starts over as a new match. Replayed matches are never stored.
+    """
+
+    def __init__(self, collector: Collector, path: str | pathlib.Path) -> None:
+        """Initialize the replay.
+
+        Args:
+            collector (Collector): collector whose readers are fed
+            path (str | pathlib.Path): capture file path
+        """
+        super().__init__()
+        self.collector = collector
+        self.reader = CaptureReader(path)
+        self.offsets = self.reader.record_offsets()
+        self.position = 0
+
+    def update_state(self, process_name: str, pid: int | None = None) -> str:
+        """Load the next record into the readers.
+
+        Args:
+            process_name (str): name of the game process, unused
+            pid (int | None, optional): id of the game process, unused. Defaults to None.
+
+        Returns:
+            str: `game` while records are left, `lobby` after the last record
+        """
+        self.collector.match_saved = True
+        if self.position == len(self.offsets):
+            self.position = 0
+            return "lobby"
+        memory = self.reader.read_record(self.offsets[self.position])[2]
+        self.position += 1
+        self.collector.lord.memory = self.collector.building.memory = self.collector.unit.memory = memory
+        return "game"
+
+
+class LoadStats:
+    """Callback latencies and stream events of all viewers, shared between the viewer threads."""
+
+    def __init__(self) -> None:
+        """Initialize the statistics."""
+        self.lock = threading.Lock()
+        self.calls: list[tuple[str, float, int]] = []
+        self.events = 0
+        self.recording = True
+
+    def add_call(self, name: str, latency: float, status: int) -> None:
+        """Add one callback request.
+
+        Args:
+            name (str): first output of the callback
+            latency (float): seconds until the response was read
+            status (int): HTTP status, 0 if the request failed
+        """
+        if self.recording:
+            with self.lock:
+                self.calls.append((name, latency, status))
+
+    def add_event(self) -> None:
+        """Count one received stream event."""
+        if self.recording:
+            with self.lock:
+                self.events += 1
+
+    def report(self, duration: float) -> pd.DataFrame:
+        """Summarize the callback requests.
+
+        Args:
+            duration (float): seconds the statistics were recorded
+
+        Returns:
+            pd.DataFrame: calls, errors, calls per second and latency percentiles in ms per callback
+        """
+        with self.lock:
+            calls = pd.DataFrame(self.calls, columns=["callback", "latency", "status"])
+        calls["latency"] *= 1000
+        calls["error"] = (calls["status"] == 0) | (calls["status"] >= 400)
+        report = calls.groupby("callback").agg(
+            calls=("latency", "size"),
+            errors=("error", "sum"),
+            p50_ms=("latency", "median"),
+            p95_ms=("latency", lambda latency: np.percentile(latency, 95)),
+            p99_ms=("latency", lambda latency: np.percentile(latency, 99)),
+            max_ms=("latency", "max"),
+        )
+        report.insert(2, "calls_per_s", report["calls"] / duration)
+        return report.sort_values("calls", ascending=False)
+
+
+class ServerMonitor:
+    """Sample the cpu and memory use of the server process once per second."""
+
+    def __init__(self, pid: int) -> None:
+        """Initialize the monitor.
+
+        Args:
+            pid (int): server process id
+        """
+        self.process = psutil.Process(pid)
+        self.cpu: list[float] = []
+        self.rss: list[int] = []
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="server-monitor", daemon=True)
+
+    def run(self) -> None:
+        """Sample until stopped."""
+        self.process.cpu_percent()
+        while not self.stop_event.wait(1.0):
+            try:
+                self.cpu.append(self.process.cpu_percent())
+                self.rss.append(self.process.memory_info().rss)
+            except psutil.NoSuchProcess:
+                return
+
+    def summary(self) -> str:
+        """Summarize the samples.
+
+        Returns:
+            str: mean and max cpu use in percent of one core and resident memory in MiB
+        """
+        cpu = np.array(self.cpu or [0.0])
+        rss = np.array(self.rss or [0]) / 2**20
+        return (
+            f"server cpu mean {cpu.mean():.0f}% max {cpu.max():.0f}%, "
+            f"memory mean {rss.mean():.0f} MiB max {rss.max():.0f} MiB"
+        )
+
+
+def layout_props(node, props: dict[str, dict]) -> None:
+    """Collect the properties of all components with a string id in a serialized layout.
+
+    Args:
+        node: serialized component tree or property value
+        props (dict[str, dict]): properties by component id, updated in place
+    """
+    if isinstance(node, list):
+        for child in node:
+            layout_props(child, props)
+    elif isinstance(node, dict):
+        if "props" in node and "type" in node:
+            if isinstance(node["props"].get("id"), str):
+                props.setdefault(node["props"]["id"], {}).update(node["props"])
+            node = node["props"]
+        for value in node.values():
+            layout_props(value, props)
+
+
+class Viewer:
+    """Headless dashboard client, loading the page and firing callbacks like a browser."""
+
+    def __init__(self, host: str, port: int, dependencies: list[dict], stats: LoadStats) -> None:
+        """Initialize the viewer.
+
+        Args:
+            host (str): server host
+            port (int): server port
+            dependencies (list[dict]): callback definitions served at `/_dash-dependencies`
+            stats (LoadStats): shared statistics
+        """
+        self.host = host
+        self.port = port
+        self.stats = stats
+        # Clientside callbacks and pattern matching outputs only update the browser
+        self.callbacks = [
+            dep for dep in dependencies if dep["clientside_function"] is None and not dep["output"].startswith("..{")
+        ]
+        self.connection = http.client.HTTPConnection(host, port, timeout=STREAM_TIMEOUT)
+        self.props: dict[str, dict] = {}
+
+    def request(self, method: str, path: str, body: dict | None = None) -> tuple[int, dict | None]:
+        """Send a request over the viewer's connection.
+
+        Args:
+            method (str): HTTP method
+            path (str): request path
+            body (dict | None, optional): JSON body. Defaults to None.
+
+        Returns:
+            tuple[int, dict | None]: HTTP status and decoded JSON body, None if the body is not JSON
+        """
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        self.connection.request(method, path, body=json.dumps(body) if body is not None else None, headers=headers)
+        response = self.connection.getresponse()
+        data = response.read()
+        is_json = response.getheader("Content-Type", "").startswith("application/json")
+        return response.status, json.loads(data) if is_json and data else None
+
+    def fire(self, dep: dict, changed: list[str]) -> list[str]:
+        """Call a server callback with the viewer's current property values.
+
+        Args:
+            dep (dict): callback definition
+            changed (list[str]): triggering `id.property` inputs
+
+        Returns:
+            list[str]: `id.property` outputs updated by the response
+        """
+
+        def value(item: dict) -> dict:
+            if item["id"].startswith("{"):
+                return {**item, "value": []}
+            return {**item, "value": self.props.get(item["id"], {}).get(item["property"])}
+
+        outputs = [
+            {"id": output.rsplit(".", 1)[0], "property": output.rsplit(".", 1)[1]}
+            for output in dep["output"].strip(".").split("...")
+        ]
+        body = {
+            "output": dep["output"],
+            "outputs": outputs if dep["output"].startswith("..") else outputs[0],
+            "inputs": [value(item) for item in dep["inputs"]],
+            "state": [value(item) for item in dep["state"]],
+            "changedPropIds": changed,
+        }
+        start = time.perf_counter()
+        try:
+            status, data = self.request("POST", "/_dash-update-component", body)
+        except (OSError, http.client.HTTPException, json.JSONDecodeError) as e:
+            logger.debug(f"Callback {dep['output']} failed: {e}")
+            self.connection.close()
+            status, data = 0, None
+        self.stats.add_call(f"{outputs[0]['id']}.{outputs[0]['property']}", time.perf_counter() - start, status)
+        updated: list[str] = []
+        for component_id, values in ((data or {}).get("response") or {}).items():
+            self.props.setdefault(component_id, {}).update(values)
+            updated.extend(f"{component_id}.{prop}" for prop in values)
+        return updated
+
+    def propagate(self, changed: list[str], initial: bool = False) -> None:
+        """Fire every server callback depending on changed properties, following the updated outputs.
+
+        Args:
+            changed (list[str]): changed `id.property` values
+            initial (bool, optional): fire the callbacks of a newly loaded layout. Defaults to False.
+        """
+        fired = set()
+        while changed or initial:
+            updated = []
+            for dep in self.callbacks:
+                inputs = [f"{item['id']}.{item['property']}" for item in dep["inputs"]]
+                ids = [item["id"] for item in dep["inputs"] if not item["id"].startswith("{")]
+                if dep["output"] in fired or not all(component_id in self.props for component_id in ids):
+                    continue
+                triggered = [prop for prop in inputs if prop in changed]
+                if triggered or (initial and not dep["prevent_initial_call"]):
+                    fired.add(dep["output"])
+                    updated.extend(self.fire(dep, triggered or inputs[:1]))
+            changed, initial = updated, False
+
+    def load(self) -> None:
+        """Load the app shell and the dashboard page and fire the initial callbacks."""
+        self.request("GET", "/")
+        _, app_layout = self.request("GET", "/_dash-layout")
+        layout_props(app_layout, self.props)
+        self.props["_pages_location"] = {"pathname": "/", "search": ""}
+        pages = next(dep for dep in self.callbacks if dep["output"] == PAGES_CALLBACK)
+        self.fire(pages, ["_pages_location.pathname"])
+        layout_props(self.props["_pages_content"].get("children"), self.props)
+        self.propagate([], initial=True)
+
+    def follow(self, stop_event: threading.Event) -> None:
+        """Follow the frame stream until stopped, like the decoder of the dashboard in `stream.js`.
+
+        The stream is reopened with the last received cursor, or with the cursor of the graph once it
+        was rebuilt. A reset record asks for a rebuild, until the graph was rebuilt.
+
+        Args:
+            stop_event (threading.Event): set to stop following
+        """
+        cursor, shown, stale = None, None, True
+        while not stop_event.is_set():
+            built = (self.props.get("last_tick_store", {}).get("data") or (None, None))[1]
+            instance = self.props.get("instance-select", {}).get("value")
+            if built != shown:
+                shown = built
+                cursor = built if isinstance(built, dict) and built.get("instance") == instance else None
+                stale = cursor is None
+            query = {"history": 0, **({"cursor": json.dumps(cursor)} if cursor is not None else {})}
+            if instance is not None:
+                query["instance"] = instance
+            stream = http.client.HTTPConnection(self.host, self.port, timeout=STREAM_TIMEOUT)
+            try:
+                stream.request("GET", "/stream/frames?" + urllib.parse.urlencode(query))
+                response = stream.getresponse()
+                reader = FrameReader()
+                while not stop_event.is_set():
+                    data = response.read1(STREAM_READ_BYTES)
+                    if not data:
+                        break
+                    reader.feed(data)
+                    if reader.cursor is None or reader.cursor["cursor"] == cursor:
+                        continue
+                    self.stats.add_event()
+                    cursor = reader.cursor["cursor"]
+                    if reader.cursor["reset"] or stale:
+                        stale = True
+                        self.props["game_store"] = {"data": cursor}
+                        self.propagate(["game_store.data"])
+                    else:
+                        self.props["tick_store"] = {"data": cursor["version"]}
+                        self.propagate(["tick_store.data"])
+                    if self.props.get("last_tick_store", {}).get("data", (None, None))[1] != shown:
+                        break
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                logger.debug(f"Frame stream closed: {e}")
+            finally:
+                stream.close()
+
+    def run(self, stop_event: threading.Event) -> None:
+        """Load the dashboard and follow the tick stream until stopped.
+
+        Args:
+            stop_event (threading.Event): set to stop the viewer
+        """
+        try:
+            self.load()
+        except (OSError, http.client.HTTPException, StopIteration, KeyError) as e:
+            logger.warning(f"Viewer could not load the dashboard: {e}")
+            return
+        self.follow(stop_event)
+
+
+def wait_for_server(server: subprocess.Popen, host: str, port: int, timeout: float = 120) -> None:
+    """Wait until the server answers requests.
+
+    Args:
+        server (subprocess.Popen): server process
+        host (str): server host
+        port (int): server port
+        timeout (float, optional): maximum seconds to wait. Defaults to 120.
+
+    Raises:
+        RuntimeError: server exited or did not answer within the timeout
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}.")
+        try:
+            connection = http.client.HTTPConnection(host, port, timeout=5)
+            connection.request("GET", "/_dash-dependencies")
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"Server did not answer within {timeout:.0f}s.")
+
+
+def serve(capture: pathlib.Path, port: int, rate: float) -> None:
+    """Run the dash app with its collector replaying a capture instead of reading the game.
+
+    Args:
+        capture (pathlib.Path): capture file path
+        port (int): server port
+        rate (float): replayed ticks per second
+    """
+    app = init_dash_app(1 / rate)
+    collector = Collector.from_configs(1 / rate, REPLAY_INSTANCE)
+    collector.sm = ReplayStateMachine(collector, capture)
+    collectors.add(REPLAY_INSTANCE, collector)
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    app.run(port=port, threaded=True)
+
+
+def load_test(
+    capture: pathlib.Path, clients: int = 8, duration: float = 60, rate: float = 1.0, port: int = 8051
+) -> tuple[pd.DataFrame, str]:
+    """Start a replay server and measure the callbacks of simulated viewers.
+
+    Args:
+        capture (pathlib.Path): capture file path
+        clients (int, optional): number of simulated viewers. Defaults to 8.
+        duration (float, optional): seconds to measure, starting with the page loads. Defaults to 60.
+        rate (float, optional): replayed ticks per second. Defaults to 1.
+        port (int, optional): server port. Defaults to 8051.
+
+    Returns:
+        tuple[pd.DataFrame, str]: callback report, see `LoadStats.report`, and summary of the server resources
+    """
+    host = "127.0.0.1"
+    command = [sys.executable, "-m", "src.app.loadtest", str(capture), "--serve", "--port", str(port)]
+    server = subprocess.Popen([*command, "--rate", str(rate)])
+    try:
+        wait_for_server(server, host, port)
+        connection = http.client.HTTPConnection(host, port)
+        connection.request("GET", "/_dash-dependencies")
+        dependencies = json.loads(connection.getresponse().read())
+        stats = LoadStats()
+        monitor = ServerMonitor(server.pid)
+        stop_event = threading.Event()
+        viewers = [Viewer(host, port, dependencies, stats) for _ in range(clients)]
+        threads = [
+            threading.Thread(target=viewer.run, args=(stop_event,), name=f"viewer-{i}", daemon=True)
+            for i, viewer in enumerate(viewers)
+        ]
+        monitor.thread.start()
+        for thread in threads:
+            thread.start()
+        logger.info(f"Started {clients} viewers, measuring for {duration:.0f}s.")
+        time.sleep(duration)
+        stats.recording = False
+        stop_event.set()
+        monitor.stop_event.set()
+        report = stats.report(duration)
+        summary = (
+            f"{report['calls'].sum()} callbacks ({report['calls'].sum() / duration:.1f}/s), "
+            f"{stats.events} stream events, {monitor.summary()}"
+        )
+        return report, summary
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the dashboard with simulated viewers.")
+    parser.add_argument("capture", type=pathlib.Path)
+    parser.add_argument("--clients", type=int, default=8, help="simulated viewers")
+    parser.add_argument("--duration", type=float, default=60.0, help="seconds to measure")
+    parser.add_argument("--rate", type=float, default=1.0, help="replayed ticks per second")
+    parser.add_argument("--port", type=int, default=8051)
+    parser.add_argument("--csv", type=pathlib.Path, default=None)
+    parser.add_argument("--serve", action="store_true", help="only run the replay server")
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.capture, args.port, args.rate)
+    else:
+        report, summary = load_test(args.capture, args.clients, args.duration, args.rate, args.port)
+        print(report.to_string(float_format=lambda value: f"{value:.1f}"))
+        logger.info(summary)
+        if args.csv is not None:
+            report.to_csv(args.csv)
@@ -0,0 +1,58 @@
+"""This script defines the page layout for the cross match analytics page."""
+
+import dash
+import dash_bootstrap_components as dbc
+from dash import dcc, html
+
+from src import APP_CATEGORIES
+
+dash.register_page(
+    __name__,
+    path="/analytics",
+    name="Analytics",
+    title="Match Analytics",
+    description="Compare stats across all stored matches.",
+)
+
+stat_options = [stat for stats in APP_CATEGORIES.values() for stat in stats]
+
+layout = [
+    dbc.Row(
+        [
+            dbc.Col(
+                [
+                    html.P("Stat"),
+                    dcc.Dropdown(stat_options, "total_gold", id="analytics-stat", clearable=False),
+                ],
+                width=3,
+            ),
+            dbc.Col(
+                [
+                    html.P("Maps"),
+                    dcc.Dropdown([], [], id="analytics-maps", multi=True, placeholder="All maps"),
+                ],
+                width=5,
+            ),
+            dbc.Col(
+                [
+                    html.P("Game year"),
+                    dcc.Slider(0, 20, 1, value=5, id="analytics-year"),
+                ],
+                width=4,
+            ),
+        ],
+        id="analytics-controls",
+    ),
+    dbc.Row(
+        [
+            dbc.Col(dcc.Graph(id="analytics-map-curves"), width=6),
+            dbc.Col(dcc.Graph(id="analytics-lord-dist"), width=6),
+        ]
+    ),
+    dbc.Row(
+        [
+            dbc.Col(dcc.Graph(id="analytics-year-dist"), width=6),
+            dbc.Col(dcc.Graph(id="analytics-thresholds"), width=6),
+        ]
+    ),
+]
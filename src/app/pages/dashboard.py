@@ -4,7 +4,8 @@ import dash
 import dash_bootstrap_components as dbc
 from dash import dcc, html
 
-from src import APP_CATEGORIES, IMAGE_PATHS
+from src import APP_CATEGORIES, IMAGE_PATHS, TEAM_ROLLUPS
+from src.app.sprites import sprite_classes
 
 dash.register_page(
     __name__,
@@ -13,29 +14,80 @@ dash.register_page(
     title="Live Game Stats",
     description="Landing page.",
 )
+SPRITES = sprite_classes()
 
 
+def icon(name: str, class_name: str) -> list:
+    """Build the image and label of a stat category or stat.
+
+    Icons packed into the sprite sheet are drawn from the sheet, others are loaded as image.
+
+    Args:
+        name (str): category or stat name
+        class_name (str): css class of the image and label
+
+    Returns:
+        list: image and label components
+    """
+    img_path = IMAGE_PATHS[name]["img_path"]
+    if img_path in SPRITES:
+        image = html.Div(className=f"{class_name} sprite {SPRITES[img_path]}", role="img", title=name)
+    else:
+        image = html.Img(src=dash.get_relative_path(f"/assets/img/{img_path}"), className=class_name)
+    return [image, html.P(name, className=class_name)]
+
+
+# The category tiles and the stats of every category are built once, selecting a category only
+# switches css classes in the browser, see assets/categories.js.
+CATEGORY_TILES = [
+    dbc.Col(html.Div(icon(col, "category"), id={"type": "col-switch", "index": col}, className="cat-div"), width=2)
+    for col in APP_CATEGORIES
+]
+SUBCATEGORY_GROUPS = [
+    html.Div(
+        [
+            html.Div(icon(sub, "subcategory"), className="subcat-div", id={"type": "graph-switch", "index": sub})
+            for sub in subs
+        ],
+        id={"type": "subcat-group", "index": col},
+        className="subcat-group",
+    )
+    for col, subs in APP_CATEGORIES.items()
+]
+
 layout = [
+    dbc.Row(CATEGORY_TILES, id="stat-icons"),
+    dbc.Row(SUBCATEGORY_GROUPS, id="substat-icons"),
+    dbc.Row(dcc.Graph(id="stat-display")),
+    dbc.Row(
+        [
+            dbc.Col(dcc.Dropdown(id="heatmap-player", placeholder="All lords"), width=3),
+            dcc.Graph(id="unit-heatmap"),
+        ]
+    ),
     dbc.Row(
         [
             dbc.Col(
-                html.Div(
-                    [
-                        html.Img(
-                            src=dash.get_relative_path(f"/assets/img/{IMAGE_PATHS[col]['img_path']}"),
-                            className="category",
-                        ),
-                        html.P(col, className="category"),
+                dcc.Dropdown(
+                    id="team-stat",
+                    options=[
+                        {"label": f"{col} ({label})", "value": f"{col}{suffix}"}
+                        for col in TEAM_ROLLUPS["columns"]
+                        for suffix, label in (("", "team total"), ("_mean", "team average"))
                     ],
-                    id={"type": "col-switch", "index": col},
-                    className="cat-div",
+                    value=TEAM_ROLLUPS["columns"][0],
+                    clearable=False,
                 ),
-                width=2,
-            )
-            for col in APP_CATEGORIES
-        ],
-        id="stat-icons",
+                width=3,
+            ),
+            dcc.Graph(id="team-display"),
+        ]
+    ),
+    dbc.Row(dcc.Graph(id="event-timeline")),
+    dbc.Row(
+        [
+            dcc.RangeSlider(id="date-scrubber", min=0, max=0, step=1, allowCross=False),
+            dcc.Graph(id="date-compare"),
+        ]
     ),
-    dbc.Row(id="substat-icons"),
-    dbc.Row(dcc.Graph(id="stat-display")),
 ]
@@ -0,0 +1,179 @@
+"""Pack the dashboard icons into a content hashed sprite sheet with a generated css map.
+
+Every icon referenced in `images.yaml` is centered in a square cell of the sheet. The generated
+css gives each icon a class positioning the sheet relative to the element size, so the icons
+scale with the existing `category` and `subcategory` sizes. The sheet and css file names carry
+a hash of their content and are served with far-future cache headers, a rebuilt sheet is picked
+up through its new name only.
+
+Usage:
+    python -m src.app.sprites [--columns N] [--cell N]
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import logging
+import pathlib
+import re
+
+import matplotlib.image as mpimg
+import numpy as np
+
+from src import IMAGE_PATHS
+
+logger = logging.getLogger(__name__)
+
+ASSETS_DIR = pathlib.Path(__file__).parent / "assets"
+SPRITE_DIR = ASSETS_DIR / "sprites"
+MANIFEST = SPRITE_DIR / "manifest.json"
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.(png|css)$")
+
+
+def sprite_class(img_path: str) -> str:
+    """Get the css class of an icon.
+
+    Args:
+        img_path (str): icon file name in the image folder
+
+    Returns:
+        str: css class name
+    """
+    return "sprite-" + re.sub(r"[^A-Za-z0-9_-]", "-", pathlib.Path(img_path).stem)
+
+
+def load_icon(path: pathlib.Path, cell: int) -> np.ndarray:
+    """Read an icon as RGBA, scale it to fit a square cell and center it in the cell.
+
+    Args:
+        path (pathlib.Path): png file
+        cell (int): edge length of the cell in pixels
+
+    Returns:
+        np.ndarray: RGBA values in [0, 1] of shape (cell, cell, 4)
+    """
+    icon = mpimg.imread(path)
+    if icon.dtype == np.uint8:
+        icon = icon / 255
+    if icon.ndim == 2:
+        icon = np.repeat(icon[:, :, None], 3, axis=2)
+    if icon.shape[2] == 3:
+        icon = np.concatenate((icon, np.ones(icon.shape[:2] + (1,))), axis=2)
+    height, width = icon.shape[:2]
+    scaled_height = max(round(height * cell / max(height, width)), 1)
+    scaled_width = max(round(width * cell / max(height, width)), 1)
+    # Nearest neighbour resampling keeps the pixel art of the game icons sharp
+    icon = icon[np.arange(scaled_height) * height // scaled_height][:, np.arange(scaled_width) * width // scaled_width]
+    out = np.zeros((cell, cell, 4))
+    top, left = (cell - icon.shape[0]) // 2, (cell - icon.shape[1]) // 2
+    out[top : top + icon.shape[0], left : left + icon.shape[1]] = icon  # noqa: E203
+    return out
+
+
+def build_sprites(
+    image_paths: dict,
+    img_dir: pathlib.Path = ASSETS_DIR / "img",
+    out_dir: pathlib.Path = SPRITE_DIR,
+    columns: int = 8,
+    cell: int = 128,
+) -> dict:
+    """Pack the icons into a sprite sheet and write the sheet, its css and the manifest.
+
+    Previously built sheets are removed.
+
+    Args:
+        image_paths (dict): `img_path` of every stat, see `images.yaml`
+        img_dir (pathlib.Path, optional): folder of the icons. Defaults to the app image folder.
+        out_dir (pathlib.Path, optional): output folder inside the assets. Defaults to SPRITE_DIR.
+        columns (int, optional): cells per sheet row. Defaults to 8.
+        cell (int, optional): edge length of a cell in pixels. Defaults to 128.
+
+    Returns:
+        dict: manifest with the `sheet` and `css` file names and the css class of every icon in `classes`
+    """
+    files = []
+    for img_path in sorted({entry["img_path"] for entry in image_paths.values()}):
+        if (img_dir / img_path).exists():
+            files.append(img_path)
+        else:
+            logger.warning(f"Icon {img_path} not found, it is not added to the sprite sheet.")
+    rows = max(-(-len(files) // columns), 1)
+    sheet = np.zeros((rows * cell, columns * cell, 4))
+    for i, img_path in enumerate(files):
+        row, col = divmod(i, columns)
+        sheet[row * cell : (row + 1) * cell, col * cell : (col + 1) * cell] = load_icon(  # noqa: E203
+            img_dir / img_path, cell
+        )
+    buffer = io.BytesIO()
+    # Leaving out the matplotlib version keeps the sheet name stable across installs, the stubs of
+    # `imsave` do not allow the None value matplotlib documents for removing a default key
+    metadata: dict[str, str | None] = {"Software": None}
+    mpimg.imsave(buffer, sheet, format="png", metadata=metadata)  # type: ignore[arg-type]
+    png = buffer.getvalue()
+    sheet_name = f"icons.{hashlib.sha256(png).hexdigest()[:12]}.png"
+
+    # Background positions in percent place the cell independent of the rendered element size
+    css = [
+        f'.sprite {{ background-image: url("{sheet_name}"); background-size: {columns * 100}% {rows * 100}%; '
+        "background-repeat: no-repeat; display: inline-block; }"
+    ]
+    classes = {}
+    for i, img_path in enumerate(files):
+        row, col = divmod(i, columns)
+        x = 100 * col / max(columns - 1, 1)
+        y = 100 * row / max(rows - 1, 1)
+        classes[img_path] = sprite_class(img_path)
+        css.append(f".{classes[img_path]} {{ background-position: {x:.4f}% {y:.4f}%; }}")
+    css_text = "\n".join(css) + "\n"
+    css_name = f"icons.{hashlib.sha256(css_text.encode()).hexdigest()[:12]}.css"
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for old in out_dir.glob("icons.*"):
+        if old.name not in (sheet_name, css_name):
+            old.unlink()
+    (out_dir / sheet_name).write_bytes(png)
+    (out_dir / css_name).write_text(css_text, encoding="utf8")
+    manifest = {"sheet": sheet_name, "css": css_name, "classes": classes}
+    (out_dir / MANIFEST.name).write_text(json.dumps(manifest, indent=2), encoding="utf8")
+    logger.info(f"Packed {len(files)} icons into {sheet_name} ({len(png) / 1024:.0f} KiB).")
+    return manifest
+
+
+def sprites_stale(img_dir: pathlib.Path = ASSETS_DIR / "img", manifest: pathlib.Path = MANIFEST) -> bool:
+    """Check whether the icons or the image config changed since the sprite sheet was built.
+
+    Args:
+        img_dir (pathlib.Path, optional): folder of the icons. Defaults to the app image folder.
+        manifest (pathlib.Path, optional): manifest of the built sheet. Defaults to MANIFEST.
+
+    Returns:
+        bool: True if the sheet is missing or older than an icon or `images.yaml`
+    """
+    if not manifest.exists():
+        return True
+    built = manifest.stat().st_mtime
+    sources = [pathlib.Path.cwd() / "config_files" / "app" / "images.yaml", *img_dir.glob("*.png")]
+    return any(path.stat().st_mtime > built for path in sources if path.exists())
+
+
+def sprite_classes(manifest: pathlib.Path = MANIFEST) -> dict[str, str]:
+    """Get the css class of every icon packed into the current sprite sheet.
+
+    Args:
+        manifest (pathlib.Path, optional): manifest of the built sheet. Defaults to MANIFEST.
+
+    Returns:
+        dict[str, str]: css class per icon file name, empty if no sheet was built
+    """
+    if not manifest.exists():
+        return {}
+    return json.loads(manifest.read_text(encoding="utf8"))["classes"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack the dashboard icons into a sprite sheet.")
+    parser.add_argument("--columns", type=int, default=8, help="cells per sheet row")
+    parser.add_argument("--cell", type=int, default=128, help="edge length of a cell in pixels")
+    args = parser.parse_args()
+    build_sprites(IMAGE_PATHS, columns=args.columns, cell=args.cell)
@@ -0,0 +1,166 @@
+"""This script contains the streaming endpoint pushing new ticks to the dashboards and other clients."""
+
+import json
+import logging
+from typing import Iterator
+
+import flask
+import numpy as np
+import pandas as pd
+
+from src.collector import Collector, CollectorPool
+from src.parser.frames import encode_cursor
+
+logger = logging.getLogger(__name__)
+
+KEEPALIVE_SECONDS = 15
+# Cursor fields whose change invalidates the history held by a client
+RESET_KEYS = ("instance", "match", "layout", "meta")
+# Prefix of the team rollup columns in the frames, their rows are keyed by the team number
+TEAM_PREFIX = "team:"
+
+
+def parse_cursor(value: str | None) -> dict | None:
+    """Parse the cursor argument of a stream request.
+
+    Args:
+        value (str | None): JSON encoded cursor, see `Collector.cursor`
+
+    Returns:
+        dict | None: cursor, None if missing or malformed, which resyncs the client with a reset
+    """
+    if value is None:
+        return None
+    try:
+        cursor = json.loads(value)
+    except json.JSONDecodeError:
+        cursor = None
+    version = cursor.get("version") if isinstance(cursor, dict) else None
+    if not isinstance(version, int) or isinstance(version, bool) or version < 0:
+        logger.debug(f"Ignoring the malformed stream cursor {value[:100]!r}.")
+        return None
+    return cursor
+
+
+def cursor_payload(collector: Collector, cursor: dict, reset: bool = False) -> dict:
+    """Describe the part of the history a stream client holds.
+
+    Besides the cursor, the first tick of every game month from the month before the last sent tick
+    on is included, so clients can place new ticks within their game month like the plotted ticks.
+
+    Args:
+        collector (Collector): collector holding the game date index, locked by the caller
+        cursor (dict): cursor of the ticks sent so far
+        reset (bool, optional): the history of the client was invalidated. Defaults to False.
+
+    Returns:
+        dict: `cursor`, `reset` and the game `months` with their first tick in `starts`
+    """
+    dates = collector.history.dates
+    first = max(int(np.searchsorted(dates.times, cursor["version"] - 1, side="right")) - 2, 0)
+    return {
+        "cursor": cursor,
+        "reset": reset,
+        "months": dates.months[first:].tolist(),
+        "starts": dates.times[first:].tolist(),
+    }
+
+
+def stream_table(collector: Collector, since: int) -> pd.DataFrame:
+    """Get the lord and team history from a tick on, with the team rollups as extra columns.
+
+    Args:
+        collector (Collector): collector holding the match history, locked by the caller
+        since (int): first tick to include
+
+    Returns:
+        pd.DataFrame: `time`, `timestamp`, `month`, `p_ID`, stat and `TEAM_PREFIX` columns
+    """
+    df = collector.history.frame(since=since)
+    teams = collector.team_history.frame(since=since)
+    if teams.empty:
+        return df
+    stats = [col for col in teams.columns if col not in ("time", "timestamp", "month", "team")]
+    teams = teams.drop(columns=["timestamp", "month"]).rename(
+        columns={"team": "p_ID", **{col: TEAM_PREFIX + col for col in stats}}
+    )
+    df = df.merge(teams, how="outer", on=["time", "p_ID"])
+    df[["timestamp", "month"]] = df.groupby("time")[["timestamp", "month"]].transform("first")
+    return df
+
+
+def frame_events(collector: Collector, cursor: dict | None, history: bool = True) -> Iterator[bytes]:
+    """Stream the stored ticks of all stat and team columns as binary frames, see `src.parser.frames`.
+
+    A cursor record is sent on connect, after every batch of new ticks and as keepalive. When the
+    history held by the client is invalidated, e.g. by a new match, older ticks being coarsened or
+    changed lords or map settings, a cursor record flagged as `reset` is sent and the history is
+    sent in full, starting over with a schema record and a keyframe. New ticks follow as delta frames.
+    Without `history`, the reset record holds the current cursor and ends the stream.
+
+    Args:
+        collector (Collector): collector holding the match history
+        cursor (dict | None): cursor of the history the client already holds
+        history (bool, optional): send the full history after a reset, otherwise end the stream, e.g.
+            for dashboards rebuilding their graphs from the API. Defaults to True.
+
+    Yields:
+        Iterator[bytes]: encoded cursor and schema records and frames
+    """
+    writer = collector.frame_writer()
+    sent: dict = cursor if cursor is not None else {}
+    connected = False
+    while True:
+        lead, trail, df = None, None, None
+        with collector.lock:
+            current = collector.cursor()
+            reset = not sent or any(current.get(key) != sent.get(key) for key in RESET_KEYS)
+            if reset:
+                # Clients rebuilding from the API continue from the current tick
+                sent = {**current, "version": 0} if history else current
+            if reset or not connected:
+                lead = cursor_payload(collector, sent, reset)
+            if history or not reset:
+                if current["version"] > sent["version"]:
+                    df = stream_table(collector, sent["version"])
+                    trail = cursor_payload(collector, current)
+                sent = current
+            num_players = collector.history.num_players
+        connected = True
+        if reset:
+            writer = collector.frame_writer()
+        records = [encode_cursor(lead)] if lead is not None else []
+        if df is not None and trail is not None:
+            records += [writer.encode_table(df, num_players), encode_cursor(trail)]
+        if records:
+            yield b"".join(records)
+        if reset and not history:
+            return
+        if collector.wait(sent, KEEPALIVE_SECONDS) == sent:
+            with collector.lock:
+                keepalive = cursor_payload(collector, sent)
+            yield encode_cursor(keepalive)
+
+
+def register_stream(server: flask.Flask, collectors: CollectorPool) -> None:
+    """Add the frame stream endpoint to the Flask server of the app.
+
+    The endpoint streams the game instance given by the `instance` argument, the first instance by
+    default, from the `cursor` argument on. A missing or malformed cursor is answered with a reset.
+    With `history=0` the stream ends on a reset instead of sending the full history.
+
+    Args:
+        server (flask.Flask): Flask server of the dash app
+        collectors (CollectorPool): collectors of all game instances
+    """
+
+    @server.route("/stream/frames")
+    def stream_frames() -> flask.Response:
+        collector = collectors.get(flask.request.args.get("instance", type=int))
+        cursor = parse_cursor(flask.request.args.get("cursor"))
+        history = flask.request.args.get("history", 1, type=int) != 0
+        return flask.Response(
+            frame_events(collector, cursor, history),
+            mimetype="application/octet-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
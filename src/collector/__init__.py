@@ -0,0 +1,503 @@
+"""This module reads game ticks into the live match history independently of any connected client.
+
+Several game instances on one host are tracked by a pool of collectors, one per game process.
+"""
+
+import logging
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from src import DERIVED_STATS, PROCESS_NAME, TEAM_ROLLUPS
+from src.parser.building import Building
+from src.parser.derived import RateMetrics, StrengthScores, TeamRollup
+from src.parser.events import EventLog, EventTracker
+from src.parser.frames import FrameWriter
+from src.parser.heatmap import UnitHeatmap
+from src.parser.lord import Lord
+from src.parser.read_data import MemoryReadError, ProcessMemory, get_processes_by_name, read_config
+from src.parser.retention import TieredStore
+from src.parser.schema import TickSchema
+from src.parser.signatures import read_memory_config, resolve_addresses
+from src.parser.state_machine import StateMachine
+from src.parser.tick import read_tick_chunked
+from src.parser.unit import Unit
+from src.storage import save_match
+
+logger = logging.getLogger(__name__)
+
+
+class Collector:
+    """Run the state machine and the memory readers at a fixed rate, storing ticks in the match history.
+
+    A step holds `lock` while it updates the history and the match state, readers hold it while
+    reading them, so a reader never sees a half stored tick or a history reset between two reads.
+    Callers combining several reads, e.g. the cursor and the ticks it describes, hold the lock
+    around all of them.
+    """
+
+    def __init__(
+        self,
+        lord: Lord,
+        building: Building,
+        unit: Unit,
+        history: TieredStore,
+        strength: StrengthScores,
+        rates: RateMetrics,
+        heatmap: UnitHeatmap,
+        teams: TeamRollup,
+        interval: float = 1.0,
+        pid: int | None = None,
+    ) -> None:
+        """Initialize the collector.
+
+        Args:
+            lord (Lord): lord reader
+            building (Building): building reader
+            unit (Unit): unit reader
+            history (TieredStore): match history
+            strength (StrengthScores): weighted strength stage
+            rates (RateMetrics): derived rate stage
+            heatmap (UnitHeatmap): unit position heatmap
+            teams (TeamRollup): team rollup stage
+            interval (float, optional): seconds between two reads. Defaults to 1.
+            pid (int | None, optional): id of the game process read. Defaults to the first game process.
+        """
+        self.lord = lord
+        self.building = building
+        self.unit = unit
+        self.history = history
+        self.strength = strength
+        self.rates = rates
+        self.heatmap = heatmap
+        self.teams = teams
+        self.team_history = TieredStore(history.tier_config, key="team")
+        self.events = EventTracker.from_readers(unit, building)
+        self.event_log = EventLog()
+        self.interval = interval
+        self.pid = pid
+        self.sm = StateMachine()
+        self.state = "lobby"
+        self.lords = pd.DataFrame(columns=["p_ID", "lord_names", "teams"])
+        self.map_settings = pd.DataFrame()
+        self.meta_version = 0
+        self.match_saved = False
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.thread: threading.Thread | None = None
+        self.stop_event = threading.Event()
+
+    @staticmethod
+    def from_configs(interval: float = 1.0, pid: int | None = None) -> "Collector":
+        """Instantiate the collector and its stages from the config files.
+
+        Args:
+            interval (float, optional): seconds between two reads. Defaults to 1.
+            pid (int | None, optional): id of the game process read. Defaults to the first game process.
+
+        Returns:
+            Collector: instantiated class object
+        """
+        memory = ProcessMemory(PROCESS_NAME, pid)
+        # Several game processes may run different builds, addresses are resolved per process
+        addresses = resolve_addresses(PROCESS_NAME, pid)
+        return Collector(
+            Lord.from_dict(read_memory_config("lord", addresses), memory),
+            Building.from_dict(read_memory_config("building", addresses), memory),
+            Unit.from_dict(read_memory_config("unit", addresses), memory),
+            TieredStore.from_dict(read_config("retention", "app")),
+            StrengthScores.from_dict(read_config("weights", "memory")),
+            RateMetrics.from_dict(DERIVED_STATS),
+            UnitHeatmap.from_dict(read_config("heatmap", "app")),
+            TeamRollup.from_dict(TEAM_ROLLUPS),
+            interval,
+            pid,
+        )
+
+    def cursor(self) -> dict:
+        """Get the small cursor telling clients which part of the history changed.
+
+        Returns:
+            dict: game process, match id, tier layout version, number of stored ticks and lord/map settings version
+        """
+        with self.lock:
+            return {
+                "instance": self.pid,
+                "match": self.history.match_id,
+                "layout": self.history.layout_version,
+                "version": self.history.version,
+                "meta": self.meta_version,
+            }
+
+    def frame(
+        self, columns: list[str] | None = None, since: int | None = None, until: int | None = None
+    ) -> pd.DataFrame:
+        """Get the stored history of the running match with the game date of every tick.
+
+        Args:
+            columns (list[str] | None, optional): stat columns. Defaults to all.
+            since (int | None, optional): first tick to include. Defaults to the match start.
+            until (int | None, optional): first tick to exclude. Defaults to up to the most recent tick.
+
+        Returns:
+            pd.DataFrame: per lord stats with `end_year` and `end_month` columns
+        """
+        with self.lock:
+            df = self.history.frame(columns, since=since, until=until)
+        df["end_year"] = df["month"] // 12
+        df["end_month"] = df["month"] % 12 + 1
+        return df
+
+    def date_frame(self, first: int, last: int, columns: list[str] | None = None) -> pd.DataFrame:
+        """Get the stored history between two game dates.
+
+        Args:
+            first (int): first game month to include, e.g. year * 12 + month
+            last (int): last game month to include
+            columns (list[str] | None, optional): stat columns. Defaults to all.
+
+        Returns:
+            pd.DataFrame: per lord stats, see `frame`
+        """
+        with self.lock:
+            since, until = self.history.dates.tick_range(first, last)
+            return self.frame(columns, since, until)
+
+    def moment(self, month: int, columns: list[str] | None = None) -> pd.DataFrame:
+        """Get the per lord stats as of the end of a game month.
+
+        Args:
+            month (int): game month, e.g. year * 12 + month
+            columns (list[str] | None, optional): stat columns. Defaults to all.
+
+        Returns:
+            pd.DataFrame: `p_ID`, `time` and stat columns of the last tick stored up to that month, empty if
+                the month is before the match start
+        """
+        with self.lock:
+            time = self.history.dates.tick_at(month)
+            if time is None:
+                return pd.DataFrame(columns=["p_ID", "time", *(columns or [])])
+            return self.history.at(time, columns)
+
+    def team_frame(self, columns: list[str] | None = None, since: int | None = None) -> pd.DataFrame:
+        """Get the stored team rollups of the running match.
+
+        Args:
+            columns (list[str] | None, optional): team columns, see `TeamRollup.output_columns`. Defaults to all.
+            since (int | None, optional): first tick to include. Defaults to the match start.
+
+        Returns:
+            pd.DataFrame: per team stats with `end_year` and `end_month` columns
+        """
+        with self.lock:
+            df = self.team_history.frame(columns, since=since)
+        df["end_year"] = df["month"] // 12
+        df["end_month"] = df["month"] % 12 + 1
+        return df
+
+    def frame_writer(self, keyframe_interval: int = 64) -> FrameWriter:
+        """Get a binary frame encoder for the ticks of the match history.
+
+        Args:
+            keyframe_interval (int, optional): frames between two keyframes. Defaults to 64.
+
+        Returns:
+            FrameWriter: encoder keeping the integer stats of the tick schema exact
+        """
+        integer_columns = set(TickSchema.from_readers(self.lord, self.unit).dtypes())
+        return FrameWriter(integer_columns, keyframe_interval=keyframe_interval)
+
+    def event_frame(self, since: int | None = None) -> pd.DataFrame:
+        """Get the unit and building events of the running match.
+
+        Args:
+            since (int | None, optional): first tick to include. Defaults to the match start.
+
+        Returns:
+            pd.DataFrame: events in tick order, see `EventTracker.update`
+        """
+        with self.lock:
+            return self.event_log.frame(since)
+
+    def save(self) -> bool:
+        """Store the match together with its summaries, unless it is empty or already stored.
+
+        Returns:
+            bool: True if the match was stored
+        """
+        with self.lock:
+            if self.match_saved or not self.history.version:
+                return False
+            self.match_saved = True
+            save_match(self.frame(), self.map_settings, self.lords, self.event_frame())
+            return True
+
+    def step(self) -> bool:
+        """Update the game state and read one tick if a game is running.
+
+        Once the game is over, the match is stored together with its summaries. In the lobby the
+        history and all incremental stages are reset. The whole step holds `lock`.
+
+        Returns:
+            bool: True if a tick was stored
+        """
+        with self.lock:
+            return self._step()
+
+    def _step(self) -> bool:
+        before = self.cursor()
+        state = self.sm.update_state(PROCESS_NAME, self.pid)
+        self.state = state
+        stored = False
+        if state != "game":
+            self.save()
+        if state != "stats":
+            self._update_lords()
+        if state == "game" and self.lord.num_lords:
+            self.match_saved = False
+            self._update_map_settings()
+            self.heatmap.decay_step()
+            self.events.begin()
+            tick_df = read_tick_chunked(
+                self.lord,
+                self.building,
+                self.unit,
+                self.strength,
+                unit_visitors=[self.heatmap.visit, self.events.visit_units],
+                building_visitors=[self.events.visit_buildings],
+            )
+            map_df = self.lord.get_map_settings()
+            month = int(map_df["end_year"].iloc[0]) * 12 + int(map_df["end_month"].iloc[0])
+            timestamp = time.time()
+            tick_df = tick_df.merge(self.rates.compute(tick_df, month, timestamp), how="left", on="p_ID")
+            self.event_log.append(self.events.finish(self.history.version))
+            tick_df = tick_df.merge(self.events.losses(), how="left", on="p_ID")
+            self.team_history.append(self.history.version, timestamp, month, self.teams.compute(tick_df))
+            self.history.append(self.history.version, timestamp, month, tick_df)
+            stored = True
+        elif state == "lobby" and self.history.version:
+            self.history.reset()
+            self.team_history.reset()
+            self.heatmap.reset()
+            self.rates.reset()
+            self.events.reset()
+            self.event_log.reset()
+            self.map_settings = pd.DataFrame()
+            self.meta_version += 1
+        if self.cursor() != before:
+            self.changed.notify_all()
+        return stored
+
+    def _update_lords(self) -> None:
+        self.lord.get_active_lords()
+        if self.lord.num_lords == 0:
+            return
+        self.lord.get_lord_names()
+        lords = pd.DataFrame(
+            {
+                "p_ID": np.arange(1, self.lord.num_lords + 1),
+                "lord_names": self.lord.lord_names,
+                "teams": self.lord.teams,
+            }
+        )
+        if not lords.equals(self.lords):
+            self.lords = lords
+            self.meta_version += 1
+            if self.teams.set_teams(lords["p_ID"].to_numpy(), lords["teams"].to_numpy()):
+                self._rebuild_team_history()
+
+    def _rebuild_team_history(self) -> None:
+        """Roll up the stored lord history again after the teams changed."""
+        self.team_history.reset()
+        if not self.history.version:
+            return
+        ticks, rolled = self.teams.compute_table(self.history.frame(self.teams.columns))
+        for tick, values in zip(ticks.itertuples(index=False), rolled):
+            self.team_history.append_values(tick.time, tick.timestamp, tick.month, self.teams.output_columns, values)
+        logger.info(f"Teams changed, rolled up {len(ticks)} stored ticks again.")
+
+    def _update_map_settings(self) -> None:
+        map_df = self.lord.get_map_settings()
+        map_df["end_month"] = map_df["end_month"] + 1
+        map_df["start_month"] = map_df["start_month"] + 1
+        if ((map_df["start_year"] == 0) | (map_df["end_year"] == 0)).any():
+            return
+        map_df["year_month"] = (map_df["end_year"].astype(str) + "-" + map_df["end_month"].astype(str)).astype(
+            "datetime64[s]"
+        )
+        settings = map_df.drop(columns=["end_year", "end_month", "year_month"])
+        if self.map_settings.empty or not self.map_settings[settings.columns].equals(settings):
+            self.meta_version += 1
+        map_df["time"] = self.history.version
+        self.map_settings = map_df
+
+    def run(self) -> None:
+        """Read ticks at the configured interval until stopped.
+
+        A failing step is logged and the next step is tried at the next interval, so a single
+        bad read or a failed database write never stops the collector.
+        """
+        deadline = time.monotonic()
+        while not self.stop_event.is_set():
+            try:
+                self.step()
+            except MemoryReadError as e:
+                logger.debug(f"Game not readable: {e}")
+            except Exception:
+                logger.exception(f"Collector step of game process {self.pid} failed.")
+            deadline = max(deadline + self.interval, time.monotonic())
+            self.stop_event.wait(deadline - time.monotonic())
+
+    def start(self) -> None:
+        """Start reading ticks in a background thread, if not running yet."""
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            name = "collector" if self.pid is None else f"collector-{self.pid}"
+            self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+            self.thread.start()
+            logger.info(f"Started collecting ticks of {name} every {self.interval}s.")
+
+    def stop(self) -> None:
+        """Stop the background thread and release the game process."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        if isinstance(self.unit.memory, ProcessMemory):
+            self.unit.memory.close()
+
+    def wait(self, cursor: dict | None, timeout: float) -> dict:
+        """Block until the history moved past a cursor.
+
+        Args:
+            cursor (dict | None): last cursor seen by the caller
+            timeout (float): maximum seconds to wait
+
+        Returns:
+            dict: current cursor, equal to `cursor` on timeout
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: self.cursor() != cursor, timeout)
+            return self.cursor()
+
+
+class CollectorPool:
+    """Track every running game instance with its own collector, keyed by the game process id.
+
+    Game processes are discovered periodically. Each collector reads its instance in its own thread
+    and keeps a separate match history, a collector is stopped once its process exited.
+    """
+
+    def __init__(self, interval: float = 1.0, discover_interval: float = 5.0) -> None:
+        """Initialize the pool.
+
+        Args:
+            interval (float, optional): seconds between two reads of every instance. Defaults to 1.
+            discover_interval (float, optional): seconds between two process scans. Defaults to 5.
+        """
+        self.interval = interval
+        self.discover_interval = discover_interval
+        self.collectors: dict[int, Collector] = {}
+        self.discovered: set[int] = set()
+        self._idle: Collector | None = None
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+        self.stop_event = threading.Event()
+
+    def instances(self) -> list[int]:
+        """Get the keys of all tracked instances.
+
+        Returns:
+            list[int]: instance keys in ascending order
+        """
+        with self.lock:
+            return sorted(self.collectors)
+
+    def get(self, instance: int | None = None) -> Collector:
+        """Get the collector of an instance.
+
+        Args:
+            instance (int | None, optional): instance key. Defaults to the first instance.
+
+        Returns:
+            Collector: collector of the instance, of the first instance if it is not tracked or the idle
+                collector if no instance is tracked
+        """
+        with self.lock:
+            if instance in self.collectors:
+                return self.collectors[instance]
+            if self.collectors:
+                return self.collectors[min(self.collectors)]
+            # Served while no game is running, so clients always see an (empty) history. It is built on
+            # first use, after the app set the read interval.
+            if self._idle is None:
+                self._idle = Collector.from_configs(self.interval)
+            return self._idle
+
+    def add(self, instance: int, collector: Collector) -> None:
+        """Track a collector which is not managed by the process scan, e.g. a replay, and start it.
+
+        Args:
+            instance (int): instance key
+            collector (Collector): collector of the instance
+        """
+        with self.lock:
+            self.collectors[instance] = collector
+        collector.start()
+
+    def discover(self) -> None:
+        """Start a collector for every new game process and stop the collectors of exited ones.
+
+        The match of an exited process is stored, if the collector did not store it yet, e.g. when
+        the game was closed or crashed mid match. A process whose collector cannot be set up, e.g.
+        a game still starting, is skipped and retried on the next scan.
+        """
+        pids = {proc.pid for proc in get_processes_by_name(PROCESS_NAME)}
+        started = {}
+        for pid in sorted(pids - self.discovered):
+            try:
+                started[pid] = Collector.from_configs(self.interval, pid)
+            except Exception:
+                logger.exception(f"Opening game process {pid} failed, retrying on the next scan.")
+        with self.lock:
+            self.collectors.update(started)
+            stopped = [self.collectors.pop(pid) for pid in self.discovered - pids]
+            self.discovered = (self.discovered & pids) | set(started)
+        for collector in started.values():
+            collector.start()
+        for collector in stopped:
+            collector.stop()
+            logger.info(f"Game process {collector.pid} exited, stopped collecting its ticks.")
+            try:
+                if collector.save():
+                    logger.info(f"Stored the unfinished match of game process {collector.pid}.")
+            except Exception:
+                logger.exception(f"Storing the match of game process {collector.pid} failed.")
+
+    def run(self) -> None:
+        """Scan for game processes at the configured interval until stopped."""
+        while not self.stop_event.is_set():
+            try:
+                self.discover()
+            except Exception:
+                logger.exception("Scanning for game processes failed, retrying on the next scan.")
+            self.stop_event.wait(self.discover_interval)
+
+    def start(self) -> None:
+        """Start scanning for game processes in a background thread, if not running yet."""
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_event.clear()
+            self.thread = threading.Thread(target=self.run, name="collector-pool", daemon=True)
+            self.thread.start()
+
+    def stop(self) -> None:
+        """Stop the process scan and all collectors."""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        with self.lock:
+            collectors = list(self.collectors.values())
+        for collector in collectors:
+            collector.stop()
@@ -0,0 +1,165 @@
+"""Record games without the dash app.
+
+Ticks are either decoded and stored in the database at the end of the match, or written as raw
+memory blocks to a capture file, which takes the least CPU and memory while playing and can be
+decoded later with `python -m src.parser.batch_decode`. Decoded ticks can additionally be appended
+to a binary frame file as they are read, see `src.parser.frames`. The recorder exits once the match
+ended. With several game clients on one host, the instance to record is chosen by its process id.
+
+Usage:
+    python -m src.collector [--rate N] [--pid PID] [--archive CAPTURE | --frames FRAMES] [--summary SECONDS]
+"""
+
+import argparse
+import logging
+import pathlib
+import time
+from typing import BinaryIO
+
+import numpy as np
+
+from src import PROCESS_NAME
+from src.parser.capture import CaptureWriter
+from src.parser.frames import open_frame_file
+from src.parser.read_data import MemoryReadError
+from src.parser.tick import tick_regions
+from src.storage import save_match
+
+from . import Collector
+
+logger = logging.getLogger(__name__)
+
+
+class RecordStats:
+    """Throughput and read latency of the recorder since the last summary."""
+
+    def __init__(self, interval: float) -> None:
+        """Initialize the statistics.
+
+        Args:
+            interval (float): seconds between two reads
+        """
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.latencies: list[float] = []
+        self.ticks = 0
+        self.total_ticks = 0
+
+    def add(self, latency: float, stored: bool) -> None:
+        """Add one read.
+
+        Args:
+            latency (float): seconds the read took
+            stored (bool): a tick was stored
+        """
+        self.latencies.append(latency)
+        self.ticks += stored
+        self.total_ticks += stored
+
+    def summary(self) -> str:
+        """Summarize and reset the statistics.
+
+        Returns:
+            str: ticks per second, latency percentiles and number of reads slower than the interval
+        """
+        elapsed = time.perf_counter() - self.start
+        latencies = np.array(self.latencies or [0.0]) * 1000
+        text = (
+            f"{self.ticks} ticks in {elapsed:.0f}s ({self.ticks / max(elapsed, 1e-9):.2f} ticks/s, "
+            f"{self.total_ticks} total), read latency p50 {np.percentile(latencies, 50):.1f}ms "
+            f"p95 {np.percentile(latencies, 95):.1f}ms max {latencies.max():.1f}ms, "
+            f"{np.count_nonzero(latencies > 1000 * self.interval)} reads over the interval"
+        )
+        self.start = time.perf_counter()
+        self.latencies = []
+        self.ticks = 0
+        return text
+
+
+def capture_step(collector: Collector, writer: CaptureWriter, tick: int) -> bool:
+    """Update the game state and write the raw memory blocks of one tick if a game is running.
+
+    Args:
+        collector (Collector): collector holding the memory readers
+        writer (CaptureWriter): open capture file
+        tick (int): tick number of the record
+
+    Returns:
+        bool: True if a tick was written
+    """
+    collector.state = collector.sm.update_state(PROCESS_NAME, collector.pid)
+    if collector.state != "game":
+        return False
+    collector.lord.get_active_lords()
+    if not collector.lord.num_lords:
+        return False
+    regions = tick_regions(collector.lord, collector.building, collector.unit)
+    writer.capture_tick(tick, collector.lord.memory, regions)
+    return True
+
+
+def record(
+    collector: Collector,
+    writer: CaptureWriter | None = None,
+    summary_interval: float = 30,
+    frame_file: BinaryIO | None = None,
+) -> int:
+    """Record ticks at the collector's interval until the running match ended.
+
+    Args:
+        collector (Collector): collector to read with
+        writer (CaptureWriter | None, optional): capture file for raw ticks. Defaults to decoding into the database.
+        summary_interval (float, optional): seconds between two summaries. Defaults to 30.
+        frame_file (BinaryIO | None, optional): frame file for the decoded ticks. Defaults to None.
+
+    Returns:
+        int: number of recorded ticks
+    """
+    stats = RecordStats(collector.interval)
+    frame_writer = collector.frame_writer()
+    deadline = next_summary = time.monotonic()
+    next_summary += summary_interval
+    try:
+        while not (stats.total_ticks and collector.state != "game"):
+            start = time.perf_counter()
+            try:
+                stored = capture_step(collector, writer, stats.total_ticks) if writer is not None else collector.step()
+            except MemoryReadError as e:
+                logger.debug(f"Game not readable: {e}")
+                stored = False
+            stats.add(time.perf_counter() - start, stored)
+            if stored and frame_file is not None:
+                tick_df = collector.history.frame(since=collector.history.version - 1)
+                frame_file.write(frame_writer.encode_table(tick_df, collector.history.num_players))
+            if time.monotonic() >= next_summary:
+                logger.info(stats.summary())
+                next_summary += summary_interval
+            deadline = max(deadline + collector.interval, time.monotonic())
+            time.sleep(max(deadline - time.monotonic(), 0))
+    except KeyboardInterrupt:
+        logger.info("Recording stopped.")
+        if writer is None and collector.history.version and not collector.match_saved:
+            save_match(collector.frame(), collector.map_settings, collector.lords, collector.event_frame())
+    logger.info(stats.summary())
+    return stats.total_ticks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record a match without the dash app.")
+    parser.add_argument("--rate", type=float, default=1.0, help="reads per second")
+    parser.add_argument("--pid", type=int, default=None, help="game process to record, defaults to the first")
+    parser.add_argument("--archive", type=pathlib.Path, default=None, help="write raw ticks to this capture file")
+    parser.add_argument("--frames", type=pathlib.Path, default=None, help="append decoded ticks to this frame file")
+    parser.add_argument("--summary", type=float, default=30.0, help="seconds between two summaries")
+    args = parser.parse_args()
+    collector = Collector.from_configs(1 / args.rate, args.pid)
+    logger.info(f"Waiting for a match, reading {args.rate} times per second.")
+    if args.archive is None and args.frames is not None:
+        with open_frame_file(args.frames) as frame_file:
+            num_ticks = record(collector, summary_interval=args.summary, frame_file=frame_file)
+    elif args.archive is None:
+        num_ticks = record(collector, summary_interval=args.summary)
+    else:
+        with CaptureWriter(args.archive) as writer:
+            num_ticks = record(collector, writer, args.summary)
+    logger.info(f"Recorded {num_ticks} ticks.")
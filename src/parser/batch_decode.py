@@ -0,0 +1,168 @@
+"""Decode raw memory captures into columnar stat tables using a process pool.
+
+Usage:
+    python -m src.parser.batch_decode OUTPUT_DIR CAPTURE [CAPTURE ...] [--workers N] [--ticks-per-task N]
+"""
+
+import argparse
+import logging
+import os
+import pathlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .building import Building
+from .capture import CaptureReader, SnapshotMemory
+from .columnar import write_columns
+from .derived import RateMetrics, StrengthScores
+from .events import EventTracker
+from .lord import Lord
+from .read_data import read_config
+from .tick import read_tick_chunked
+from .unit import Unit
+
+logger = logging.getLogger(__name__)
+
+# Per worker state, set up once by `_init_worker`
+_parsers: tuple[Lord, Building, Unit, StrengthScores] | None = None
+
+
+def _init_worker() -> None:
+    """Build the layout parsers once per worker process."""
+    global _parsers
+    _parsers = (
+        Lord.from_dict(read_config("lord", "memory")),
+        Building.from_dict(read_config("building", "memory")),
+        Unit.from_dict(read_config("unit", "memory")),
+        StrengthScores.from_dict(read_config("weights", "memory")),
+    )
+
+
+def decode_records(path: str, offsets: list[int], primed: bool = False) -> pd.DataFrame:
+    """Decode a range of tick records of one capture file.
+
+    The capture is memory mapped for the duration of the task, so records are decoded straight
+    from the shared page cache without copying the file into the worker. The army losses of a
+    tick are diffed against the previous record, which a range starting mid capture decodes in
+    addition. Game months are stored like the collector does, as `year * 12 + month` with a zero
+    based month.
+
+    Args:
+        path (str): capture file path
+        offsets (list[int]): file offsets of the records to decode
+        primed (bool, optional): the first record precedes the range and only primes the event tracker.
+            Defaults to False.
+
+    Returns:
+        pd.DataFrame: per lord stats of all decoded ticks with `month`, `end_year` and `end_month` columns
+    """
+    if _parsers is None:
+        _init_worker()
+    assert _parsers is not None
+    lord, building, unit, strength = _parsers
+    events = EventTracker.from_readers(unit, building)
+    ticks = []
+    with CaptureReader(path) as reader:
+        for i, offset in enumerate(offsets):
+            tick, timestamp, memory = reader.read_record(offset)
+            lord.memory = building.memory = unit.memory = memory
+            lord.get_active_lords()
+            if lord.num_lords == 0:
+                events.reset()
+                continue
+            map_df = lord.get_map_settings()
+            events.begin()
+            tick_df = read_tick_chunked(
+                lord,
+                building,
+                unit,
+                strength=strength,
+                unit_visitors=[events.visit_units],
+                building_visitors=[events.visit_buildings],
+            )
+            events.finish(tick)
+            if primed and i == 0:
+                continue
+            month = int(map_df["end_year"].iloc[0]) * 12 + int(map_df["end_month"].iloc[0])
+            tick_df = tick_df.merge(events.losses(), how="left", on="p_ID")
+            tick_df["month"] = month
+            tick_df["end_year"] = month // 12
+            tick_df["end_month"] = month % 12 + 1
+            tick_df["time"] = tick
+            tick_df["timestamp"] = timestamp
+            ticks.append(tick_df)
+        # The snapshots view into the memory map, drop them before it is released
+        memory = SnapshotMemory({})
+        lord.memory = building.memory = unit.memory = memory
+    if not ticks:
+        return pd.DataFrame()
+    return pd.concat(ticks, ignore_index=True)
+
+
+def decode_captures(
+    captures: list[pathlib.Path], output_dir: pathlib.Path, workers: int | None = None, ticks_per_task: int = 256
+) -> list[pathlib.Path]:
+    """Decode capture files in parallel and write one columnar table per capture.
+
+    Each capture is split into ranges of `ticks_per_task` records, and all ranges of all
+    captures are decoded concurrently in a process pool.
+
+    Args:
+        captures (list[pathlib.Path]): capture files
+        output_dir (pathlib.Path): directory for the `.npz` tables
+        workers (int | None, optional): number of worker processes. Defaults to the cpu count.
+        ticks_per_task (int, optional): tick records per task. Defaults to 256.
+
+    Returns:
+        list[pathlib.Path]: written table files
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    tasks: list[tuple[str, list[int], bool]] = []
+    for capture in captures:
+        with CaptureReader(capture) as reader:
+            offsets = reader.record_offsets()
+        tasks.extend(
+            (str(capture), offsets[max(i - 1, 0) : i + ticks_per_task], i > 0)  # noqa: E203
+            for i in range(0, len(offsets), ticks_per_task)
+        )
+
+    rates = RateMetrics.from_dict(read_config("derived_stats", "app"))
+    results: dict[str, list[pd.DataFrame]] = {str(capture): [] for capture in captures}
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        futures = [(path, pool.submit(decode_records, path, offsets, primed)) for path, offsets, primed in tasks]
+        for path, future in futures:
+            results[path].append(future.result())
+
+    written = []
+    num_rows = 0
+    for capture in captures:
+        frames = [df for df in results[str(capture)] if not df.empty]
+        if not frames:
+            logger.warning(f"No game ticks found in {capture}.")
+            continue
+        table = rates.compute_table(pd.concat(frames, ignore_index=True))
+        num_rows += len(table)
+        out_path = output_dir / f"{capture.stem}.npz"
+        write_columns(table, out_path)
+        written.append(out_path)
+    elapsed = time.perf_counter() - start
+    num_ticks = sum(len(offsets) - primed for _, offsets, primed in tasks)
+    logger.info(
+        f"Decoded {num_ticks} ticks ({num_rows} rows) from {len(captures)} captures "
+        f"in {elapsed:.1f}s with {workers} workers ({num_ticks / max(elapsed, 1e-9):.0f} ticks/s)."
+    )
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Decode raw memory captures into columnar stat tables.")
+    parser.add_argument("output_dir", type=pathlib.Path)
+    parser.add_argument("captures", type=pathlib.Path, nargs="+")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--ticks-per-task", type=int, default=256)
+    args = parser.parse_args()
+    decode_captures(args.captures, args.output_dir, args.workers, args.ticks_per_task)
@@ -1,23 +1,30 @@
 """Script containing code to manage building related tasks and calculations."""
 
+from typing import Callable, Iterator
+
 import numpy as np
 import pandas as pd
 
 from src import PROCESS_NAME
-from src.parser.read_data import D_Types, read_config, read_memory, read_memory_chunk
+from src.parser.read_data import CHUNK_RECORDS, D_Types, MemorySource, ProcessMemory, iter_records, read_config
+from src.parser.schema import BUILDING_COUNTS
+
+BUILDING_COLUMNS = ["ID", "owner", "workers_needed", "workers_working", "workers_missing", "snoozed"]
 
 
 class Building:
     """Class to read buildings from memory and compute stats."""
 
-    def __init__(self, base: int, offsets: dict, total_buildings: int) -> None:
+    def __init__(self, base: int, offsets: dict, total_buildings: int, memory: MemorySource | None = None) -> None:
         """Initialize the Building class.
 
         Args:
             base (int): base address of the buildings array in memory
             offsets (dict): offset to next building in memory
             total_buildings (int): address where number of total buildings is stored
+            memory (MemorySource | None, optional): memory source. Defaults to the game process.
         """
+        self.memory = memory or ProcessMemory(PROCESS_NAME)
         self.building_names = read_config("names", "memory")["Buildings"]
         self.base = base
         self.offset = offsets["offset"]
@@ -29,16 +36,29 @@ class Building:
         self.total_buildings = total_buildings
 
     @staticmethod
-    def from_dict(config: dict) -> "Building":
+    def from_dict(config: dict, memory: MemorySource | None = None) -> "Building":
         """Initialize Building from a dictionary.
 
         Args:
             config (dict): configuration dictionary
+            memory (MemorySource | None, optional): memory source. Defaults to the game process.
 
         Returns:
             Building: instantiated class
         """
-        return Building(config["address"], config["offsets"], config["total"])
+        return Building(config["address"], config["offsets"], config["total"], memory)
+
+    def memory_regions(self) -> list[tuple[int, int]]:
+        """List the memory blocks holding the building count and the building array.
+
+        Returns:
+            list[tuple[int, int]]: address and size of each block
+        """
+        num_buildings = int(self.memory.read(self.total_buildings, D_Types.INT))
+        regions = [(self.total_buildings, 4)]
+        if num_buildings:
+            regions.append((self.base, num_buildings * self.offset))
+        return regions
 
     def list_buildings(self, player_id: int = 0) -> pd.DataFrame:
         """List all buildings present in the game.
@@ -49,93 +69,134 @@ class Building:
         Returns:
             pd.DataFrame: buildings data
         """
-        num_buildings = int(read_memory(PROCESS_NAME, self.total_buildings, D_Types.INT))
+        num_buildings = int(self.memory.read(self.total_buildings, D_Types.INT))
         offset_list = [0, self.owner, self.workers_needed, self.workers, self.workers_missing, self.snoozed]
-        buildings_list = read_memory_chunk(
-            PROCESS_NAME,
+        buildings_list = self.memory.read_chunk(
             self.base,
             [i * self.offset + extra_off for i in range(num_buildings) for extra_off in offset_list],
             D_Types.WORD,
         )
-        buildings_array = np.array(buildings_list).reshape((num_buildings, len(offset_list)))
+        buildings_array = np.array(buildings_list, dtype=np.uint16).reshape((num_buildings, len(offset_list)))
         if player_id != 0:
             mask = buildings_array[:, 2] == player_id
         else:
             mask = (buildings_array[:, 2] >= 1) & (buildings_array[:, 2] <= 8)
 
         filtered_buildings = buildings_array[mask]
-
-        building_names_array = np.vectorize(self.building_names.get)(filtered_buildings[:, 0])
-        # address_array = (self.base + np.arange(buildings_array.shape[0]) * self.offset).reshape(-1, 1)
-        buildings_array = np.column_stack((building_names_array, filtered_buildings))
         return pd.DataFrame(
-            buildings_array,
-            columns=[
-                "b_name",
-                "ID",
-                "owner",
-                "workers_needed",
-                "workers_working",
-                "workers_missing",
-                "snoozed",
-            ],
-        ).astype(
             {
-                "b_name": pd.StringDtype(),
-                "ID": pd.Int64Dtype(),
-                "owner": pd.Int32Dtype(),
-                "workers_needed": pd.Int32Dtype(),
-                "workers_working": pd.Int32Dtype(),
-                "workers_missing": pd.Int32Dtype(),
-                "snoozed": pd.Int32Dtype(),
+                "address": (self.base + np.flatnonzero(mask) * self.offset).astype(np.uint32),
+                "b_name": pd.array(
+                    [self.building_names.get(building_id) for building_id in filtered_buildings[:, 0].tolist()],
+                    dtype=pd.StringDtype(),
+                ),
+                **{col: filtered_buildings[:, i] for i, col in enumerate(BUILDING_COLUMNS)},
             }
         )
 
-    def calculate_all_stats(self) -> pd.DataFrame:
+    def iter_buildings(self, chunk_records: int = CHUNK_RECORDS) -> Iterator[dict[str, np.ndarray]]:
+        """Read the building table chunk by chunk, keeping the buildings `list_buildings` keeps.
+
+        Args:
+            chunk_records (int, optional): building slots per chunk. Defaults to CHUNK_RECORDS.
+
+        Yields:
+            Iterator[dict[str, np.ndarray]]: `address`, `ID`, `owner` and worker columns of the buildings of a chunk
+        """
+        num_buildings = int(self.memory.read(self.total_buildings, D_Types.INT))
+        offset_list = [0, self.owner, self.workers_needed, self.workers, self.workers_missing, self.snoozed]
+        for start, chunk in iter_records(
+            self.memory, self.base, self.offset, num_buildings, offset_list, D_Types.WORD, chunk_records
+        ):
+            idx = np.flatnonzero((chunk[:, 2] >= 1) & (chunk[:, 2] <= 8))
+            yield {
+                "address": (self.base + (start + idx) * self.offset).astype(np.uint32),
+                **{col: chunk[idx, i] for i, col in enumerate(BUILDING_COLUMNS)},
+            }
+
+    def fold_buildings(
+        self, visitors: list[Callable[[dict[str, np.ndarray]], None]], chunk_records: int = CHUNK_RECORDS
+    ) -> None:
+        """Pass every chunk of the building table to the visitors, without building the building list.
+
+        Args:
+            visitors (list[Callable[[dict[str, np.ndarray]], None]]): functions folding a chunk into their state
+            chunk_records (int, optional): building slots per chunk. Defaults to CHUNK_RECORDS.
+        """
+        for buildings in self.iter_buildings(chunk_records):
+            for visit in visitors:
+                visit(buildings)
+
+    def calculate_all_stats(self, buildings: pd.DataFrame | None = None) -> pd.DataFrame:
         """Calculate all building and worker related stats into a dataframe.
 
+        Args:
+            buildings (pd.DataFrame | None, optional): already read building data. Defaults to reading it from memory.
+
         Returns:
             pd.DataFrame: All building stats.
         """
-        false_worker_ids = [1, 2, 8, 9, 21, 29]
-        ground_ids = [53, 55, 56, 57, 58, 59]
-        keep_ids = [71, 72, 73]
-        siege_engines = [80, 81, 82, 83, 84, 86, 87]
-        building_info_df = pd.DataFrame(
-            columns=["num_buildings", "workers_needed", "workers_working", "workers_missing", "snoozed"]
-        )
-        building_mem_df = self.list_buildings()
-        building_mem_df = building_mem_df.loc[
-            ~(building_mem_df["ID"].isin(ground_ids + keep_ids + siege_engines)),
-            :,
-        ]
-        building_info_df["num_buildings"] = (
-            building_mem_df.loc[:, ["owner"]]
-            .groupby("owner")
-            .size()
-            .to_frame()
-            .rename(columns={"size": "num_buildings"})
-        )
-        building_info_df["snoozed"] = (
-            building_mem_df.loc[building_mem_df["snoozed"] == 1, ["owner"]]
-            .groupby("owner")
-            .size()
-            .to_frame()
-            .rename(columns={"size": "snoozed"})
-        )
-        building_info_df["snoozed"] = building_info_df["snoozed"].fillna(0).astype(pd.Int32Dtype())
-        building_mem_df = building_mem_df.loc[
-            ~(building_mem_df["ID"].isin(false_worker_ids)) & (building_mem_df["snoozed"] == 0),
-            :,
-        ]
-        building_info_df[["workers_needed", "workers_working", "workers_missing"]] = (
-            building_mem_df.loc[:, ["owner", "workers_needed", "workers_working", "workers_missing"]]
-            .groupby("owner")
-            .sum()
-        )
-        building_info_df["not_working"] = (
-            building_mem_df.loc[building_mem_df["workers_missing"] > 0, ["owner", "workers_missing"]]
-            .groupby("owner")
-            .size()
+        building_mem_df = self.list_buildings() if buildings is None else buildings
+        aggregates = BuildingAggregates()
+        aggregates.visit({col: building_mem_df[col].to_numpy() for col in BUILDING_COLUMNS})
+        return aggregates.stats()
+
+
+class BuildingAggregates:
+    """Per player building and worker counts, folded from the building table one chunk at a time."""
+
+    false_worker_ids = [1, 2, 8, 9, 21, 29]
+    ground_ids = [53, 55, 56, 57, 58, 59]
+    keep_ids = [71, 72, 73]
+    siege_engines = [80, 81, 82, 83, 84, 86, 87]
+
+    def __init__(self, num_ids: int = 256, num_players: int = 9) -> None:
+        """Initialize the empty counts.
+
+        Args:
+            num_ids (int, optional): number of building type ids counted. Defaults to 256.
+            num_players (int, optional): number of players including neutral. Defaults to 9.
+        """
+        self.num_ids = num_ids
+        self.num_players = num_players
+        self.counts = np.zeros((num_players, num_ids), dtype=np.int64)
+        self.totals = {col: np.zeros(num_players, dtype=np.int64) for col in BUILDING_COUNTS}
+
+    def visit(self, buildings: dict[str, np.ndarray]) -> None:
+        """Add the buildings of a chunk.
+
+        Args:
+            buildings (dict[str, np.ndarray]): `ID`, `owner` and worker columns of each building
+        """
+        owners = buildings["owner"].astype(np.intp)
+        ids = buildings["ID"].astype(np.intp)
+        mask = (owners >= 0) & (owners < self.num_players)
+        counted = mask & (ids < self.num_ids)
+        self.counts += np.bincount(owners[counted] * self.num_ids + ids[counted], minlength=self.counts.size).reshape(
+            self.counts.shape
         )
-        return building_info_df.reset_index(names=["p_ID"])
+        mask &= ~np.isin(ids, self.ground_ids + self.keep_ids + self.siege_engines)
+        snoozed = buildings["snoozed"]
+        working = mask & ~np.isin(ids, self.false_worker_ids) & (snoozed == 0)
+        totals = {
+            "num_buildings": np.bincount(owners[mask], minlength=self.num_players),
+            "snoozed": np.bincount(owners[mask & (snoozed == 1)], minlength=self.num_players),
+            "not_working": np.bincount(
+                owners[working & (buildings["workers_missing"] > 0)], minlength=self.num_players
+            ),
+            **{
+                col: np.bincount(owners[working], weights=buildings[col][working], minlength=self.num_players)
+                for col in ("workers_needed", "workers_working", "workers_missing")
+            },
+        }
+        for col, values in totals.items():
+            self.totals[col] += values.astype(np.int64)
+
+    def stats(self) -> pd.DataFrame:
+        """Get the building stats of all players owning buildings.
+
+        Returns:
+            pd.DataFrame: building and worker counts per `p_ID`
+        """
+        p_ids = np.flatnonzero(self.totals["num_buildings"])
+        return pd.DataFrame({"p_ID": p_ids, **{col: self.totals[col][p_ids] for col in BUILDING_COUNTS}})
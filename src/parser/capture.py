@@ -0,0 +1,234 @@
+"""This script contains the raw memory capture file format.
+
+A capture file stores the raw memory blocks needed to decode game ticks, so that stats can be
+(re)computed offline with the same layouts and aggregation code used for live reading.
+
+File layout (little endian):
+    header:  magic ``SHCCAP`` | format version (uint16)
+    record:  magic ``TICK`` | tick (uint32) | timestamp (float64) | number of blocks (uint32)
+    block:   address (uint64) | size (uint32) | raw bytes
+"""
+
+import bisect
+import logging
+import mmap
+import pathlib
+import struct
+import time
+from typing import BinaryIO, Iterator
+
+from .read_data import (
+    D_Types,
+    MemoryReadError,
+    MemorySource,
+    band_span,
+    chunk_size,
+    decode_memory_chunk,
+    extract_bands,
+    sort_offsets,
+)
+
+logger = logging.getLogger(__name__)
+
+CAPTURE_MAGIC = b"SHCCAP"
+CAPTURE_VERSION = 1
+FILE_HEADER = struct.Struct("<6sH")
+RECORD_HEADER = struct.Struct("<4sIdI")
+BLOCK_HEADER = struct.Struct("<QI")
+RECORD_MAGIC = b"TICK"
+
+
+class SnapshotMemory:
+    """Memory source reading from captured memory blocks instead of a live process."""
+
+    def __init__(self, blocks: dict[int, bytes | memoryview]) -> None:
+        """Initialize the snapshot.
+
+        Args:
+            blocks (dict[int, bytes | memoryview]): raw memory blocks by start address
+        """
+        self.blocks = blocks
+        self.addresses = sorted(blocks)
+
+    def read_bytes(self, address: int, size: int) -> bytes | memoryview:
+        """Read a raw memory block from the captured blocks.
+
+        Args:
+            address (int): start address
+            size (int): number of bytes
+
+        Raises:
+            MemoryReadError: The requested range was not captured.
+
+        Returns:
+            bytes | memoryview: view into the captured block
+        """
+        idx = bisect.bisect_right(self.addresses, address) - 1
+        if idx >= 0:
+            base = self.addresses[idx]
+            block = self.blocks[base]
+            start = address - base
+            if start + size <= len(block):
+                return block[start : start + size]  # noqa: E203
+        raise MemoryReadError(f"Range of {size} bytes not captured.", address=address)
+
+    def read_bands(self, address: int, stride: int, bands: list[tuple[int, int]], count: int) -> bytes:
+        """Read the byte bands, given by offset and size, of `count` records spaced `stride` bytes apart."""
+        if count == 0:
+            return b""
+        first, end = band_span(bands)
+        block = self.read_bytes(address + first, (count - 1) * stride + end - first)
+        return extract_bands(block, stride, [(offset - first, size) for offset, size in bands], count)
+
+    def read(self, address: int, dtype: D_Types) -> int | bool | str:
+        """Read a single value from the captured blocks."""
+        return decode_memory_chunk(self.read_bytes(address, chunk_size([0], [dtype])), [0], dtype)[0]
+
+    def read_chunk(
+        self, base_address: int, offsets: list[int], dtype: D_Types | list[D_Types]
+    ) -> list[int | str | bool]:
+        """Read values at several offsets from the captured blocks."""
+        offsets, dtype = sort_offsets(offsets, dtype)
+        return decode_memory_chunk(self.read_bytes(base_address, chunk_size(offsets, dtype)), offsets, dtype)
+
+
+class CaptureWriter:
+    """Append raw memory blocks of game ticks to a capture file."""
+
+    def __init__(self, path: str | pathlib.Path) -> None:
+        """Open the capture file, writing the header if the file is new.
+
+        Args:
+            path (str | pathlib.Path): capture file path
+        """
+        self.path = pathlib.Path(path)
+        is_new = not self.path.exists() or self.path.stat().st_size == 0
+        self.file: BinaryIO = open(self.path, "ab")
+        if is_new:
+            self.file.write(FILE_HEADER.pack(CAPTURE_MAGIC, CAPTURE_VERSION))
+
+    def write_tick(self, tick: int, blocks: list[tuple[int, bytes]], timestamp: float | None = None) -> None:
+        """Append one tick record.
+
+        Args:
+            tick (int): tick number
+            blocks (list[tuple[int, bytes]]): address and raw bytes of each memory block
+            timestamp (float | None, optional): unix time of the read. Defaults to now.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        self.file.write(RECORD_HEADER.pack(RECORD_MAGIC, tick, timestamp, len(blocks)))
+        for address, data in blocks:
+            self.file.write(BLOCK_HEADER.pack(address, len(data)))
+            self.file.write(data)
+
+    def capture_tick(self, tick: int, memory: MemorySource, regions: list[tuple[int, int]]) -> None:
+        """Read the given memory regions and append them as one tick record.
+
+        Args:
+            tick (int): tick number
+            memory (MemorySource): memory source to read from
+            regions (list[tuple[int, int]]): address and size of each block
+        """
+        timestamp = time.time()
+        self.write_tick(
+            tick, [(address, bytes(memory.read_bytes(address, size))) for address, size in regions], timestamp
+        )
+
+    def close(self) -> None:
+        """Flush and close the capture file."""
+        self.file.close()
+
+    def __enter__(self) -> "CaptureWriter":
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, *_) -> None:
+        """Close the file when leaving the context manager."""
+        self.close()
+
+
+class CaptureReader:
+    """Random access to the tick records of a memory mapped capture file."""
+
+    def __init__(self, path: str | pathlib.Path) -> None:
+        """Map the capture file into memory and validate the header.
+
+        Args:
+            path (str | pathlib.Path): capture file path
+
+        Raises:
+            ValueError: Not a capture file or unsupported version.
+        """
+        self.path = pathlib.Path(path)
+        with open(self.path, "rb") as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+        magic, version = FILE_HEADER.unpack_from(self.view, 0)
+        if magic != CAPTURE_MAGIC or version != CAPTURE_VERSION:
+            raise ValueError(f"{self.path} is not a version {CAPTURE_VERSION} capture file.")
+
+    def record_offsets(self) -> list[int]:
+        """Build the index of record start offsets by hopping over the record headers.
+
+        Returns:
+            list[int]: file offset of every complete tick record
+        """
+        offsets = []
+        pos = FILE_HEADER.size
+        end = len(self.view)
+        while pos + RECORD_HEADER.size <= end:
+            magic, _, _, n_blocks = RECORD_HEADER.unpack_from(self.view, pos)
+            if magic != RECORD_MAGIC:
+                raise ValueError(f"Corrupt capture record at offset {pos} of {self.path}.")
+            record_end = pos + RECORD_HEADER.size
+            for _ in range(n_blocks):
+                if record_end + BLOCK_HEADER.size > end:
+                    break
+                _, size = BLOCK_HEADER.unpack_from(self.view, record_end)
+                record_end += BLOCK_HEADER.size + size
+            if record_end > end:
+                logger.warning(f"Ignoring truncated record at offset {pos} of {self.path}.")
+                break
+            offsets.append(pos)
+            pos = record_end
+        return offsets
+
+    def read_record(self, offset: int) -> tuple[int, float, SnapshotMemory]:
+        """Read one tick record without copying the block payloads.
+
+        Args:
+            offset (int): file offset of the record
+
+        Returns:
+            tuple[int, float, SnapshotMemory]: tick, timestamp and captured memory
+        """
+        _, tick, timestamp, n_blocks = RECORD_HEADER.unpack_from(self.view, offset)
+        pos = offset + RECORD_HEADER.size
+        blocks: dict[int, bytes | memoryview] = {}
+        for _ in range(n_blocks):
+            address, size = BLOCK_HEADER.unpack_from(self.view, pos)
+            pos += BLOCK_HEADER.size
+            blocks[address] = self.view[pos : pos + size]  # noqa: E203
+            pos += size
+        return tick, timestamp, SnapshotMemory(blocks)
+
+    def __iter__(self) -> Iterator[tuple[int, float, SnapshotMemory]]:
+        """Iterate over all tick records in file order."""
+        for offset in self.record_offsets():
+            yield self.read_record(offset)
+
+    def close(self) -> None:
+        """Release the memory map.
+
+        Snapshots returned by `read_record` view into the map and must be dropped first.
+        """
+        self.view.release()
+        self.mmap.close()
+
+    def __enter__(self) -> "CaptureReader":
+        """Enter the context manager."""
+        return self
+
+    def __exit__(self, *_) -> None:
+        """Release the memory map when leaving the context manager."""
+        self.close()
@@ -0,0 +1,39 @@
+"""This script contains helpers to store tick tables column by column."""
+
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+
+def write_columns(df: pd.DataFrame, path: str | pathlib.Path) -> None:
+    """Write a dataframe as one compressed numpy array per column.
+
+    Args:
+        df (pd.DataFrame): tick table
+        path (str | pathlib.Path): output `.npz` file
+    """
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series) and series.hasnans:
+            columns[str(col)] = series.to_numpy(dtype=np.float64, na_value=np.nan)
+        elif pd.api.types.is_numeric_dtype(series):
+            columns[str(col)] = series.to_numpy()
+        else:
+            columns[str(col)] = series.astype(str).to_numpy(dtype=str)
+    np.savez_compressed(path, **columns)
+
+
+def read_columns(path: str | pathlib.Path, columns: list[str] | None = None) -> pd.DataFrame:
+    """Read a dataframe written by `write_columns`.
+
+    Args:
+        path (str | pathlib.Path): `.npz` file
+        columns (list[str] | None, optional): columns to load. Defaults to all.
+
+    Returns:
+        pd.DataFrame: tick table
+    """
+    with np.load(path) as data:
+        return pd.DataFrame({col: data[col] for col in (columns or data.files)})
@@ -0,0 +1,434 @@
+"""This script contains the derived metric stages computed from the raw values of each tick."""
+
+import re
+
+import numpy as np
+import pandas as pd
+
+
+def dense_weights(weights: dict) -> np.ndarray:
+    """Turn a weight mapping keyed by id into an array indexed by id.
+
+    Args:
+        weights (dict): weight per id
+
+    Returns:
+        np.ndarray: weights, zero for ids without a weight
+    """
+    ids = np.array([int(key) for key in weights], dtype=np.intp)
+    dense = np.zeros(ids.max() + 1, dtype=np.float64)
+    dense[ids] = list(weights.values())
+    return dense
+
+
+class StrengthScores:
+    """Weighted economic and military strength of each lord."""
+
+    def __init__(self, building_weights: dict, unit_weights: dict, resource_weights: dict, num_players: int = 9):
+        """Turn the weights into dense arrays once.
+
+        Args:
+            building_weights (dict): weight per building id
+            unit_weights (dict): weight per unit id
+            resource_weights (dict): weight per resource name
+            num_players (int, optional): number of players including neutral. Defaults to 9.
+        """
+        self.building_weights = dense_weights(building_weights)
+        self.unit_weights = dense_weights(unit_weights)
+        self.resources = [re.sub(r"(?<!^)(?=[A-Z])", "_", name).lower() for name in resource_weights]
+        self.resource_weights = np.array(list(resource_weights.values()), dtype=np.float64)
+        self.num_players = num_players
+
+    @staticmethod
+    def from_dict(config: dict) -> "StrengthScores":
+        """Instantiate the stage from the weights config.
+
+        Args:
+            config (dict): configuration dict
+
+        Returns:
+            StrengthScores: instantiated class object
+        """
+        return StrengthScores(config["Buildings"], config["Units"], config["Resources"])
+
+    def count_matrix(
+        self, owners: np.ndarray, ids: np.ndarray, num_ids: int, weights: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Count objects per owner and id.
+
+        Args:
+            owners (np.ndarray): owner of each object
+            ids (np.ndarray): type id of each object
+            num_ids (int): number of known type ids
+            weights (np.ndarray | None, optional): weight of each object instead of one. Defaults to None.
+
+        Returns:
+            np.ndarray: counts indexed by [owner, id]
+        """
+        mask = (owners >= 0) & (owners < self.num_players) & (ids >= 0) & (ids < num_ids)
+        flat_idx = owners[mask] * num_ids + ids[mask]
+        return np.bincount(
+            flat_idx, weights=None if weights is None else weights[mask], minlength=self.num_players * num_ids
+        ).reshape(self.num_players, num_ids)
+
+    def compute(self, tick_df: pd.DataFrame, buildings: pd.DataFrame, units: pd.DataFrame) -> pd.DataFrame:
+        """Compute the strength scores of all lords of a tick.
+
+        Args:
+            tick_df (pd.DataFrame): raw per lord stats of the tick
+            buildings (pd.DataFrame): building list of the tick
+            units (pd.DataFrame): unit list of the tick
+
+        Returns:
+            pd.DataFrame: `economic_strength`, `military_strength`, `hp_weighted_strength` and `resource_value`
+                per `p_ID`
+        """
+        building_counts = self.count_matrix(
+            buildings["owner"].to_numpy(dtype=np.intp),
+            buildings["ID"].to_numpy(dtype=np.intp),
+            len(self.building_weights),
+        )
+        owners = units["p_ID"].to_numpy(dtype=np.intp)
+        ids = units["ID"].to_numpy(dtype=np.intp)
+        cur_hp = units["cur_hp"].to_numpy(dtype=np.float64)
+        max_hp = units["max_hp"].to_numpy(dtype=np.float64)
+        health = np.divide(cur_hp, max_hp, out=np.ones(len(units)), where=max_hp > 0)
+        unit_counts = self.count_matrix(owners, ids, len(self.unit_weights))
+        unit_health = self.count_matrix(owners, ids, len(self.unit_weights), np.minimum(health, 1))
+        return self.compute_counts(tick_df, building_counts, unit_counts, unit_health)
+
+    def compute_counts(
+        self,
+        tick_df: pd.DataFrame,
+        building_counts: np.ndarray,
+        unit_counts: np.ndarray,
+        unit_health: np.ndarray | None = None,
+    ) -> pd.DataFrame:
+        """Compute the strength scores of all lords of a tick from object counts.
+
+        The hp weighted strength weighs every unit with its share of its maximum hit points, so a
+        wounded army scores lower than a fresh army of the same size.
+
+        Args:
+            tick_df (pd.DataFrame): raw per lord stats of the tick
+            building_counts (np.ndarray): buildings indexed by [owner, id], at least one column per weight
+            unit_counts (np.ndarray): units indexed by [owner, id], at least one column per weight
+            unit_health (np.ndarray | None, optional): summed health of the units indexed by [owner, id].
+                Defaults to unhurt units.
+
+        Returns:
+            pd.DataFrame: `economic_strength`, `military_strength`, `hp_weighted_strength` and `resource_value`
+                per `p_ID`
+        """
+        building_counts = building_counts[:, : len(self.building_weights)]
+        unit_counts = unit_counts[:, : len(self.unit_weights)]
+        unit_health = unit_counts if unit_health is None else unit_health[:, : len(self.unit_weights)]
+        p_ids = tick_df["p_ID"].to_numpy(dtype=np.intp)
+        stocks = tick_df.reindex(columns=self.resources).fillna(0).to_numpy(dtype=np.float64)
+        return pd.DataFrame(
+            {
+                "p_ID": p_ids,
+                "economic_strength": (building_counts @ self.building_weights)[p_ids],
+                "military_strength": (unit_counts @ self.unit_weights)[p_ids],
+                "hp_weighted_strength": (unit_health @ self.unit_weights)[p_ids].round(),
+                "resource_value": stocks @ self.resource_weights,
+            }
+        ).astype(
+            {
+                "economic_strength": np.int64,
+                "military_strength": np.int64,
+                "hp_weighted_strength": np.int64,
+                "resource_value": np.int64,
+            }
+        )
+
+
+class DiffMetric:
+    """Change of a stat per tick, game month or real time minute."""
+
+    def __init__(self, source: str, per: str, num_players: int = 9) -> None:
+        """Initialize the metric state.
+
+        Args:
+            source (str): source stat column
+            per (str): unit of the rate, one of `tick`, `month` or `minute`
+            num_players (int, optional): number of players including neutral. Defaults to 9.
+
+        Raises:
+            ValueError: Unknown rate unit.
+        """
+        if per not in ("tick", "month", "minute"):
+            raise ValueError(f"Unsupported rate unit '{per}'.")
+        self.source = source
+        self.per = per
+        self.num_players = num_players
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all previous ticks."""
+        self.last_value = np.full(self.num_players, np.nan)
+        self.last_clock = np.nan
+        self.ticks = 0
+        self.rate = np.full(self.num_players, np.nan)
+
+    def update(self, values: np.ndarray, month: int, timestamp: float) -> np.ndarray:
+        """Add the values of a new tick.
+
+        For monthly rates the change is only evaluated when the game month changes, in between
+        the rate of the last completed month is kept.
+
+        Args:
+            values (np.ndarray): source values indexed by player id
+            month (int): game month of the tick
+            timestamp (float): unix time of the tick
+
+        Returns:
+            np.ndarray: metric values indexed by player id
+        """
+        clock = {"month": float(month), "minute": timestamp / 60}.get(self.per, float(self.ticks))
+        self.ticks += 1
+        if np.isnan(self.last_clock):
+            self.last_value, self.last_clock = values, clock
+        elif clock > self.last_clock:
+            self.rate = (values - self.last_value) / (clock - self.last_clock)
+            self.last_value, self.last_clock = values, clock
+        return self.rate
+
+
+class RollingMetric:
+    """Rolling mean or sum of a stat over the last ticks."""
+
+    def __init__(self, source: str, window: int, mean: bool, num_players: int = 9) -> None:
+        """Initialize the ring buffer.
+
+        Args:
+            source (str): source stat column
+            window (int): number of ticks
+            mean (bool): return the mean instead of the sum
+            num_players (int, optional): number of players including neutral. Defaults to 9.
+        """
+        self.source = source
+        self.window = window
+        self.mean = mean
+        self.num_players = num_players
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all previous ticks."""
+        self.buffer = np.zeros((self.window, self.num_players))
+        self.total = np.zeros(self.num_players)
+        self.count = 0
+
+    def update(self, values: np.ndarray, month: int, timestamp: float) -> np.ndarray:
+        """Add the values of a new tick, replacing the oldest tick of the window.
+
+        Args:
+            values (np.ndarray): source values indexed by player id
+            month (int): game month of the tick
+            timestamp (float): unix time of the tick
+
+        Returns:
+            np.ndarray: metric values indexed by player id
+        """
+        values = np.nan_to_num(values)
+        slot = self.count % self.window
+        self.total += values - self.buffer[slot]
+        self.buffer[slot] = values
+        self.count += 1
+        return self.total / min(self.count, self.window) if self.mean else self.total.copy()
+
+
+class RateMetrics:
+    """Declarative derived stats evaluated incrementally with constant state per lord."""
+
+    def __init__(self, definitions: dict, num_players: int = 9) -> None:
+        """Build the metric states from their definitions.
+
+        Args:
+            definitions (dict): derived stat definitions by name
+            num_players (int, optional): number of players including neutral. Defaults to 9.
+
+        Raises:
+            ValueError: Unknown operation.
+        """
+        self.num_players = num_players
+        self.metrics: dict[str, DiffMetric | RollingMetric] = {}
+        for name, definition in definitions.items():
+            op = definition["op"]
+            if op == "diff":
+                self.metrics[name] = DiffMetric(definition["source"], definition.get("per", "tick"), num_players)
+            elif op in ("rolling_mean", "rolling_sum"):
+                self.metrics[name] = RollingMetric(
+                    definition["source"], definition["window"], op == "rolling_mean", num_players
+                )
+            else:
+                raise ValueError(f"Unsupported derived stat operation '{op}' of {name}.")
+
+    @staticmethod
+    def from_dict(config: dict) -> "RateMetrics":
+        """Instantiate the stage from the derived stats config.
+
+        Args:
+            config (dict): configuration dict
+
+        Returns:
+            RateMetrics: instantiated class object
+        """
+        return RateMetrics(config)
+
+    def reset(self) -> None:
+        """Forget the state of all metrics, e.g. when a new match starts."""
+        for metric in self.metrics.values():
+            metric.reset()
+
+    def compute(self, tick_df: pd.DataFrame, month: int, timestamp: float) -> pd.DataFrame:
+        """Update all metrics with a new tick.
+
+        Args:
+            tick_df (pd.DataFrame): per lord stats of the tick
+            month (int): game month of the tick, e.g. year * 12 + month
+            timestamp (float): unix time of the tick
+
+        Returns:
+            pd.DataFrame: derived stats per `p_ID`
+        """
+        p_ids = tick_df["p_ID"].to_numpy(dtype=np.intp)
+        result = {"p_ID": p_ids}
+        for name, metric in self.metrics.items():
+            values = np.full(self.num_players, np.nan)
+            if metric.source in tick_df.columns:
+                values[p_ids] = tick_df[metric.source].to_numpy(dtype=np.float64, na_value=np.nan)
+            result[name] = metric.update(values, month, timestamp)[p_ids]
+        return pd.DataFrame(result)
+
+    def compute_table(self, table: pd.DataFrame) -> pd.DataFrame:
+        """Evaluate all metrics over a recorded tick table in tick order.
+
+        Args:
+            table (pd.DataFrame): per lord stats with `time`, `timestamp` and `month` columns
+
+        Returns:
+            pd.DataFrame: table with the derived stats added
+        """
+        self.reset()
+        frames = []
+        for _, tick_df in table.groupby("time", sort=True):
+            month, timestamp = int(tick_df["month"].iloc[0]), float(tick_df["timestamp"].iloc[0])
+            frames.append(tick_df.merge(self.compute(tick_df, month, timestamp), how="left", on="p_ID"))
+        return pd.concat(frames, ignore_index=True)
+
+
+class TeamRollup:
+    """Team totals and averages of per lord stats, rolled up on every tick.
+
+    The lord to team assignment is kept as membership matrix, so the rollup of a tick is a single
+    matrix product over the per lord values. Lords without a team are left out.
+    """
+
+    def __init__(self, columns: list[str], num_teams: int = 8, num_players: int = 9) -> None:
+        """Initialize the rollup without team assignments.
+
+        Args:
+            columns (list[str]): stat columns rolled up
+            num_teams (int, optional): highest team number. Defaults to 8.
+            num_players (int, optional): number of players including neutral. Defaults to 9.
+        """
+        self.columns = columns
+        self.num_teams = num_teams
+        self.num_players = num_players
+        self.membership = np.zeros((num_teams, num_players))
+
+    @staticmethod
+    def from_dict(config: dict) -> "TeamRollup":
+        """Instantiate the stage from the team rollup config.
+
+        Args:
+            config (dict): configuration dict
+
+        Returns:
+            TeamRollup: instantiated class object
+        """
+        return TeamRollup(config["columns"])
+
+    @property
+    def output_columns(self) -> list[str]:
+        """Team total and `<col>_mean` average columns."""
+        return [*self.columns, *(f"{col}_mean" for col in self.columns)]
+
+    @property
+    def teams(self) -> np.ndarray:
+        """Team numbers with at least one lord."""
+        return np.flatnonzero(self.membership.any(axis=1)) + 1
+
+    def set_teams(self, p_ids: np.ndarray, teams: np.ndarray) -> bool:
+        """Update the team of every lord.
+
+        Args:
+            p_ids (np.ndarray): lord ids
+            teams (np.ndarray): team number of each lord, 0 for no team
+
+        Returns:
+            bool: True if the assignment changed
+        """
+        p_ids = np.asarray(p_ids, dtype=np.intp)
+        teams = np.asarray(teams, dtype=np.intp)
+        valid = (teams >= 1) & (teams <= self.num_teams) & (p_ids >= 0) & (p_ids < self.num_players)
+        membership = np.zeros_like(self.membership)
+        membership[teams[valid] - 1, p_ids[valid]] = 1
+        changed = not np.array_equal(membership, self.membership)
+        self.membership = membership
+        return changed
+
+    def rollup(self, values: np.ndarray) -> np.ndarray:
+        """Sum and average the values of the lords of every team.
+
+        Args:
+            values (np.ndarray): stat values indexed by [..., p_ID, column]
+
+        Returns:
+            np.ndarray: totals followed by averages indexed by [..., team - 1, column], NaN for teams without values
+        """
+        present = ~np.isnan(values)
+        sums = self.membership @ np.where(present, values, 0)
+        counts = self.membership @ present
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.concatenate(
+                (np.where(counts > 0, sums, np.nan), np.where(counts > 0, sums / counts, np.nan)), axis=-1
+            )
+
+    def compute(self, tick_df: pd.DataFrame) -> pd.DataFrame:
+        """Roll up the per lord stats of a tick.
+
+        Args:
+            tick_df (pd.DataFrame): per lord stats of the tick
+
+        Returns:
+            pd.DataFrame: `team` and the output columns per team with lords
+        """
+        values = np.full((self.num_players, len(self.columns)), np.nan)
+        p_ids = tick_df["p_ID"].to_numpy(dtype=np.intp)
+        for i, col in enumerate(self.columns):
+            if col in tick_df.columns:
+                values[p_ids, i] = tick_df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        teams = self.teams
+        rolled = self.rollup(values)[teams - 1]
+        return pd.DataFrame({"team": teams, **dict(zip(self.output_columns, rolled.T))})
+
+    def compute_table(self, table: pd.DataFrame) -> tuple[pd.DataFrame, np.ndarray]:
+        """Roll up a recorded tick table with the current team assignment in one pass.
+
+        Args:
+            table (pd.DataFrame): per lord stats with `p_ID`, `time`, `timestamp` and `month` columns
+
+        Returns:
+            tuple[pd.DataFrame, np.ndarray]: `time`, `timestamp` and `month` of each tick and the output
+                columns indexed by [tick, team - 1, column]
+        """
+        ticks = table.groupby("time", sort=True)[["timestamp", "month"]].last().reset_index()
+        values = np.full((len(ticks), self.num_players, len(self.columns)), np.nan)
+        tick_idx = np.searchsorted(ticks["time"].to_numpy(), table["time"].to_numpy())
+        p_ids = table["p_ID"].to_numpy(dtype=np.intp)
+        for i, col in enumerate(self.columns):
+            if col in table.columns:
+                values[tick_idx, p_ids, i] = table[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        return ticks, self.rollup(values)
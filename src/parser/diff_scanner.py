@@ -0,0 +1,292 @@
+"""Rank the byte offsets of a struct array by how their values change over a series of snapshots.
+
+Every field width and offset of every record is compared between consecutive snapshots at once,
+so the statistics of multi megabyte regions over hundreds of snapshots are gathered in seconds.
+Offsets are ranked by change frequency, value range and the correlation of their changes with
+the changes of known fields of the same record.
+
+Usage:
+    python -m src.parser.diff_scanner CAPTURE (--layout {unit,building,lord} | --base ADDR --stride N)
+        [--count N] [--known NAME=OFFSET:WIDTH ...] [--widths 1 2 4] [--unaligned] [--top N]
+"""
+
+import argparse
+import logging
+import pathlib
+import time
+
+import numpy as np
+import pandas as pd
+
+from .capture import CaptureReader
+from .read_data import D_Types, read_config, type_sizes
+
+logger = logging.getLogger(__name__)
+
+
+def field_values(records: np.ndarray, width: int, aligned: bool = True) -> tuple[np.ndarray, np.ndarray]:
+    """Decode the little endian unsigned value of a field width at every offset of every record.
+
+    Args:
+        records (np.ndarray): raw records of shape (records, stride)
+        width (int): field width in bytes
+        aligned (bool, optional): only decode offsets aligned to the width. Defaults to True.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: offsets and values of shape (records, offsets) with the unsigned
+            dtype of the width
+    """
+    stride = records.shape[1]
+    dtype = np.dtype(f"<u{width}")
+    if aligned:
+        usable = stride - stride % width
+        return np.arange(0, usable, width), records[:, :usable].copy().view(dtype)
+    offsets = np.arange(stride - width + 1)
+    values = np.zeros((records.shape[0], len(offsets)), dtype=dtype)
+    for k in range(width):
+        values |= records[:, k : k + len(offsets)].astype(dtype) << dtype.type(8 * k)  # noqa: E203
+    return offsets, values
+
+
+class WidthStats:
+    """Running statistics of all offsets of one field width."""
+
+    def __init__(self, offsets: np.ndarray, dtype: np.dtype, known: list[str]) -> None:
+        """Initialize the empty statistics.
+
+        Args:
+            offsets (np.ndarray): decoded offsets
+            dtype (np.dtype): unsigned dtype of the field width
+            known (list[str]): names of the known fields to correlate with
+        """
+        num = len(offsets)
+        self.offsets = offsets
+        self.previous: np.ndarray | None = None
+        self.changes = np.zeros(num, dtype=np.int64)
+        self.min = np.full(num, np.iinfo(dtype).max, dtype=dtype)
+        self.max = np.zeros(num, dtype=dtype)
+        self.sum_d = np.zeros(num)
+        self.sum_dd = np.zeros(num)
+        self.sum_de = {name: np.zeros(num) for name in known}
+
+
+class DiffScanner:
+    """Collect change statistics of every field of a struct array over a series of snapshots."""
+
+    def __init__(
+        self,
+        stride: int,
+        count: int,
+        widths: tuple[int, ...] = (1, 2, 4),
+        aligned: bool = True,
+        known: dict[str, tuple[int, int]] | None = None,
+    ) -> None:
+        """Initialize the scanner.
+
+        Args:
+            stride (int): size of one record in bytes
+            count (int): number of records compared
+            widths (tuple[int, ...], optional): field widths in bytes. Defaults to (1, 2, 4).
+            aligned (bool, optional): only scan offsets aligned to the width. Defaults to True.
+            known (dict[str, tuple[int, int]] | None, optional): offset and width of known fields. Defaults to None.
+        """
+        self.stride = stride
+        self.count = count
+        self.widths = widths
+        self.aligned = aligned
+        self.known = known or {}
+        self.num_snapshots = 0
+        self.stats: dict[int, WidthStats] = {}
+        self.previous_known: dict[str, np.ndarray] = {}
+        self.sum_e = {name: 0.0 for name in self.known}
+        self.sum_ee = {name: 0.0 for name in self.known}
+
+    def update(self, block: bytes | memoryview) -> None:
+        """Add the next snapshot of the struct array.
+
+        Args:
+            block (bytes | memoryview): raw bytes starting at the first record
+
+        Raises:
+            ValueError: The block holds fewer than `count` records.
+        """
+        size = self.stride * self.count
+        if len(block) < size:
+            raise ValueError(f"Snapshot holds {len(block) // self.stride} of {self.count} records.")
+        records = np.frombuffer(block, dtype=np.uint8, count=size).reshape(self.count, self.stride)
+        known = {}
+        for name, (offset, width) in self.known.items():
+            _, values = field_values(records[:, offset : offset + width], width)  # noqa: E203
+            known[name] = values[:, 0].astype(np.float64)
+        deltas_e = {}
+        if self.num_snapshots:
+            for name, values in known.items():
+                deltas_e[name] = values - self.previous_known[name]
+                self.sum_e[name] += deltas_e[name].sum()
+                self.sum_ee[name] += np.dot(deltas_e[name], deltas_e[name])
+        for width in self.widths:
+            offsets, values = field_values(records, width, self.aligned)
+            stats = self.stats.setdefault(width, WidthStats(offsets, values.dtype, list(self.known)))
+            np.minimum(stats.min, values.min(axis=0), out=stats.min)
+            np.maximum(stats.max, values.max(axis=0), out=stats.max)
+            if stats.previous is not None:
+                changed = values != stats.previous
+                changes = np.count_nonzero(changed, axis=0)
+                stats.changes += changes
+                # Most fields do not change between two snapshots, only those need the delta sums
+                cols = np.flatnonzero(changes)
+                if len(cols):
+                    deltas = values[:, cols].astype(np.float64) - stats.previous[:, cols]
+                    stats.sum_d[cols] += deltas.sum(axis=0)
+                    stats.sum_dd[cols] += np.einsum("ij,ij->j", deltas, deltas)
+                    for name, delta_e in deltas_e.items():
+                        stats.sum_de[name][cols] += delta_e @ deltas
+            stats.previous = values
+        self.previous_known = known
+        self.num_snapshots += 1
+
+    def result(self, drop_constant: bool = True) -> pd.DataFrame:
+        """Rank the scanned fields.
+
+        The correlation columns hold the Pearson correlation between the changes of a field and the
+        changes of a known field, pooled over all records and snapshot pairs.
+
+        Args:
+            drop_constant (bool, optional): leave out fields that never changed. Defaults to True.
+
+        Returns:
+            pd.DataFrame: `offset`, `width`, `change_rate`, `min`, `max` and `corr_<known>` per field,
+                sorted by the strongest correlation, then by change rate
+        """
+        samples = max(self.num_snapshots - 1, 0) * self.count
+        frames = []
+        for width, stats in self.stats.items():
+            df = pd.DataFrame(
+                {
+                    "offset": stats.offsets,
+                    "width": width,
+                    "change_rate": stats.changes / max(samples, 1),
+                    "min": stats.min,
+                    "max": stats.max,
+                }
+            )
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean_d = stats.sum_d / max(samples, 1)
+                var_d = stats.sum_dd / max(samples, 1) - mean_d**2
+                for name in self.known:
+                    mean_e = self.sum_e[name] / max(samples, 1)
+                    var_e = self.sum_ee[name] / max(samples, 1) - mean_e**2
+                    cov = stats.sum_de[name] / max(samples, 1) - mean_d * mean_e
+                    df[f"corr_{name}"] = cov / np.sqrt(var_d * var_e)
+            frames.append(df)
+        if not frames:
+            return pd.DataFrame(columns=["offset", "width", "change_rate", "min", "max"])
+        result = pd.concat(frames, ignore_index=True)
+        if drop_constant:
+            result = result.loc[result["change_rate"] > 0]
+        corr_cols = [f"corr_{name}" for name in self.known]
+        if corr_cols:
+            result = result.assign(_score=result[corr_cols].abs().max(axis=1).fillna(0))
+            result = result.sort_values(["_score", "change_rate"], ascending=False).drop(columns="_score")
+        else:
+            result = result.sort_values("change_rate", ascending=False)
+        return result.reset_index(drop=True)
+
+
+def layout_preset(layout: str) -> tuple[int, int, dict[str, tuple[int, int]]]:
+    """Get base address, stride and known fields of a configured memory layout.
+
+    Args:
+        layout (str): `unit`, `building` or `lord` (first detailed lord stat block)
+
+    Returns:
+        tuple[int, int, dict[str, tuple[int, int]]]: base address, stride and known fields
+    """
+    if layout == "unit":
+        config = read_config("unit", "memory")
+        offsets = {key: value for key, value in config["offsets"].items() if key not in ("offset", "unknown")}
+        known = {name: (offset, type_sizes[D_Types.WORD]) for name, offset in offsets.items()}
+        return config["address"], config["offsets"]["offset"], known
+    if layout == "building":
+        config = read_config("building", "memory")
+        offsets = {key: value for key, value in config["offsets"].items() if key != "offset"}
+        known = {name.removesuffix("offset"): (offset, type_sizes[D_Types.WORD]) for name, offset in offsets.items()}
+        return config["address"], config["offsets"]["offset"], known
+    if layout == "lord":
+        config = read_config("lord", "memory")["lord_stat_offsets"]
+        block = config["memory"][0]
+        known = {
+            extra_off["name"]: (extra_off["offset"], type_sizes[D_Types[extra_off["type"].upper()]])
+            for extra_off in block["stat_offsets"]
+        }
+        return block["address"], config["offset"], known
+    raise ValueError(f"Unknown layout {layout}.")
+
+
+def scan_capture(
+    path: str | pathlib.Path,
+    base: int,
+    stride: int,
+    count: int | None = None,
+    known: dict[str, tuple[int, int]] | None = None,
+    widths: tuple[int, ...] = (1, 2, 4),
+    aligned: bool = True,
+) -> pd.DataFrame:
+    """Scan a struct array over all tick records of a capture file.
+
+    Args:
+        path (str | pathlib.Path): capture file path
+        base (int): address of the first record
+        stride (int): size of one record in bytes
+        count (int | None, optional): number of records. Defaults to the most records present in every tick.
+        known (dict[str, tuple[int, int]] | None, optional): offset and width of known fields. Defaults to None.
+        widths (tuple[int, ...], optional): field widths in bytes. Defaults to (1, 2, 4).
+        aligned (bool, optional): only scan offsets aligned to the width. Defaults to True.
+
+    Returns:
+        pd.DataFrame: ranked fields, see `DiffScanner.result`
+    """
+    reader = CaptureReader(path)
+    offsets = reader.record_offsets()
+    if count is None:
+        count = min(len(reader.read_record(offset)[2].blocks.get(base, b"")) for offset in offsets) // stride
+    scanner = DiffScanner(stride, count, widths, aligned, known)
+    start = time.perf_counter()
+    for offset in offsets:
+        _, _, memory = reader.read_record(offset)
+        scanner.update(memory.read_bytes(base, stride * count))
+        del memory
+    logger.info(
+        f"Scanned {scanner.num_snapshots} snapshots of {count} records ({stride * count / 2**20:.1f} MiB) "
+        f"in {time.perf_counter() - start:.1f}s."
+    )
+    result = scanner.result()
+    reader.close()
+    return result
+
+
+def parse_known(value: str) -> tuple[str, tuple[int, int]]:
+    """Parse a known field argument of the form NAME=OFFSET:WIDTH."""
+    name, field = value.split("=")
+    offset, width = field.split(":")
+    return name, (int(offset, 0), int(width))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rank struct offsets by how they change over captured ticks.")
+    parser.add_argument("capture", type=pathlib.Path)
+    parser.add_argument("--layout", choices=["unit", "building", "lord"])
+    parser.add_argument("--base", type=lambda value: int(value, 0))
+    parser.add_argument("--stride", type=lambda value: int(value, 0))
+    parser.add_argument("--count", type=int, default=None)
+    parser.add_argument("--known", type=parse_known, action="append", default=[])
+    parser.add_argument("--widths", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--unaligned", action="store_true")
+    parser.add_argument("--top", type=int, default=50)
+    args = parser.parse_args()
+    base, stride, known = layout_preset(args.layout) if args.layout else (args.base, args.stride, {})
+    known.update(dict(args.known))
+    ranked = scan_capture(args.capture, base, stride, args.count, known, tuple(args.widths), not args.unaligned)
+    ranked["offset"] = ranked["offset"].map(hex)
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(ranked.head(args.top).to_string())
@@ -0,0 +1,346 @@
+"""This script contains the extraction of unit and building events from consecutive tick snapshots."""
+
+import numpy as np
+import pandas as pd
+
+from .building import Building
+from .schema import TOTAL_DTYPE
+from .unit import Unit, UnitAggregates
+
+EVENT_TYPES = ["spawned", "died", "damaged", "building_built", "building_lost"]
+EVENT_COLUMNS = ["time", "event", "p_ID", "ID", "name", "count", "value"]
+EVENT_DTYPES = {
+    "time": np.int64,
+    "event": np.int8,
+    "p_ID": np.uint8,
+    "ID": np.uint16,
+    "name": object,
+    "count": np.uint32,
+    "value": np.float32,
+}
+
+
+class SlotTable:
+    """Snapshot of a game object table, indexed by the slot of each object in the table."""
+
+    def __init__(self, base: int, stride: int) -> None:
+        """Initialize the empty snapshot.
+
+        Args:
+            base (int): address of the first slot
+            stride (int): size of one slot in bytes
+        """
+        self.base = base
+        self.stride = stride
+        self.present: np.ndarray = np.zeros(0, dtype=bool)
+        self.ids: np.ndarray = np.zeros(0, dtype=np.uint16)
+        self.owners: np.ndarray = np.zeros(0, dtype=np.uint16)
+        self.hp: np.ndarray = np.zeros(0, dtype=np.uint16)
+
+    def blank(self, size: int) -> "SlotTable":
+        """Create an empty snapshot with the same base and stride.
+
+        Args:
+            size (int): number of slots to allocate
+
+        Returns:
+            SlotTable: snapshot without objects
+        """
+        return SlotTable(self.base, self.stride).resize(size)
+
+    def fill(self, addresses: np.ndarray, ids: np.ndarray, owners: np.ndarray, hp: np.ndarray | None) -> None:
+        """Store objects read from memory in their slots, growing the snapshot as needed.
+
+        Args:
+            addresses (np.ndarray): address of each object
+            ids (np.ndarray): type id of each object
+            owners (np.ndarray): owning player of each object
+            hp (np.ndarray | None): hit points of each object, None if the table has none
+        """
+        slots = self.slots(addresses)
+        if len(slots) and slots.max() >= len(self.present):
+            self.resize(max(int(slots.max()) + 1, 2 * len(self.present)))
+        self.present[slots] = True
+        self.ids[slots] = ids
+        self.owners[slots] = owners
+        if hp is not None:
+            self.hp[slots] = hp
+
+    def slots(self, addresses: np.ndarray) -> np.ndarray:
+        """Get the slot index of each object address."""
+        return (addresses.astype(np.int64) - self.base) // self.stride
+
+    def resize(self, size: int) -> "SlotTable":
+        """Pad the snapshot with empty slots.
+
+        Args:
+            size (int): number of slots, at least the current number
+
+        Returns:
+            SlotTable: self with `size` slots
+        """
+        pad = size - len(self.present)
+        if pad > 0:
+            self.present = np.concatenate((self.present, np.zeros(pad, dtype=bool)))
+            self.ids = np.concatenate((self.ids, np.zeros(pad, dtype=np.uint16)))
+            self.owners = np.concatenate((self.owners, np.zeros(pad, dtype=np.uint16)))
+            self.hp = np.concatenate((self.hp, np.zeros(pad, dtype=np.uint16)))
+        return self
+
+
+class EventLog:
+    """Events of the running match, stored column by column in tick order.
+
+    Events are appended once per tick, so the log is sorted by tick and the events from a tick on
+    are found by bisection instead of scanning the whole match. The columns double their capacity
+    when full.
+    """
+
+    def __init__(self, capacity: int = 1024) -> None:
+        """Initialize the empty log.
+
+        Args:
+            capacity (int, optional): initially allocated number of events. Defaults to 1024.
+        """
+        self._columns = {col: np.zeros(capacity, dtype=dtype) for col, dtype in EVENT_DTYPES.items()}
+        self.size = 0
+
+    @property
+    def times(self) -> np.ndarray:
+        """Tick of each logged event in ascending order."""
+        return self._columns["time"][: self.size]
+
+    def append(self, events: pd.DataFrame) -> None:
+        """Log the events of one tick.
+
+        Args:
+            events (pd.DataFrame): events of a tick after the logged ticks, see `EventTracker.finish`
+        """
+        num_events = len(events)
+        if not num_events:
+            return
+        capacity = len(self._columns["time"])
+        if self.size + num_events > capacity:
+            grown = max(2 * capacity, self.size + num_events)
+            for col, values in self._columns.items():
+                self._columns[col] = np.concatenate((values, np.zeros(grown - capacity, dtype=values.dtype)))
+        stop = self.size + num_events
+        for col, values in self._columns.items():
+            column = events[col].cat.codes if col == "event" else events[col]
+            values[self.size : stop] = column.to_numpy()  # noqa: E203
+        self.size = stop
+
+    def frame(self, since: int | None = None) -> pd.DataFrame:
+        """Get the logged events as a copy.
+
+        Args:
+            since (int | None, optional): first tick to include. Defaults to the first logged tick.
+
+        Returns:
+            pd.DataFrame: events in tick order with the `EVENT_COLUMNS`
+        """
+        start = 0 if since is None else int(np.searchsorted(self.times, since, side="left"))
+        columns = {col: values[start : self.size].copy() for col, values in self._columns.items()}  # noqa: E203
+        columns["event"] = pd.Categorical.from_codes(columns["event"], categories=EVENT_TYPES)
+        return pd.DataFrame(columns, columns=EVENT_COLUMNS)
+
+    def reset(self) -> None:
+        """Forget all logged events, e.g. when a new match starts."""
+        self.size = 0
+        self._columns["name"][:] = None
+
+
+class EventTracker:
+    """Diff the unit and building tables of consecutive ticks into typed events.
+
+    Objects are matched by their slot in the game's object table, a slot holding an object of
+    another type or owner than in the previous tick counts as a new object. Both snapshots are
+    scattered into arrays indexed by slot, so the diff is linear in the table size. The tables of
+    a tick are either passed as lists to `update` or chunk by chunk between `begin` and `finish`.
+    Events are aggregated per tick, event type, player and object type. The hit points lost by
+    the army of every player, by damage and by units that died, are kept in `army_hp_lost`.
+    """
+
+    def __init__(
+        self,
+        unit_base: int,
+        unit_stride: int,
+        building_base: int,
+        building_stride: int,
+        unit_names: dict[int, str],
+        building_names: dict[int, str],
+        num_players: int = 9,
+    ) -> None:
+        """Initialize the tracker without a previous tick.
+
+        Args:
+            unit_base (int): address of the unit table
+            unit_stride (int): size of one unit in bytes
+            building_base (int): address of the building table
+            building_stride (int): size of one building in bytes
+            unit_names (dict[int, str]): unit names by type id
+            building_names (dict[int, str]): building names by type id
+            num_players (int, optional): number of players including neutral. Defaults to 9.
+        """
+        self.units = SlotTable(unit_base, unit_stride)
+        self.buildings = SlotTable(building_base, building_stride)
+        self.units_now = self.units
+        self.buildings_now = self.buildings
+        self.unit_names = unit_names
+        self.building_names = building_names
+        self.num_players = num_players
+        self.army_hp_lost: np.ndarray = np.zeros(num_players, dtype=np.int64)
+        self.has_previous = False
+
+    @staticmethod
+    def from_readers(unit: Unit, building: Building) -> "EventTracker":
+        """Instantiate the tracker with the table layouts of the memory readers.
+
+        Args:
+            unit (Unit): unit reader
+            building (Building): building reader
+
+        Returns:
+            EventTracker: instantiated class object
+        """
+        return EventTracker(
+            unit.base, unit.offset, building.base, building.offset, unit.unit_names, building.building_names
+        )
+
+    def reset(self) -> None:
+        """Forget the previous tick, e.g. when a new match starts."""
+        self.units = SlotTable(self.units.base, self.units.stride)
+        self.buildings = SlotTable(self.buildings.base, self.buildings.stride)
+        self.army_hp_lost = np.zeros(self.num_players, dtype=np.int64)
+        self.has_previous = False
+
+    @staticmethod
+    def _diff(previous: SlotTable, current: SlotTable) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        previous.resize(len(current.present))
+        same = (
+            previous.present & current.present
+            & (previous.ids == current.ids) & (previous.owners == current.owners)
+        )  # fmt: skip
+        return np.flatnonzero(previous.present & ~same), np.flatnonzero(current.present & ~same), same
+
+    def begin(self) -> None:
+        """Start collecting the tables of a new tick."""
+        self.units_now = self.units.blank(len(self.units.present))
+        self.buildings_now = self.buildings.blank(len(self.buildings.present))
+
+    def visit_units(self, units: dict[str, np.ndarray]) -> None:
+        """Add a chunk of the unit table of the current tick, see `Unit.fold_units`.
+
+        Args:
+            units (dict[str, np.ndarray]): `address`, `ID`, `p_ID` and `cur_hp` of each unit
+        """
+        self.units_now.fill(units["address"], units["ID"], units["p_ID"], units["cur_hp"])
+
+    def visit_buildings(self, buildings: dict[str, np.ndarray]) -> None:
+        """Add a chunk of the building table of the current tick, see `Building.fold_buildings`.
+
+        Args:
+            buildings (dict[str, np.ndarray]): `address`, `ID` and `owner` of each building
+        """
+        self.buildings_now.fill(buildings["address"], buildings["ID"], buildings["owner"], None)
+
+    def finish(self, time: int) -> pd.DataFrame:
+        """Compare the collected tables of the current tick with the previous tick.
+
+        Args:
+            time (int): tick number
+
+        Returns:
+            pd.DataFrame: `time`, `event`, `p_ID`, `ID`, `name`, `count` and `value` (hit points lost) per
+                event group, empty for the first tick
+        """
+        units_now, buildings_now = self.units_now, self.buildings_now
+        units_now.resize(len(self.units.present))
+        buildings_now.resize(len(self.buildings.present))
+        parts = []
+        self.army_hp_lost = np.zeros(self.num_players, dtype=np.int64)
+        if self.has_previous:
+            died, spawned, same = self._diff(self.units, units_now)
+            hp_lost = np.where(same, self.units.hp.astype(np.int32) - units_now.hp, 0)
+            damaged = np.flatnonzero(hp_lost > 0)
+            self._fold_army_losses(damaged, hp_lost[damaged], died)
+            lost, built, _ = self._diff(self.buildings, buildings_now)
+            parts = [
+                ("spawned", units_now, spawned, None),
+                ("died", self.units, died, None),
+                ("damaged", units_now, damaged, hp_lost[damaged]),
+                ("building_built", buildings_now, built, None),
+                ("building_lost", self.buildings, lost, None),
+            ]
+        self.units, self.buildings = units_now, buildings_now
+        self.has_previous = True
+        return self._aggregate(time, parts)
+
+    def _fold_army_losses(self, damaged: np.ndarray, damage: np.ndarray, died: np.ndarray) -> None:
+        slots = np.concatenate((damaged, died))
+        lost = np.concatenate((damage, self.units.hp[died]))
+        owners = self.units.owners[slots].astype(np.intp)
+        mask = np.isin(self.units.ids[slots], UnitAggregates.army_ids) & (owners < self.num_players)
+        self.army_hp_lost = np.bincount(owners[mask], weights=lost[mask], minlength=self.num_players).astype(np.int64)
+
+    def losses(self) -> pd.DataFrame:
+        """Get the hit points lost by the army of every lord in the last finished tick.
+
+        Returns:
+            pd.DataFrame: `p_ID` and `army_hp_lost` per lord
+        """
+        return pd.DataFrame(
+            {
+                "p_ID": np.arange(1, self.num_players),
+                "army_hp_lost": self.army_hp_lost[1:].astype(TOTAL_DTYPE),
+            }
+        )
+
+    def update(self, time: int, units: pd.DataFrame, buildings: pd.DataFrame) -> pd.DataFrame:
+        """Compare the unit and building lists of a tick with the previous tick.
+
+        Args:
+            time (int): tick number
+            units (pd.DataFrame): `Unit.list_units` data of the tick
+            buildings (pd.DataFrame): `Building.list_buildings` data of the tick
+
+        Returns:
+            pd.DataFrame: events of the tick, see `finish`
+        """
+        self.begin()
+        self.visit_units({col: units[col].to_numpy() for col in ("address", "ID", "p_ID", "cur_hp")})
+        self.visit_buildings({col: buildings[col].to_numpy() for col in ("address", "ID", "owner")})
+        return self.finish(time)
+
+    def _aggregate(self, time: int, parts: list[tuple[str, SlotTable, np.ndarray, np.ndarray | None]]) -> pd.DataFrame:
+        frames = [
+            pd.DataFrame(
+                {
+                    "event": event,
+                    "p_ID": table.owners[slots],
+                    "ID": table.ids[slots],
+                    "value": values if values is not None else 0,
+                }
+            )
+            for event, table, slots, values in parts
+            if len(slots)
+        ]
+        if not frames:
+            return pd.DataFrame(columns=EVENT_COLUMNS)
+        events = (
+            pd.concat(frames, ignore_index=True)
+            .groupby(["event", "p_ID", "ID"], sort=False)["value"]
+            .agg(["size", "sum"])
+            .reset_index()
+            .rename(columns={"size": "count", "sum": "value"})
+        )
+        events["name"] = [
+            (self.building_names if event.startswith("building") else self.unit_names).get(int(type_id))
+            for event, type_id in zip(events["event"], events["ID"])
+        ]
+        events["time"] = time
+        events["event"] = pd.Categorical(events["event"], categories=EVENT_TYPES)
+        events["p_ID"] = events["p_ID"].astype(np.uint8)
+        events["count"] = events["count"].astype(np.uint32)
+        events["value"] = events["value"].astype(np.float32)
+        return events[EVENT_COLUMNS]
@@ -0,0 +1,389 @@
+"""This script contains the compact binary frame format of decoded ticks.
+
+A frame holds the stats of all lords at one tick as packed integers in the fixed column order of
+a schema. Values are quantized to the decimals of their column, and zigzag varint encoded as
+deltas to the previous frame, so stats unchanged since the last tick take a single byte. Every
+`keyframe_interval` frames, and whenever the schema changes, a keyframe is encoded on its own.
+Schemas are sent in band ahead of the first frame using them, a frame stream is self describing
+and the same bytes are written to disk and pushed to clients. Pushed streams also carry cursor
+records, telling the client which part of the history it holds.
+
+Stream layout (little endian):
+    file header:  magic ``SHCFRM`` | format version (uint16), only in files
+    schema:       magic ``SCHM`` | schema id (uint32) | JSON length (uint32) | JSON columns and decimals
+    cursor:       magic ``CURS`` | JSON length (uint32) | JSON cursor, only in streams
+    frame:        magic ``SHCF`` | format version (uint8) | keyframe (uint8) | schema id (uint32) | tick (uint32)
+                  | game month (int32) | timestamp (float64) | rows (uint16) | columns (uint16)
+                  | payload length (uint32) | rows x columns varints
+"""
+
+import json
+import logging
+import pathlib
+import struct
+import zlib
+from typing import BinaryIO
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+FILE_MAGIC = b"SHCFRM"
+FRAME_VERSION = 1
+FILE_HEADER = struct.Struct("<6sH")
+SCHEMA_HEADER = struct.Struct("<4sII")
+SCHEMA_MAGIC = b"SCHM"
+FRAME_HEADER = struct.Struct("<4sBBIIidHHI")
+FRAME_MAGIC = b"SHCF"
+CURSOR_HEADER = struct.Struct("<4sI")
+CURSOR_MAGIC = b"CURS"
+MAX_VARINT_BYTES = 10
+VARINT_SHIFTS = np.arange(MAX_VARINT_BYTES, dtype=np.uint64) * np.uint64(7)
+
+
+def zigzag(values: np.ndarray) -> np.ndarray:
+    """Map signed integers to unsigned ones, small magnitudes to small values."""
+    values = values.astype(np.int64, copy=False)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def unzigzag(values: np.ndarray) -> np.ndarray:
+    """Invert `zigzag`."""
+    return ((values >> np.uint64(1)) ^ (np.uint64(0) - (values & np.uint64(1)))).view(np.int64)
+
+
+def encode_varints(values: np.ndarray) -> bytes:
+    """Encode unsigned integers as little endian base 128 varints.
+
+    Args:
+        values (np.ndarray): uint64 values
+
+    Returns:
+        bytes: one to ten bytes per value
+    """
+    if not len(values):
+        return b""
+    groups = ((values[:, None] >> VARINT_SHIFTS) & np.uint64(0x7F)).astype(np.uint8)
+    lengths = 1 + np.count_nonzero(values[:, None] >> VARINT_SHIFTS[1:], axis=1)
+    positions = np.arange(MAX_VARINT_BYTES)
+    groups[positions < lengths[:, None] - 1] |= 0x80
+    return groups[positions < lengths[:, None]].tobytes()
+
+
+def decode_varints(data: bytes | memoryview, count: int) -> np.ndarray:
+    """Decode `count` varints written by `encode_varints`.
+
+    Args:
+        data (bytes | memoryview): encoded values
+        count (int): number of values
+
+    Raises:
+        ValueError: The data holds fewer values.
+
+    Returns:
+        np.ndarray: uint64 values
+    """
+    if count == 0:
+        return np.empty(0, dtype=np.uint64)
+    raw = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(raw < 0x80)[:count]
+    if len(ends) < count:
+        raise ValueError(f"Expected {count} varints, found {len(ends)}.")
+    raw = raw[: ends[-1] + 1]
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    positions = np.arange(len(raw)) - np.repeat(starts, ends - starts + 1)
+    parts = (raw & 0x7F).astype(np.uint64) << (positions.astype(np.uint64) * np.uint64(7))
+    return np.bitwise_or.reduceat(parts, starts)
+
+
+class FrameSchema:
+    """Fixed column order and decimals of the values in a frame."""
+
+    def __init__(self, columns: list[str], decimals: list[int]) -> None:
+        """Initialize the schema.
+
+        Args:
+            columns (list[str]): stat columns in frame order
+            decimals (list[int]): decimal places kept of every column
+        """
+        self.columns = list(columns)
+        self.decimals = [int(decimal) for decimal in decimals]
+        self.scale = 10.0 ** np.array(self.decimals, dtype=np.float64)
+        self.payload = json.dumps({"columns": self.columns, "decimals": self.decimals}).encode()
+        self.schema_id = zlib.crc32(self.payload)
+
+    @staticmethod
+    def from_columns(columns: list[str], integer_columns: set[str], decimals: int = 3) -> "FrameSchema":
+        """Keep integer columns exact and fractional columns to a number of decimals.
+
+        Args:
+            columns (list[str]): stat columns in frame order
+            integer_columns (set[str]): columns only holding integers, see `TickSchema.dtypes`
+            decimals (int, optional): decimal places kept of the other columns. Defaults to 3.
+
+        Returns:
+            FrameSchema: instantiated class object
+        """
+        return FrameSchema(columns, [0 if col in integer_columns else decimals for col in columns])
+
+    def encode(self) -> bytes:
+        """Encode the schema record announcing the schema in a frame stream."""
+        return SCHEMA_HEADER.pack(SCHEMA_MAGIC, self.schema_id, len(self.payload)) + self.payload
+
+    def quantize(self, values: np.ndarray) -> np.ndarray:
+        """Map stat values to unsigned codes, zero for missing values.
+
+        Args:
+            values (np.ndarray): stat values indexed by [row, column]
+
+        Returns:
+            np.ndarray: uint64 codes of the same shape
+        """
+        missing = np.isnan(values)
+        scaled = np.rint(np.where(missing, 0, values) * self.scale).astype(np.int64)
+        return np.where(missing, np.uint64(0), zigzag(scaled) + np.uint64(1))
+
+    def dequantize(self, codes: np.ndarray) -> np.ndarray:
+        """Invert `quantize`, missing values become NaN."""
+        values = unzigzag(codes - np.uint64(1)) / self.scale
+        return np.where(codes == 0, np.nan, values)
+
+
+def encode_cursor(cursor: dict) -> bytes:
+    """Encode a cursor record of a frame stream.
+
+    Args:
+        cursor (dict): JSON serializable cursor
+
+    Returns:
+        bytes: encoded record
+    """
+    payload = json.dumps(cursor, separators=(",", ":")).encode()
+    return CURSOR_HEADER.pack(CURSOR_MAGIC, len(payload)) + payload
+
+
+class FrameWriter:
+    """Encode the ticks of one match as a frame stream."""
+
+    def __init__(self, integer_columns: set[str], decimals: int = 3, keyframe_interval: int = 64) -> None:
+        """Initialize the writer, the first frame is a keyframe.
+
+        Args:
+            integer_columns (set[str]): columns only holding integers, see `TickSchema.dtypes`
+            decimals (int, optional): decimal places kept of the other columns. Defaults to 3.
+            keyframe_interval (int, optional): frames between two keyframes. Defaults to 64.
+        """
+        self.integer_columns = integer_columns
+        self.decimals = decimals
+        self.keyframe_interval = keyframe_interval
+        self.schema: FrameSchema | None = None
+        self.previous: np.ndarray | None = None
+        self.since_keyframe = 0
+
+    def encode(self, time: int, timestamp: float, month: int, columns: list[str], values: np.ndarray) -> bytes:
+        """Encode one tick, preceded by a schema record if its columns changed.
+
+        Args:
+            time (int): tick number
+            timestamp (float): unix time of the tick
+            month (int): game month of the tick, e.g. year * 12 + month
+            columns (list[str]): stat columns of `values`
+            values (np.ndarray): stat values indexed by [row, column], rows ordered by the key from 1
+
+        Returns:
+            bytes: encoded records
+        """
+        records = b""
+        if self.schema is None or self.schema.columns != columns:
+            self.schema = FrameSchema.from_columns(columns, self.integer_columns, self.decimals)
+            self.previous = None
+            records = self.schema.encode()
+        codes = self.schema.quantize(values)
+        keyframe = (
+            self.previous is None
+            or self.previous.shape != codes.shape
+            or self.since_keyframe >= self.keyframe_interval - 1
+        )
+        deltas = codes if keyframe else codes - self.previous
+        payload = encode_varints(zigzag(deltas.view(np.int64)).ravel())
+        self.since_keyframe = 0 if keyframe else self.since_keyframe + 1
+        self.previous = codes
+        rows, cols = codes.shape
+        header = FRAME_HEADER.pack(
+            FRAME_MAGIC,
+            FRAME_VERSION,
+            keyframe,
+            self.schema.schema_id,
+            time,
+            month,
+            timestamp,
+            rows,
+            cols,
+            len(payload),
+        )
+        return records + header + payload
+
+    def encode_table(self, df: pd.DataFrame, num_players: int = 8, key: str = "p_ID") -> bytes:
+        """Encode all ticks of a history table in tick order.
+
+        Args:
+            df (pd.DataFrame): `time`, `timestamp`, `month`, key and stat columns, see `TieredStore.frame`
+            num_players (int, optional): rows of every frame. Defaults to 8.
+            key (str, optional): row key column, numbered from 1. Defaults to `p_ID`.
+
+        Returns:
+            bytes: encoded records
+        """
+        columns = [col for col in df.columns if col not in (key, "time", "timestamp", "month")]
+        ticks = df.drop_duplicates("time").sort_values("time")
+        values = np.full((len(ticks), num_players, len(columns)), np.nan)
+        tick_idx = np.searchsorted(ticks["time"].to_numpy(), df["time"].to_numpy())
+        values[tick_idx, df[key].to_numpy(dtype=np.intp) - 1] = df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+        return b"".join(
+            self.encode(int(tick.time), float(tick.timestamp), int(tick.month), columns, tick_values)
+            for tick, tick_values in zip(ticks.itertuples(index=False), values)
+        )
+
+
+class FrameReader:
+    """Decode a frame stream fed in pieces of any size."""
+
+    def __init__(self) -> None:
+        """Initialize the reader."""
+        self.buffer = bytearray()
+        self.schemas: dict[int, FrameSchema] = {}
+        self.previous: np.ndarray | None = None
+        # Latest cursor record of the stream
+        self.cursor: dict | None = None
+
+    def feed(self, data: bytes) -> list[tuple[int, float, int, FrameSchema, np.ndarray]]:
+        """Decode all complete records received so far.
+
+        Schema and cursor records are kept in `schemas` and `cursor`.
+
+        Args:
+            data (bytes): next bytes of the stream
+
+        Raises:
+            ValueError: Corrupt stream or a delta frame without its preceding frame.
+
+        Returns:
+            list[tuple[int, float, int, FrameSchema, np.ndarray]]: tick, timestamp, game month, schema and
+                stat values indexed by [row, column] of every decoded frame
+        """
+        self.buffer += data
+        frames = []
+        pos = 0
+        view = memoryview(self.buffer)
+        while len(view) - pos >= len(SCHEMA_MAGIC):
+            magic = bytes(view[pos : pos + 4])  # noqa: E203
+            if magic == SCHEMA_MAGIC:
+                if len(view) - pos < SCHEMA_HEADER.size:
+                    break
+                _, schema_id, size = SCHEMA_HEADER.unpack_from(view, pos)
+                end = pos + SCHEMA_HEADER.size + size
+                if end > len(view):
+                    break
+                schema = json.loads(bytes(view[pos + SCHEMA_HEADER.size : end]))  # noqa: E203
+                self.schemas[schema_id] = FrameSchema(schema["columns"], schema["decimals"])
+            elif magic == CURSOR_MAGIC:
+                if len(view) - pos < CURSOR_HEADER.size:
+                    break
+                _, size = CURSOR_HEADER.unpack_from(view, pos)
+                end = pos + CURSOR_HEADER.size + size
+                if end > len(view):
+                    break
+                self.cursor = json.loads(bytes(view[pos + CURSOR_HEADER.size : end]))  # noqa: E203
+            elif magic == FRAME_MAGIC:
+                if len(view) - pos < FRAME_HEADER.size:
+                    break
+                _, version, keyframe, schema_id, time, month, timestamp, rows, cols, size = FRAME_HEADER.unpack_from(
+                    view, pos
+                )
+                end = pos + FRAME_HEADER.size + size
+                if end > len(view):
+                    break
+                if version != FRAME_VERSION or schema_id not in self.schemas:
+                    raise ValueError(f"Unsupported frame version {version} or unknown schema {schema_id}.")
+                deltas = unzigzag(decode_varints(view[pos + FRAME_HEADER.size : end], rows * cols))  # noqa: E203
+                codes = deltas.view(np.uint64).reshape(rows, cols)
+                if not keyframe:
+                    if self.previous is None or self.previous.shape != codes.shape:
+                        raise ValueError(f"Delta frame of tick {time} without its preceding frame.")
+                    codes = codes + self.previous
+                self.previous = codes
+                schema = self.schemas[schema_id]
+                frames.append((time, timestamp, month, schema, schema.dequantize(codes)))
+            else:
+                raise ValueError(f"Corrupt frame stream at offset {pos}.")
+            pos = end
+        view.release()
+        del self.buffer[:pos]
+        return frames
+
+    @staticmethod
+    def to_table(frames: list[tuple[int, float, int, FrameSchema, np.ndarray]], key: str = "p_ID") -> pd.DataFrame:
+        """Combine decoded frames into a history table.
+
+        Args:
+            frames (list[tuple[int, float, int, FrameSchema, np.ndarray]]): decoded frames, see `feed`
+            key (str, optional): row key column, numbered from 1. Defaults to `p_ID`.
+
+        Returns:
+            pd.DataFrame: key, `time`, `timestamp`, `month` and stat columns of all rows holding a value
+        """
+        tables = []
+        for time, timestamp, month, schema, values in frames:
+            table = pd.DataFrame(values, columns=schema.columns)
+            table.insert(0, key, np.arange(1, len(values) + 1))
+            table.insert(1, "time", time)
+            table.insert(2, "timestamp", timestamp)
+            table.insert(3, "month", month)
+            tables.append(table.loc[table[schema.columns].notna().any(axis=1)])
+        return (
+            pd.concat(tables, ignore_index=True)
+            if tables
+            else pd.DataFrame(columns=[key, "time", "timestamp", "month"])
+        )
+
+
+def open_frame_file(path: str | pathlib.Path) -> BinaryIO:
+    """Open a frame file for appending, writing the header if the file is new.
+
+    Args:
+        path (str | pathlib.Path): frame file path
+
+    Returns:
+        BinaryIO: file to write the records of a `FrameWriter` to
+    """
+    path = pathlib.Path(path)
+    is_new = not path.exists() or path.stat().st_size == 0
+    file = open(path, "ab")
+    if is_new:
+        file.write(FILE_HEADER.pack(FILE_MAGIC, FRAME_VERSION))
+    return file
+
+
+def read_frame_file(path: str | pathlib.Path, key: str = "p_ID") -> pd.DataFrame:
+    """Read a frame file into a history table.
+
+    Args:
+        path (str | pathlib.Path): frame file path
+        key (str, optional): row key column. Defaults to `p_ID`.
+
+    Raises:
+        ValueError: Not a frame file or unsupported version.
+
+    Returns:
+        pd.DataFrame: history table, see `FrameReader.to_table`
+    """
+    data = pathlib.Path(path).read_bytes()
+    magic, version = FILE_HEADER.unpack_from(data, 0)
+    if magic != FILE_MAGIC or version != FRAME_VERSION:
+        raise ValueError(f"{path} is not a version {FRAME_VERSION} frame file.")
+    reader = FrameReader()
+    frames = reader.feed(data[FILE_HEADER.size :])  # noqa: E203
+    if reader.buffer:
+        logger.warning(f"Ignoring {len(reader.buffer)} bytes of a truncated record at the end of {path}.")
+    return FrameReader.to_table(frames, key)
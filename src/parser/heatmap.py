@@ -0,0 +1,121 @@
+"""This script contains the incremental per player unit position heatmaps."""
+
+import numpy as np
+import pandas as pd
+
+
+class UnitHeatmap:
+    """Decayed unit occupancy of a fixed grid over the map, one layer per player."""
+
+    def __init__(
+        self,
+        bins: int,
+        x_range: tuple[float, float],
+        y_range: tuple[float, float],
+        decay: float,
+        num_players: int = 9,
+    ) -> None:
+        """Initialize the empty heatmap.
+
+        Args:
+            bins (int): number of grid cells along each axis
+            x_range (tuple[float, float]): camera x coordinates covered by the grid
+            y_range (tuple[float, float]): camera y coordinates covered by the grid
+            decay (float): factor applied to the previous occupancy every tick
+            num_players (int, optional): number of player layers including neutral. Defaults to 9.
+        """
+        self.bins = bins
+        self.x_range = x_range
+        self.y_range = y_range
+        self.decay = decay
+        self.num_players = num_players
+        self.grids = np.zeros((num_players, bins, bins), dtype=np.float32)
+        self.x_edges = np.linspace(*x_range, bins + 1)
+        self.y_edges = np.linspace(*y_range, bins + 1)
+
+    @staticmethod
+    def from_dict(config: dict) -> "UnitHeatmap":
+        """Instantiate the heatmap from a config dictionary.
+
+        Args:
+            config (dict): configuration dict
+
+        Returns:
+            UnitHeatmap: instantiated class object
+        """
+        return UnitHeatmap(config["bins"], tuple(config["x_range"]), tuple(config["y_range"]), config["decay"])
+
+    def reset(self) -> None:
+        """Clear the occupancy of all players."""
+        self.grids[:] = 0
+
+    def update(self, x: np.ndarray, y: np.ndarray, p_id: np.ndarray) -> None:
+        """Decay the previous occupancy and add the unit positions of the current tick.
+
+        Args:
+            x (np.ndarray): camera x coordinate of each unit
+            y (np.ndarray): camera y coordinate of each unit
+            p_id (np.ndarray): owner of each unit
+        """
+        self.decay_step()
+        self.add(x, y, p_id)
+
+    def decay_step(self) -> None:
+        """Decay the previous occupancy, once per tick before adding its unit positions."""
+        if self.decay != 1:
+            self.grids *= self.decay
+
+    def add(self, x: np.ndarray, y: np.ndarray, p_id: np.ndarray) -> None:
+        """Add unit positions of the current tick.
+
+        Args:
+            x (np.ndarray): camera x coordinate of each unit
+            y (np.ndarray): camera y coordinate of each unit
+            p_id (np.ndarray): owner of each unit
+        """
+        x_idx = ((x - self.x_range[0]) * (self.bins / (self.x_range[1] - self.x_range[0]))).astype(np.intp)
+        y_idx = ((y - self.y_range[0]) * (self.bins / (self.y_range[1] - self.y_range[0]))).astype(np.intp)
+        p_id = p_id.astype(np.intp)
+        mask = (
+            (x_idx >= 0) & (x_idx < self.bins) & (y_idx >= 0) & (y_idx < self.bins)
+            & (p_id >= 0) & (p_id < self.num_players)
+        )  # fmt: skip
+        flat_idx = (p_id[mask] * self.bins + y_idx[mask]) * self.bins + x_idx[mask]
+        self.grids += np.bincount(flat_idx, minlength=self.grids.size).reshape(self.grids.shape)
+
+    def visit(self, units: dict[str, np.ndarray]) -> None:
+        """Add the unit positions of a chunk of the unit table, see `Unit.fold_units`.
+
+        Args:
+            units (dict[str, np.ndarray]): `x_coord_cam`, `y_coord_cam` and `p_ID` of each unit
+        """
+        self.add(
+            units["x_coord_cam"].astype(np.float64),
+            units["y_coord_cam"].astype(np.float64),
+            units["p_ID"].astype(np.int64),
+        )
+
+    def update_from_units(self, units: pd.DataFrame) -> None:
+        """Add the unit positions of a `Unit.list_units` dataframe.
+
+        Args:
+            units (pd.DataFrame): unit data of the current tick
+        """
+        self.update(
+            units["x_coord_cam"].to_numpy(dtype=np.float64),
+            units["y_coord_cam"].to_numpy(dtype=np.float64),
+            units["p_ID"].to_numpy(dtype=np.int64),
+        )
+
+    def grid(self, p_id: int | None = None) -> np.ndarray:
+        """Get the occupancy grid of one player or of all lords combined.
+
+        Args:
+            p_id (int | None, optional): player id. Defaults to None for all lords.
+
+        Returns:
+            np.ndarray: occupancy indexed by [y, x]
+        """
+        if p_id is None:
+            return self.grids[1:].sum(axis=0)
+        return self.grids[p_id]
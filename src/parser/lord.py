@@ -7,7 +7,7 @@ import pandas as pd
 
 from src import PROCESS_NAME
 
-from .read_data import D_Types, read_memory_chunk
+from .read_data import D_Types, MemorySource, ProcessMemory, block_size, memory_dtypes
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +16,13 @@ class Lord:
     """Class to read lord values from game memory."""
 
     def __init__(
-        self, map_settings: dict, lord_basic: dict, lord_global: dict, lord_name: dict, lord_stat: dict
+        self,
+        map_settings: dict,
+        lord_basic: dict,
+        lord_global: dict,
+        lord_name: dict,
+        lord_stat: dict,
+        memory: MemorySource | None = None,
     ) -> None:
         """Initialite Lord class.
 
@@ -26,7 +32,9 @@ class Lord:
             lord_global (dict): addresses of global lord stats
             lord_name (dict): addresses of lord names
             lord_stat (dict): addresses of detailed lord stats
+            memory (MemorySource | None, optional): memory source. Defaults to the game process.
         """
+        self.memory = memory or ProcessMemory(PROCESS_NAME)
         self.map_settings = map_settings["memory"]
         self.lord_basic = lord_basic["memory"]
         self.lord_basic_off = lord_basic["offset"]
@@ -42,11 +50,12 @@ class Lord:
         self.lord_names = np.empty(1)
 
     @staticmethod
-    def from_dict(config: dict) -> "Lord":
+    def from_dict(config: dict, memory: MemorySource | None = None) -> "Lord":
         """Instantiate Lord class from config dictionary.
 
         Args:
             config (dict): config dictionary
+            memory (MemorySource | None, optional): memory source. Defaults to the game process.
 
         Returns:
             Lord: instantiated class object
@@ -57,8 +66,26 @@ class Lord:
             config["lord_global_offsets"],
             config["lord_name_offsets"],
             config["lord_stat_offsets"],
+            memory,
         )
 
+    def memory_regions(self) -> list[tuple[int, int]]:
+        """List the memory blocks holding all lord values.
+
+        Returns:
+            list[tuple[int, int]]: address and size of each block
+        """
+        map_offsets = self.map_settings["stat_offsets"]
+        regions = [(self.map_settings["address"], block_size(map_offsets, 0, 1))]
+        for blocks, stride in (
+            (self.lord_basic, self.lord_basic_off),
+            (self.lord_name, self.lord_name_off),
+            (self.lord_global, self.lord_global_off),
+            (self.lord_stat, self.lord_stat_off),
+        ):
+            regions.extend((block["address"], block_size(block["stat_offsets"], stride, 8)) for block in blocks)
+        return regions
+
     def get_map_settings(self) -> pd.DataFrame:
         """Read the memory values for map settings.
 
@@ -67,8 +94,7 @@ class Lord:
         """
         map_offsets = [extra_off["offset"] for extra_off in self.map_settings["stat_offsets"]]
         dtypes = [D_Types[extra_off["type"].upper()] for extra_off in self.map_settings["stat_offsets"]]
-        map_mem = read_memory_chunk(
-            PROCESS_NAME,
+        map_mem = self.memory.read_chunk(
             self.map_settings["address"],
             map_offsets,
             dtypes,
@@ -93,8 +119,7 @@ class Lord:
             i * self.lord_basic_off + extra_off["offset"] for extra_off in lord_basic["stat_offsets"] for i in range(8)
         ]
         dtypes = [D_Types[extra_off["type"].upper()] for extra_off in lord_basic["stat_offsets"] for i in range(8)]
-        lord_basic_mem = read_memory_chunk(
-            PROCESS_NAME,
+        lord_basic_mem = self.memory.read_chunk(
             lord_basic["address"],
             basic_offsets,
             dtypes,
@@ -119,8 +144,7 @@ class Lord:
             for extra_off in lord_name["stat_offsets"]
             for i in range(self.num_lords)
         ]
-        lord_names_mem = read_memory_chunk(
-            PROCESS_NAME,
+        lord_names_mem = self.memory.read_chunk(
             lord_name["address"],
             names_offsets,
             dtypes,
@@ -133,10 +157,7 @@ class Lord:
         Returns:
             pd.DataFrame: global lord stats
         """
-        cols = ["p_ID"] + [
-            extra_off["name"] for lord_global in self.lord_global for extra_off in lord_global["stat_offsets"]
-        ]
-        total_arr = np.arange(1, self.num_lords + 1).reshape(-1, 1)
+        columns: dict[str, np.ndarray] = {"p_ID": np.arange(1, self.num_lords + 1, dtype=np.uint8)}
         for lord_global in self.lord_global:
             global_offsets = [
                 i * self.lord_global_off + extra_off["offset"]
@@ -148,21 +169,17 @@ class Lord:
                 for extra_off in lord_global["stat_offsets"]
                 for _ in range(self.num_lords)
             ]
-            lord_global_mem = read_memory_chunk(
-                PROCESS_NAME,
+            lord_global_mem = self.memory.read_chunk(
                 lord_global["address"],
                 global_offsets,
                 dtypes,
             )
-            lord_global_arr = np.reshape(
-                np.array(lord_global_mem),
-                (
-                    len(lord_global["stat_offsets"]),
-                    self.num_lords,
-                ),
-            ).T
-            total_arr = np.concat((total_arr, lord_global_arr), axis=1)
-        return pd.DataFrame(total_arr, columns=cols)
+            for j, extra_off in enumerate(lord_global["stat_offsets"]):
+                columns[extra_off["name"]] = np.array(
+                    lord_global_mem[j * self.num_lords : (j + 1) * self.num_lords],  # noqa: E203
+                    dtype=stat_dtype(extra_off),
+                )
+        return pd.DataFrame(columns)
 
     def get_lord_detailed_stats(self) -> pd.DataFrame:
         """Read detailed lord stats from memory.
@@ -170,8 +187,7 @@ class Lord:
         Returns:
             pd.DataFrame: detailed lord stats
         """
-        cols = [extra_off["name"] for lord_stat in self.lord_stat for extra_off in lord_stat["stat_offsets"]]
-        total_arr = np.empty((self.num_lords, 0))
+        columns: dict[str, np.ndarray] = {}
         for lord_stat in self.lord_stat:
             stat_offsets = [
                 i * self.lord_stat_off + extra_off["offset"]
@@ -180,18 +196,27 @@ class Lord:
             ]
             dtypes = [
                 D_Types[extra_off["type"].upper()]
-                for extra_off in lord_stat["stat_offsets"]
                 for _ in range(self.num_lords)
+                for extra_off in lord_stat["stat_offsets"]
             ]
-            lord_stat_mem = read_memory_chunk(
-                PROCESS_NAME,
+            lord_stat_mem = self.memory.read_chunk(
                 lord_stat["address"],
                 stat_offsets,
                 dtypes,
             )
-            lord_stat_arr = np.reshape(
-                np.array(lord_stat_mem),
-                (self.num_lords, -1),
-            )
-            total_arr = np.concat((total_arr, lord_stat_arr), axis=1)
-        return pd.DataFrame(total_arr, columns=cols)
+            num_stats = len(lord_stat["stat_offsets"])
+            for j, extra_off in enumerate(lord_stat["stat_offsets"]):
+                columns[extra_off["name"]] = np.array(lord_stat_mem[j::num_stats], dtype=stat_dtype(extra_off))
+        return pd.DataFrame(columns, index=pd.RangeIndex(self.num_lords))
+
+
+def stat_dtype(extra_off: dict) -> type:
+    """Get the compact numpy dtype of a stat from its memory type.
+
+    Args:
+        extra_off (dict): stat offset config with the memory type
+
+    Returns:
+        type: numpy dtype
+    """
+    return memory_dtypes[D_Types[extra_off["type"].upper()]]
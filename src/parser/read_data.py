@@ -3,8 +3,10 @@
 import ctypes
 import logging
 import pathlib
+import struct
 from ctypes import Array, c_bool, c_byte, c_char, c_uint16, c_uint32, wintypes
 from enum import Enum
+from typing import Iterator, Protocol
 
 import numpy as np
 import psutil
@@ -49,6 +51,36 @@ def get_process_by_name(name: str) -> psutil.Process:
     raise MemoryReadError("Process not found", process_name=name)
 
 
+def get_processes_by_name(name: str) -> list[psutil.Process]:
+    """Get all running processes with a name, e.g. several game clients on one host.
+
+    Args:
+        name (str): name of processes to find
+
+    Returns:
+        list[psutil.Process]: process objects ordered by process id
+    """
+    return sorted(
+        (proc for proc in psutil.process_iter(["name"]) if proc.info["name"] == name), key=lambda proc: proc.pid
+    )
+
+
+def find_pid(process_name: str, pid: int | None) -> int:
+    """Get the id of the target process, looking up the first process with the name if not given.
+
+    Args:
+        process_name (str): name of the target process
+        pid (int | None): id of the target process
+
+    Raises:
+        MemoryReadError: Can't find target process.
+
+    Returns:
+        int: process id
+    """
+    return get_process_by_name(process_name).pid if pid is None else pid
+
+
 class D_Types(Enum):
     """Enum class for data types."""
 
@@ -67,6 +99,31 @@ d_types: dict[D_Types, c_uint32 | c_byte | c_bool | c_uint16 | Array[c_char]] =
     D_Types.WORD: ctypes.c_uint16(),
 }
 
+type_sizes: dict[D_Types, int] = {
+    D_Types.INT: ctypes.sizeof(c_uint32()),
+    D_Types.STRING: 256,  # Assuming a fixed size for strings
+    D_Types.BYTE: ctypes.sizeof(c_byte()),
+    D_Types.BOOLEAN: ctypes.sizeof(c_bool()),
+    D_Types.WORD: ctypes.sizeof(c_uint16()),
+}
+
+# Records decoded at once when streaming struct arrays
+CHUNK_RECORDS = 1024
+
+memory_dtypes: dict[D_Types, type] = {
+    D_Types.INT: np.uint32,
+    D_Types.BYTE: np.int8,
+    D_Types.BOOLEAN: np.bool_,
+    D_Types.WORD: np.uint16,
+}
+
+struct_formats: dict[D_Types, struct.Struct] = {
+    D_Types.INT: struct.Struct("<I"),
+    D_Types.BYTE: struct.Struct("<b"),
+    D_Types.BOOLEAN: struct.Struct("<?"),
+    D_Types.WORD: struct.Struct("<H"),
+}
+
 
 class MemoryReadError(Exception):
     """Custom exception for memory read errors."""
@@ -114,13 +171,42 @@ def slice_ctypes_array(ctypes_array: Array, offset: int, length: int) -> Array:
     return array_type(*ctypes_array[offset : offset + length])  # noqa: E203
 
 
-def read_memory(process_name: str, address: int, dtype: D_Types) -> int | bool | str:
+def open_process(process_name: str, pid: int | None = None) -> int:
+    """Open a process for reading its memory.
+
+    Args:
+        process_name (str): name of the target process
+        pid (int | None, optional): id of the target process. Defaults to the first process with the name.
+
+    Raises:
+        MemoryReadError: Can't find target process.
+        MemoryReadError: Can't open target process.
+
+    Returns:
+        int: process handle, to be released with `close_process`
+    """
+    process_handle = ctypes.windll.kernel32.OpenProcess(PROCESS_ALL_ACCESS, False, find_pid(process_name, pid))
+    if not process_handle:
+        raise MemoryReadError("Failed to open process.", process_name=process_name)
+    return process_handle
+
+
+def close_process(process_handle: int) -> None:
+    """Release a process handle opened by `open_process`."""
+    ctypes.windll.kernel32.CloseHandle(process_handle)
+
+
+def read_memory(
+    process_name: str, address: int, dtype: D_Types, pid: int | None = None, handle: int | None = None
+) -> int | bool | str:
     """Read the memory value from an address within a process.
 
     Args:
         process_name (str): name of the target process
         address (int): target address
         dtype (D_Types): address value data type
+        pid (int | None, optional): id of the target process. Defaults to the first process with the name.
+        handle (int | None, optional): open handle of the process, kept open. Defaults to opening the process.
 
     Raises:
         MemoryReadError: Can't find target process.
@@ -133,22 +219,16 @@ def read_memory(process_name: str, address: int, dtype: D_Types) -> int | bool |
         int | bool | str: value of memory address
     """
     try:
-        # Locate the process
-        proc = get_process_by_name(process_name)
-        if not proc:
-            raise MemoryReadError("Process not found.", process_name=process_name)
-
         # Open the process with the necessary access
-        process_handle = ctypes.windll.kernel32.OpenProcess(PROCESS_ALL_ACCESS, False, proc.pid)
-        if not process_handle:
-            raise MemoryReadError("Failed to open process.", process_name=process_name)
+        process_handle = open_process(process_name, pid) if handle is None else handle
 
         try:
             # Prepare a buffer to store the read value
             if dtype not in d_types:
                 raise ValueError(f"Unsupported dtype '{dtype}'. Supported types: {list(d_types.keys())}")
 
-            buffer = d_types[dtype]
+            # A new buffer per read, collectors of several game instances read concurrently
+            buffer = type(d_types[dtype])()
             bytes_read = wintypes.SIZE()
 
             # Perform the read
@@ -173,15 +253,230 @@ def read_memory(process_name: str, address: int, dtype: D_Types) -> int | bool |
             return buffer.value
 
         finally:
-            # Ensure the process handle is always closed
-            ctypes.windll.kernel32.CloseHandle(process_handle)
+            # Ensure a process handle opened here is always closed
+            if handle is None:
+                close_process(process_handle)
 
     except Exception as e:
         raise e
 
 
+def read_memory_bytes(
+    process_name: str, address: int, size: int, pid: int | None = None, handle: int | None = None
+) -> bytes:
+    """Read a raw block of bytes from an address within a process.
+
+    Args:
+        process_name (str): name of the target process
+        address (int): start address of the block
+        size (int): number of bytes to read
+        pid (int | None, optional): id of the target process. Defaults to the first process with the name.
+        handle (int | None, optional): open handle of the process, kept open. Defaults to opening the process.
+
+    Raises:
+        MemoryReadError: Can't find target process.
+        MemoryReadError: Can't open target process.
+        MemoryReadError: Can't read target address.
+
+    Returns:
+        bytes: raw memory block
+    """
+    # Open the process
+    process_handle = open_process(process_name, pid) if handle is None else handle
+
+    try:
+        buffer: Array[c_byte] = (ctypes.c_byte * size)()
+        bytes_read = wintypes.SIZE()
+
+        success = ctypes.windll.kernel32.ReadProcessMemory(
+            process_handle,
+            ctypes.c_void_p(address),
+            buffer,
+            size,
+            ctypes.byref(bytes_read),
+        )
+
+        if not success:
+            error_code = ctypes.windll.kernel32.GetLastError()
+            raise MemoryReadError(f"Failed to read memory.\n{error_code}", process_name=process_name, address=address)
+
+        return bytes(buffer)
+
+    finally:
+        # Ensure a process handle opened here is always closed
+        if handle is None:
+            close_process(process_handle)
+
+
+def extract_bands(block: bytes | memoryview, stride: int, bands: list[tuple[int, int]], count: int) -> bytes:
+    """Cut byte bands out of the records of a contiguous memory block.
+
+    Args:
+        block (bytes | memoryview): memory starting at the first band of the first record
+        stride (int): size of one record in bytes
+        bands (list[tuple[int, int]]): offset and size of every band, relative to the first band
+        count (int): number of records
+
+    Returns:
+        bytes: bands of every record, concatenated record by record
+    """
+    data = np.frombuffer(block, dtype=np.uint8)
+    return np.hstack(
+        [
+            np.lib.stride_tricks.as_strided(data[offset:], (count, size), (stride, 1), writeable=False)
+            for offset, size in bands
+        ]
+    ).tobytes()
+
+
+def band_span(bands: list[tuple[int, int]]) -> tuple[int, int]:
+    """Get the first and the end offset of a list of bands within a record."""
+    return min(offset for offset, _ in bands), max(offset + size for offset, size in bands)
+
+
+def read_memory_bands(
+    process_name: str,
+    address: int,
+    stride: int,
+    bands: list[tuple[int, int]],
+    count: int,
+    pid: int | None = None,
+    handle: int | None = None,
+    chunk_records: int = CHUNK_RECORDS,
+) -> bytes:
+    """Read byte bands of every record of an array within a process.
+
+    `ReadProcessMemory` cannot gather scattered ranges, so each chunk of records is read with a
+    single call spanning all bands of the chunk and the bands are cut out of the block. The read
+    bytes are close to those of the whole array, the bands save decoding work, not transfer.
+
+    Args:
+        process_name (str): name of the target process
+        address (int): address of the first record
+        stride (int): size of one record in bytes
+        bands (list[tuple[int, int]]): offset and size of every band within a record
+        count (int): number of records
+        pid (int | None, optional): id of the target process. Defaults to the first process with the name.
+        handle (int | None, optional): open handle of the process, kept open. Defaults to opening the process.
+        chunk_records (int, optional): records per read. Defaults to CHUNK_RECORDS.
+
+    Raises:
+        MemoryReadError: Can't find target process.
+        MemoryReadError: Can't open target process.
+        MemoryReadError: Can't read target address.
+
+    Returns:
+        bytes: bands of every record, concatenated record by record
+    """
+    if count == 0:
+        return b""
+    first, end = band_span(bands)
+    relative = [(offset - first, size) for offset, size in bands]
+    process_handle = open_process(process_name, pid) if handle is None else handle
+    try:
+        chunks = []
+        for start in range(0, count, chunk_records):
+            num = min(chunk_records, count - start)
+            block = read_memory_bytes(
+                process_name, address + start * stride + first, (num - 1) * stride + end - first, pid, process_handle
+            )
+            chunks.append(extract_bands(block, stride, relative, num))
+        return b"".join(chunks)
+    finally:
+        if handle is None:
+            close_process(process_handle)
+
+
+def sort_offsets(offsets: list[int], dtype: D_Types | list[D_Types]) -> tuple[list[int], list[D_Types]]:
+    """Validate offsets and data types and sort both by offset.
+
+    Args:
+        offsets (list[int]): offsets from a base address
+        dtype (D_Types | list[D_Types]): data type for all or for each offset
+
+    Raises:
+        ValueError: Offsets must be nonempty
+        ValueError: Data type list must match the offsets
+
+    Returns:
+        tuple[list[int], list[D_Types]]: sorted offsets and matching data types
+    """
+    if not offsets:
+        raise ValueError("Offsets list cannot be empty.")
+
+    if not isinstance(dtype, list):
+        dtype = [dtype] * len(offsets)
+
+    if len(dtype) != len(offsets):
+        raise ValueError("The length of dtype list must match the length of offsets.")
+
+    if offsets != sorted(offsets):
+        offsets, dtype = map(list, zip(*sorted(zip(offsets, dtype))))
+    return offsets, dtype
+
+
+def chunk_size(offsets: list[int], dtype: list[D_Types]) -> int:
+    """Calculate the number of bytes needed to read all offsets.
+
+    Args:
+        offsets (list[int]): offsets from a base address
+        dtype (list[D_Types]): data type of each offset
+
+    Returns:
+        int: size of the memory block
+    """
+    return max(offset + type_sizes[d] for offset, d in zip(offsets, dtype))
+
+
+def block_size(stat_offsets: list[dict], stride: int, count: int) -> int:
+    """Calculate the size of a memory block holding `count` records of a config layout.
+
+    Args:
+        stat_offsets (list[dict]): stat offsets config with offset and type per stat
+        stride (int): offset between two records
+        count (int): number of records
+
+    Returns:
+        int: size of the memory block
+    """
+    record_size = max(
+        extra_off["offset"] + type_sizes[D_Types[extra_off["type"].upper()]] for extra_off in stat_offsets
+    )
+    return (count - 1) * stride + record_size
+
+
+def decode_memory_chunk(
+    buffer: bytes | memoryview, offsets: list[int], dtype: D_Types | list[D_Types]
+) -> list[int | str | bool]:
+    """Decode the values at different offsets of a raw memory block.
+
+    Args:
+        buffer (bytes | memoryview): raw memory block starting at the base address
+        offsets (list[int]): offsets from the base address to be decoded
+        dtype (D_Types | list[D_Types]): data type for all or for each offset
+
+    Raises:
+        ValueError: Unsupported data type.
+
+    Returns:
+        list[int | str | bool]: list of memory values at the sorted offsets.
+    """
+    offsets, dtype = sort_offsets(offsets, dtype)
+    results = []
+    for offset, d in zip(offsets, dtype):
+        if d == D_Types.STRING:
+            raw_data = bytes(buffer[offset : offset + type_sizes[d]])  # noqa: E203
+            value: int | str | bool = raw_data.split(b"\0", 1)[0].decode("ISO-8859-1")
+        elif d in struct_formats:
+            value = struct_formats[d].unpack_from(buffer, offset)[0]
+        else:
+            raise ValueError(f"Unsupported data type: {d}")
+        results.append(value)
+    return results
+
+
 def read_memory_chunk(
-    process_name: str, base_address: int, offsets: list[int], dtype: D_Types | list[D_Types]
+    process_name: str, base_address: int, offsets: list[int], dtype: D_Types | list[D_Types], pid: int | None = None
 ) -> list[int | str | bool]:
     """Read a chunk of memory at different offsets.
 
@@ -189,99 +484,142 @@ def read_memory_chunk(
         process_name (str): name of the target process
         base_address (int): target address
         offsets (list[int]): offsets from target address to be read
+        pid (int | None, optional): id of the target process. Defaults to the first process with the name.
 
     Raises:
         ValueError: Offsets must be nonempty
         MemoryReadError: Can't find target process.
         MemoryReadError: Can't open target process.
         MemoryReadError: Can't read target address.
-        e: General exception.
 
     Returns:
         list[int]: list of memory values at offsets.
     """
-    try:
-        if not offsets:
-            raise ValueError("Offsets list cannot be empty.")
+    offsets, dtype = sort_offsets(offsets, dtype)
+    buffer = read_memory_bytes(process_name, base_address, chunk_size(offsets, dtype), pid)
+    return decode_memory_chunk(buffer, offsets, dtype)
+
+
+def iter_records(
+    memory: "MemorySource",
+    base_address: int,
+    stride: int,
+    count: int,
+    offsets: list[int],
+    dtype: D_Types = D_Types.WORD,
+    chunk_records: int = CHUNK_RECORDS,
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Decode the fields of a struct array chunk by chunk into a reused buffer.
+
+    Only one chunk of raw memory and one buffer of decoded values are held at a time, so the peak
+    memory does not depend on the number of records. Every yielded array is a view of that buffer
+    and is overwritten by the next chunk, so collecting the chunks, e.g. with `list(iter_records(...))`,
+    leaves all of them holding the values of the last chunk. Values needed later have to be copied
+    or folded into aggregates right away.
 
-        if not isinstance(dtype, list):
-            dtype = [dtype] * len(offsets)
+    Args:
+        memory (MemorySource): memory source to read from
+        base_address (int): address of the first record
+        stride (int): size of one record in bytes
+        count (int): number of records
+        offsets (list[int]): field offsets within a record
+        dtype (D_Types, optional): data type of all fields. Defaults to D_Types.WORD.
+        chunk_records (int, optional): records per chunk. Defaults to CHUNK_RECORDS.
+
+    Yields:
+        Iterator[tuple[int, np.ndarray]]: index of the first record and a view of the decoded values of shape
+            (records, fields), valid until the next chunk is read
+    """
+    field_dtype = np.dtype(memory_dtypes[dtype]).newbyteorder("<")
+    buffer: np.ndarray = np.empty((min(chunk_records, count), len(offsets)), dtype=memory_dtypes[dtype])
+    span = max(offsets) + type_sizes[dtype]
+    for start in range(0, count, chunk_records):
+        num = min(chunk_records, count - start)
+        raw = memory.read_bytes(base_address + start * stride, (num - 1) * stride + span)
+        for i, offset in enumerate(offsets):
+            buffer[:num, i] = np.ndarray((num,), dtype=field_dtype, buffer=raw, offset=offset, strides=(stride,))
+        yield start, buffer[:num]
 
-        if len(dtype) != len(offsets):
-            raise ValueError("The length of dtype list must match the length of offsets.")
 
-        if offsets != sorted(offsets):
-            offsets, dtype = map(list, zip(*sorted(zip(offsets, dtype))))
+class MemorySource(Protocol):
+    """Interface of objects that game values can be read from."""
 
-        # Locate the process
-        proc = get_process_by_name(process_name)
-        if not proc:
-            raise MemoryReadError("Process not found.", process_name=process_name)
+    def read(self, address: int, dtype: D_Types) -> int | bool | str:
+        """Read a single value."""
+        ...
 
-        # Open the process
-        process_handle = ctypes.windll.kernel32.OpenProcess(PROCESS_ALL_ACCESS, False, proc.pid)
-        if not process_handle:
-            raise MemoryReadError("Failed to open process.", process_name=process_name)
+    def read_chunk(
+        self, base_address: int, offsets: list[int], dtype: D_Types | list[D_Types]
+    ) -> list[int | str | bool]:
+        """Read values at several offsets from a base address."""
+        ...
 
-        try:
-            # Calculate the range of memory to read
-            type_sizes = {
-                D_Types.INT: ctypes.sizeof(c_uint32()),
-                D_Types.STRING: 256,  # Assuming a fixed size for strings
-                D_Types.BYTE: ctypes.sizeof(c_byte()),
-                D_Types.BOOLEAN: ctypes.sizeof(c_bool()),
-                D_Types.WORD: ctypes.sizeof(c_uint16()),
-            }
-            size = offsets[-1] + type_sizes[dtype[-1]]
-
-            # Read the contiguous memory block
-            buffer: Array[c_byte] = (ctypes.c_byte * size)()
-            bytes_read = wintypes.SIZE()
+    def read_bytes(self, address: int, size: int) -> bytes | memoryview:
+        """Read a raw memory block."""
+        ...
 
-            success = ctypes.windll.kernel32.ReadProcessMemory(
-                process_handle,
-                ctypes.c_void_p(base_address),
-                buffer,
-                size,
-                ctypes.byref(bytes_read),
-            )
+    def read_bands(self, address: int, stride: int, bands: list[tuple[int, int]], count: int) -> bytes:
+        """Read the byte bands, given by offset and size, of `count` records spaced `stride` bytes apart."""
+        ...
 
-            if not success:
-                error_code = ctypes.windll.kernel32.GetLastError()
-                raise MemoryReadError(
-                    f"Failed to read memory.\n{error_code}", process_name=process_name, address=base_address
-                )
 
-            # Extract the values dynamically
-            results = []
-            for offset, d in zip(offsets, dtype):
-                slice = slice_ctypes_array(buffer, offset, type_sizes[d])
-                if d == D_Types.INT:
-                    value: int | str | bool = ctypes.c_uint32.from_buffer_copy(slice).value
-                elif d == D_Types.STRING:
-                    raw_data = np.mod(buffer[offset : offset + type_sizes[d]], 256).astype(np.uint8)  # noqa: E203
-                    byte_data = raw_data.tobytes()
-                    value = ctypes.create_string_buffer(byte_data).value.decode("ISO-8859-1")
-                elif d == D_Types.BYTE:
-                    value = ctypes.c_byte.from_buffer_copy(slice).value
-                elif d == D_Types.BOOLEAN:
-                    value = ctypes.c_bool.from_buffer_copy(slice).value
-                elif d == D_Types.WORD:
-                    value = ctypes.c_uint16.from_buffer_copy(slice).value
-                else:
-                    raise ValueError(
-                        (
-                            "ctypes.c_uint32.from_buffer_copy(buffer[offset : offset + type_sizes[d]])"
-                            f".valueUnsupported data type: {d}"
-                        )
-                    )
-                results.append(value)
-
-            return results
+class ProcessMemory:
+    """Memory source reading directly from a running process.
 
-        finally:
-            # Ensure the process handle is always closed
-            ctypes.windll.kernel32.CloseHandle(process_handle)
+    The process is opened on the first read and the handle is kept for all further reads. A failed
+    read releases the handle, so the next read opens the process again, e.g. after a restart.
+    """
 
-    except Exception as e:
-        raise e
+    def __init__(self, process_name: str, pid: int | None = None) -> None:
+        """Initialize the memory source.
+
+        Args:
+            process_name (str): name of the target process
+            pid (int | None, optional): id of one of several processes with the name, skipping the process
+                lookup on every read. Defaults to the first process with the name.
+        """
+        self.process_name = process_name
+        self.pid = pid
+        self.handle: int | None = None
+
+    def _open(self) -> int:
+        if self.handle is None:
+            self.handle = open_process(self.process_name, self.pid)
+        return self.handle
+
+    def close(self) -> None:
+        """Release the process handle."""
+        if self.handle is not None:
+            close_process(self.handle)
+            self.handle = None
+
+    def read(self, address: int, dtype: D_Types) -> int | bool | str:
+        """Read a single value, see `read_memory`."""
+        try:
+            return read_memory(self.process_name, address, dtype, self.pid, self._open())
+        except MemoryReadError:
+            self.close()
+            raise
+
+    def read_chunk(
+        self, base_address: int, offsets: list[int], dtype: D_Types | list[D_Types]
+    ) -> list[int | str | bool]:
+        """Read values at several offsets, see `read_memory_chunk`."""
+        offsets, dtype = sort_offsets(offsets, dtype)
+        return decode_memory_chunk(self.read_bytes(base_address, chunk_size(offsets, dtype)), offsets, dtype)
+
+    def read_bytes(self, address: int, size: int) -> bytes:
+        """Read a raw memory block, see `read_memory_bytes`."""
+        try:
+            return read_memory_bytes(self.process_name, address, size, self.pid, self._open())
+        except MemoryReadError:
+            self.close()
+            raise
+
+    def read_bands(self, address: int, stride: int, bands: list[tuple[int, int]], count: int) -> bytes:
+        """Read byte bands of every record of an array, see `read_memory_bands`."""
+        try:
+            return read_memory_bands(self.process_name, address, stride, bands, count, self.pid, self._open())
+        except MemoryReadError:
+            self.close()
+            raise
@@ -0,0 +1,128 @@
+"""Measure the bytes saved by incremental unit rereads on recorded games.
+
+Every tick of a capture is read once completely and once incrementally. The report lists the bytes
+read and the read time of both modes and the rows the incremental mode returned stale compared to
+the full read. Captures are read from memory, so the times leave out the system calls of reading a
+live process, of which the incremental mode makes one more per dirty run of slots.
+
+Usage:
+    python -m src.parser.reread_report CAPTURE [CAPTURE ...] [--header-size N] [--full-refresh N]
+        [--hp-size N] [--max-gap N] [--csv PATH]
+"""
+
+import argparse
+import logging
+import pathlib
+import time
+
+import numpy as np
+import pandas as pd
+
+from .capture import CaptureReader, SnapshotMemory
+from .read_data import D_Types, MemoryReadError, read_config
+from .unit import Unit
+
+logger = logging.getLogger(__name__)
+
+
+def reread_report(path: str | pathlib.Path, incremental: dict | None = None) -> pd.DataFrame:
+    """Compare full and incremental unit reads over all ticks of a capture file.
+
+    Args:
+        path (str | pathlib.Path): capture file path
+        incremental (dict | None, optional): incremental read settings. Defaults to the unit config.
+
+    Returns:
+        pd.DataFrame: `tick`, `units`, `dirty_units`, `full_bytes`, `incremental_bytes`, `saved`,
+            `full_ms`, `incremental_ms` and `stale_rows` per tick
+    """
+    config = read_config("unit", "memory")
+    settings = {**config.get("incremental", {}), **(incremental or {}), "enabled": True}
+    full = Unit.from_dict({**read_config("unit", "memory"), "incremental": {"enabled": False}})
+    partial = Unit.from_dict({**config, "incremental": settings})
+    reader = CaptureReader(path)
+    rows = []
+    for tick, _, memory in reader:
+        full.memory = partial.memory = memory
+        try:
+            num_units = int(memory.read(full.total_units, D_Types.INT))
+            full.bytes_read = partial.bytes_read = 0
+            start = time.perf_counter()
+            expected = full.read_unit_rows(num_units)
+            full_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            actual = partial.read_unit_rows(num_units)
+            incremental_ms = (time.perf_counter() - start) * 1000
+        except MemoryReadError as e:
+            logger.warning(f"Skipped tick {tick}: {e}")
+            continue
+        rows.append(
+            {
+                "tick": tick,
+                "units": num_units,
+                "dirty_units": partial.dirty_units,
+                "full_bytes": full.bytes_read,
+                "incremental_bytes": partial.bytes_read,
+                "full_ms": full_ms,
+                "incremental_ms": incremental_ms,
+                "stale_rows": int(np.count_nonzero((expected != actual).any(axis=1))),
+            }
+        )
+    # Release the views into the memory mapped capture before closing it
+    full.memory = partial.memory = SnapshotMemory({})
+    del memory
+    reader.close()
+    report = pd.DataFrame(
+        rows,
+        columns=[
+            "tick",
+            "units",
+            "dirty_units",
+            "full_bytes",
+            "incremental_bytes",
+            "full_ms",
+            "incremental_ms",
+            "stale_rows",
+        ],
+    )
+    report.insert(5, "saved", 1 - report["incremental_bytes"] / report["full_bytes"].clip(lower=1))
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the bytes saved by incremental unit rereads.")
+    parser.add_argument("captures", type=pathlib.Path, nargs="+")
+    parser.add_argument("--header-size", type=lambda value: int(value, 0), default=None)
+    parser.add_argument("--hp-size", type=lambda value: int(value, 0), default=None)
+    parser.add_argument("--full-refresh", type=int, default=None)
+    parser.add_argument("--max-gap", type=int, default=None)
+    parser.add_argument("--csv", type=pathlib.Path, default=None)
+    args = parser.parse_args()
+    settings = {
+        key: value
+        for key, value in (
+            ("header_size", args.header_size),
+            ("hp_size", args.hp_size),
+            ("full_refresh", args.full_refresh),
+            ("max_gap", args.max_gap),
+        )
+        if value is not None
+    }
+    reports = pd.concat(
+        [reread_report(path, settings).assign(capture=path.name) for path in args.captures], ignore_index=True
+    )
+    summary = reports.groupby("capture").agg(
+        ticks=("tick", "size"),
+        units=("units", "mean"),
+        dirty_units=("dirty_units", "mean"),
+        full_bytes=("full_bytes", "mean"),
+        incremental_bytes=("incremental_bytes", "mean"),
+        full_ms=("full_ms", "mean"),
+        incremental_ms=("incremental_ms", "mean"),
+        stale_rows=("stale_rows", "mean"),
+    )
+    summary["saved"] = 1 - summary["incremental_bytes"] / summary["full_bytes"]
+    print("Mean per tick:")
+    print(summary.to_string(float_format=lambda value: f"{value:.2f}"))
+    if args.csv is not None:
+        reports.to_csv(args.csv, index=False)
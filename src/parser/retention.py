@@ -0,0 +1,494 @@
+"""This script contains the tiered retention store bounding the memory used by the tick history.
+
+The most recent ticks are kept at full resolution, older ticks only as min/max/mean aggregates of
+progressively larger buckets. Every tier has a fixed capacity, the coarsest tier doubles its bucket
+size instead of dropping data, so a whole match is always covered with a bounded amount of memory.
+"""
+
+import bisect
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class Tier:
+    """Ring buffer of aggregated buckets of a fixed number of ticks."""
+
+    def __init__(self, bucket: int, capacity: int, compact: bool, num_players: int, num_cols: int) -> None:
+        """Initialize the empty tier.
+
+        Args:
+            bucket (int): ticks per bucket
+            capacity (int): number of buckets kept
+            compact (bool): merge bucket pairs instead of dropping the oldest bucket when full
+            num_players (int): number of lords
+            num_cols (int): number of stat columns
+        """
+        self.bucket = bucket
+        self.capacity = capacity
+        self.compact = compact
+        self.num_players = num_players
+        self.dtype = np.float64 if bucket == 1 else np.float32
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.months = np.zeros(capacity, dtype=np.int32)
+        self.start = 0
+        self.size = 0
+        self._allocate(num_cols)
+        self._reset_bucket()
+
+    def _allocate(self, num_cols: int) -> None:
+        shape = (self.capacity, self.num_players, num_cols)
+        self.mean = np.full(shape, np.nan, dtype=self.dtype)
+        # Full resolution buckets hold a single tick, so min and max are the value itself, unless
+        # compacting merges them into larger buckets later
+        shared = self.bucket == 1 and not self.compact
+        self.min = self.mean if shared else np.full(shape, np.nan, dtype=self.dtype)
+        self.max = self.mean if shared else np.full(shape, np.nan, dtype=self.dtype)
+
+    def _reset_bucket(self) -> None:
+        self.acc_ticks = 0
+        self.acc_sum: np.ndarray | None = None
+        self.acc_count: np.ndarray | None = None
+        self.acc_min: np.ndarray | None = None
+        self.acc_max: np.ndarray | None = None
+
+    def _accumulators(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Get the sum, count, min and max of the open bucket, which are all set by its first tick."""
+        assert self.acc_sum is not None and self.acc_count is not None
+        assert self.acc_min is not None and self.acc_max is not None
+        return self.acc_sum, self.acc_count, self.acc_min, self.acc_max
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the tier arrays."""
+        value_arrays = {id(arr): arr for arr in (self.mean, self.min, self.max)}.values()
+        return self.times.nbytes + self.timestamps.nbytes + self.months.nbytes + sum(a.nbytes for a in value_arrays)
+
+    @property
+    def oldest_time(self) -> int | None:
+        """Tick of the oldest stored bucket."""
+        return int(self.times[self.start]) if self.size else None
+
+    def add_columns(self, num_cols: int) -> None:
+        """Grow the value arrays to hold new stat columns.
+
+        Args:
+            num_cols (int): new total number of stat columns
+        """
+        old_cols = self.mean.shape[2]
+        mean, min_, max_ = self.mean, self.min, self.max
+        self._allocate(num_cols)
+        self.mean[:, :, :old_cols] = mean
+        if self.min is not self.mean:
+            self.min[:, :, :old_cols] = min_
+            self.max[:, :, :old_cols] = max_
+        if self.acc_ticks:
+            acc_sum, acc_count, acc_min, acc_max = self._accumulators()
+            pad = ((0, 0), (0, num_cols - old_cols))
+            self.acc_sum = np.pad(acc_sum, pad)
+            self.acc_count = np.pad(acc_count, pad)
+            self.acc_min = np.pad(acc_min, pad, constant_values=np.nan)
+            self.acc_max = np.pad(acc_max, pad, constant_values=np.nan)
+
+    def add(self, time: int, timestamp: float, month: int, values: np.ndarray) -> None:
+        """Add the values of one tick to the open bucket, storing the bucket once it is complete.
+
+        Args:
+            time (int): tick number
+            timestamp (float): unix time of the tick
+            month (int): game month of the tick
+            values (np.ndarray): stat values indexed by [lord, column]
+        """
+        if self.bucket == 1:
+            self._push(time, timestamp, month, values, values, values)
+            return
+        is_value = ~np.isnan(values)
+        if self.acc_ticks == 0:
+            self.acc_time = time
+            self.acc_sum = np.where(is_value, values, 0)
+            self.acc_count = is_value.astype(np.int32)
+            self.acc_min = values.copy()
+            self.acc_max = values.copy()
+        else:
+            acc_sum, acc_count, acc_min, acc_max = self._accumulators()
+            acc_sum += np.where(is_value, values, 0)
+            acc_count += is_value
+            self.acc_min = np.fmin(acc_min, values)
+            self.acc_max = np.fmax(acc_max, values)
+        self.acc_ticks += 1
+        if self.acc_ticks >= self.bucket:
+            acc_sum, acc_count, acc_min, acc_max = self._accumulators()
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mean = np.where(acc_count > 0, acc_sum / acc_count, np.nan)
+            self._push(self.acc_time, timestamp, month, mean, acc_min, acc_max)
+            self._reset_bucket()
+
+    def _push(
+        self, time: int, timestamp: float, month: int, mean: np.ndarray, min_: np.ndarray, max_: np.ndarray
+    ) -> None:
+        if self.size == self.capacity:
+            if self.compact:
+                self._compact()
+            else:
+                self.start = (self.start + 1) % self.capacity
+                self.size -= 1
+        idx = (self.start + self.size) % self.capacity
+        self.times[idx] = time
+        self.timestamps[idx] = timestamp
+        self.months[idx] = month
+        self.mean[idx] = mean
+        if self.min is not self.mean:
+            self.min[idx] = min_
+            self.max[idx] = max_
+        self.size += 1
+
+    def _compact(self) -> None:
+        """Merge pairs of neighbouring buckets, halving the used capacity and doubling the bucket size."""
+        order = self._order()
+        pairs = self.size // 2
+        first, second = order[0 : 2 * pairs : 2], order[1 : 2 * pairs : 2]  # noqa: E203
+        rest = order[2 * pairs :]  # noqa: E203
+        mean = np.stack((self.mean[first], self.mean[second]))
+        with np.errstate(invalid="ignore"):
+            merged_mean = np.where(
+                np.isnan(mean).all(axis=0), np.nan, np.nansum(mean, axis=0) / (~np.isnan(mean)).sum(axis=0)
+            )
+        merged_min = np.fmin(self.min[first], self.min[second])
+        merged_max = np.fmax(self.max[first], self.max[second])
+        new_size = pairs + len(rest)
+        self.times[:new_size] = np.concatenate((self.times[first], self.times[rest]))
+        self.timestamps[:new_size] = np.concatenate((self.timestamps[second], self.timestamps[rest]))
+        self.months[:new_size] = np.concatenate((self.months[second], self.months[rest]))
+        self.mean[:new_size] = np.concatenate((merged_mean, self.mean[rest]))
+        self.min[:new_size] = np.concatenate((merged_min, self.min[rest]))
+        self.max[:new_size] = np.concatenate((merged_max, self.max[rest]))
+        self.start = 0
+        self.size = new_size
+        self.bucket *= 2
+        logger.debug(f"Compacted coarsest retention tier to {self.bucket} ticks per bucket.")
+
+    def _order(self) -> np.ndarray:
+        return (self.start + np.arange(self.size)) % self.capacity
+
+    def select(self, since: int | None, until: int | None) -> np.ndarray:
+        """Get the chronological buffer indices of the buckets in a tick range.
+
+        Args:
+            since (int | None): first tick to include
+            until (int | None): first tick to exclude
+
+        Returns:
+            np.ndarray: buffer indices
+        """
+        order = self._order()
+        times = self.times[order]
+        lo = 0 if since is None else np.searchsorted(times, since, side="left")
+        hi = len(order) if until is None else np.searchsorted(times, until, side="left")
+        return order[lo:hi]
+
+    def locate(self, time: int) -> int | None:
+        """Bisect the ring buffer for the bucket holding a tick, without reordering it.
+
+        Args:
+            time (int): tick number
+
+        Returns:
+            int | None: buffer index of the bucket, None if the tick is older than the oldest bucket
+        """
+        pos = bisect.bisect_right(range(self.size), time, key=lambda k: self.times[(self.start + k) % self.capacity])
+        return None if pos == 0 else (self.start + pos - 1) % self.capacity
+
+    def clear(self) -> None:
+        """Drop all buckets."""
+        self.start = 0
+        self.size = 0
+        self._reset_bucket()
+
+
+class DateIndex:
+    """Sorted index from game month to the first tick stored in that month.
+
+    The game date never goes backwards within a match, so the index is built by appending at
+    ingest and queried by bisection. Ticks are numbered consecutively, so the ticks of a month
+    span from its first tick to the first tick of the next month.
+    """
+
+    def __init__(self, capacity: int = 64) -> None:
+        """Initialize the empty index.
+
+        Args:
+            capacity (int, optional): initially allocated number of months. Defaults to 64.
+        """
+        self._months: np.ndarray = np.zeros(capacity, dtype=np.int32)
+        self._times: np.ndarray = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.latest_time: int | None = None
+
+    @property
+    def months(self) -> np.ndarray:
+        """Indexed game months in ascending order."""
+        return self._months[: self.size]
+
+    @property
+    def times(self) -> np.ndarray:
+        """First tick of each indexed game month."""
+        return self._times[: self.size]
+
+    def add(self, month: int, time: int) -> None:
+        """Index a stored tick.
+
+        Args:
+            month (int): game month of the tick, e.g. year * 12 + month
+            time (int): tick number
+        """
+        self.latest_time = time
+        if self.size and month <= self._months[self.size - 1]:
+            return
+        if self.size == len(self._months):
+            self._months = np.concatenate((self._months, np.zeros_like(self._months)))
+            self._times = np.concatenate((self._times, np.zeros_like(self._times)))
+        self._months[self.size] = month
+        self._times[self.size] = time
+        self.size += 1
+
+    def start_of(self, month: int) -> int | None:
+        """Get the first tick stored in a game month.
+
+        Args:
+            month (int): game month
+
+        Returns:
+            int | None: tick number, None if no tick of that month is stored
+        """
+        pos = int(np.searchsorted(self.months, month, side="left"))
+        return int(self._times[pos]) if pos < self.size and self._months[pos] == month else None
+
+    def tick_at(self, month: int) -> int | None:
+        """Get the last tick stored up to the end of a game month.
+
+        Args:
+            month (int): game month
+
+        Returns:
+            int | None: tick number, None if the month is before the first stored tick
+        """
+        pos = int(np.searchsorted(self.months, month, side="right"))
+        if pos == 0:
+            return None
+        return self.latest_time if pos == self.size else int(self._times[pos]) - 1
+
+    def tick_range(self, first: int, last: int) -> tuple[int, int | None]:
+        """Get the ticks stored from the start of one game month to the end of another.
+
+        Args:
+            first (int): first game month to include
+            last (int): last game month to include
+
+        Returns:
+            tuple[int, int | None]: first tick to include and first tick to exclude, None for the most recent tick
+        """
+        lo = int(np.searchsorted(self.months, first, side="left"))
+        hi = int(np.searchsorted(self.months, last, side="right"))
+        since = int(self._times[lo]) if lo < self.size else (self.latest_time or 0) + 1
+        return since, int(self._times[hi]) if hi < self.size else None
+
+
+class TieredStore:
+    """Tick history of the running match with a fixed memory budget per retention tier."""
+
+    def __init__(self, tiers: list[dict], num_players: int = 8, key: str = "p_ID") -> None:
+        """Initialize the empty store.
+
+        Args:
+            tiers (list[dict]): `bucket` size in ticks and `capacity` in buckets of each tier, finest first
+            num_players (int, optional): number of lords. Defaults to 8.
+            key (str, optional): column numbering the rows of a tick from 1. Defaults to "p_ID".
+        """
+        self.tier_config = tiers
+        self.num_players = num_players
+        self.key = key
+        self.columns: list[str] = []
+        self.column_index: dict[str, int] = {}
+        self.match_id = 0
+        self._init_tiers()
+
+    @staticmethod
+    def from_dict(config: dict, key: str = "p_ID") -> "TieredStore":
+        """Instantiate the store from the retention config.
+
+        Args:
+            config (dict): configuration dict
+            key (str, optional): column numbering the rows of a tick from 1. Defaults to "p_ID".
+
+        Returns:
+            TieredStore: instantiated class object
+        """
+        return TieredStore(config["tiers"], key=key)
+
+    def _init_tiers(self) -> None:
+        self.tiers = [
+            Tier(tier["bucket"], tier["capacity"], i == len(self.tier_config) - 1, self.num_players, len(self.columns))
+            for i, tier in enumerate(self.tier_config)
+        ]
+        self.dates = DateIndex()
+        self.version = 0
+        self.layout_version = 0
+        self.latest_time: int | None = None
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by all tiers."""
+        return sum(tier.nbytes for tier in self.tiers)
+
+    def reset(self) -> None:
+        """Drop the history and start a new match."""
+        self._init_tiers()
+        self.match_id += 1
+
+    def append(self, time: int, timestamp: float, month: int, tick_df: pd.DataFrame) -> None:
+        """Store the per lord stats of a new tick in all tiers.
+
+        Args:
+            time (int): tick number
+            timestamp (float): unix time of the tick
+            month (int): game month of the tick, e.g. year * 12 + month
+            tick_df (pd.DataFrame): per lord stats with the key column, `p_ID` by default
+        """
+        stat_cols = [col for col in tick_df.columns if col not in (self.key, "time")]
+        values = np.full((self.num_players, len(stat_cols)), np.nan)
+        rows = tick_df[self.key].to_numpy(dtype=np.intp) - 1
+        values[rows] = tick_df[stat_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+        self.append_values(time, timestamp, month, stat_cols, values)
+
+    def append_values(self, time: int, timestamp: float, month: int, stat_cols: list[str], values: np.ndarray) -> None:
+        """Store the stats of a new tick given as array in all tiers.
+
+        Args:
+            time (int): tick number
+            timestamp (float): unix time of the tick
+            month (int): game month of the tick, e.g. year * 12 + month
+            stat_cols (list[str]): stat columns of `values`
+            values (np.ndarray): stat values indexed by [row, column], rows ordered by the key from 1
+        """
+        new_cols = [col for col in stat_cols if col not in self.column_index]
+        if new_cols:
+            for col in new_cols:
+                self.column_index[col] = len(self.columns)
+                self.columns.append(col)
+            for tier in self.tiers:
+                tier.add_columns(len(self.columns))
+        tick_values = np.full((self.num_players, len(self.columns)), np.nan)
+        tick_values[:, [self.column_index[col] for col in stat_cols]] = values
+        full_before = self.tiers[0].size == self.tiers[0].capacity
+        for tier in self.tiers:
+            tier.add(time, timestamp, month, tick_values)
+        if full_before and self.tiers[0].start == 0:
+            # The finest tier wrapped around, older ticks are now only served coarsened
+            self.layout_version += 1
+        self.dates.add(month, time)
+        self.version += 1
+        self.latest_time = time
+
+    def frame(
+        self,
+        columns: list[str] | None = None,
+        since: int | None = None,
+        max_points: int | None = None,
+        with_range: bool = False,
+        until: int | None = None,
+    ) -> pd.DataFrame:
+        """Get the history of the match at the finest resolution available for every tick range.
+
+        Each tier serves the ticks older than what the next finer tier still holds. With `max_points`,
+        tiers too fine to return at most that many buckets per lord are skipped.
+
+        Args:
+            columns (list[str] | None, optional): stat columns. Defaults to all.
+            since (int | None, optional): first tick to include. Defaults to the match start.
+            max_points (int | None, optional): maximum number of points per lord. Defaults to no limit.
+            with_range (bool, optional): add `<col>_min` and `<col>_max` columns. Defaults to False.
+            until (int | None, optional): first tick to exclude. Defaults to up to the most recent tick.
+
+        Returns:
+            pd.DataFrame: `time`, `timestamp`, `month`, `p_ID` and stat columns, sorted by `p_ID` and `time`
+        """
+        columns = [col for col in (columns or self.columns) if col in self.column_index]
+        col_idx = [self.column_index[col] for col in columns]
+        tiers = self.tiers
+        if max_points is not None and self.latest_time is not None:
+            span = (self.latest_time + 1 if until is None else until) - (since or 0)
+            fitting = [i for i, tier in enumerate(tiers) if span / tier.bucket <= max_points]
+            tiers = tiers[fitting[0] :] if fitting else tiers[-1:]  # noqa: E203
+        parts = []
+        for tier in tiers:
+            idx = tier.select(since, until)
+            if len(idx):
+                parts.append((tier, idx))
+            if tier.oldest_time is not None:
+                until = tier.oldest_time if until is None else min(until, tier.oldest_time)
+        parts.reverse()
+        times = np.concatenate([tier.times[idx] for tier, idx in parts]) if parts else np.empty(0, np.int64)
+        n = len(times)
+        data: dict[str, np.ndarray] = {
+            self.key: np.repeat(np.arange(1, self.num_players + 1), n),
+            "time": np.tile(times, self.num_players),
+            "timestamp": np.tile(
+                np.concatenate([t.timestamps[i] for t, i in parts] or [np.empty(0)]), self.num_players
+            ),
+            "month": np.tile(
+                np.concatenate([t.months[i] for t, i in parts] or [np.empty(0, np.int32)]), self.num_players
+            ),
+        }
+        fields = [("", "mean")] + ([("_min", "min"), ("_max", "max")] if with_range else [])
+        for suffix, field in fields:
+            if parts:
+                values = np.concatenate([getattr(tier, field)[idx][:, :, col_idx] for tier, idx in parts])
+            else:
+                values = np.empty((0, self.num_players, len(col_idx)))
+            # [tick, lord, column] -> rows ordered by lord, then tick
+            values = values.transpose(1, 0, 2).reshape(n * self.num_players, len(col_idx))
+            for i, col in enumerate(columns):
+                data[f"{col}{suffix}"] = values[:, i].astype(np.float64)
+        df = pd.DataFrame(data)
+        return df.loc[df[columns].notna().any(axis=1)] if columns else df
+
+    def at(self, time: int, columns: list[str] | None = None) -> pd.DataFrame:
+        """Get the per lord stats of a single tick from the finest tier still holding it.
+
+        Older ticks are served as the mean of the bucket they were aggregated into.
+
+        Args:
+            time (int): tick number
+            columns (list[str] | None, optional): stat columns. Defaults to all.
+
+        Returns:
+            pd.DataFrame: `p_ID`, `time` of the tick or bucket and stat columns, empty if the tick is not stored
+        """
+        columns = [col for col in (columns or self.columns) if col in self.column_index]
+        for tier in self.tiers:
+            idx = tier.locate(time) if tier.oldest_time is not None and tier.oldest_time <= time else None
+            if idx is not None:
+                values = tier.mean[idx]
+                df = pd.DataFrame(
+                    {
+                        self.key: np.arange(1, self.num_players + 1),
+                        "time": int(tier.times[idx]),
+                        **{col: values[:, self.column_index[col]].astype(np.float64) for col in columns},
+                    }
+                )
+                return df.loc[df[columns].notna().any(axis=1)] if columns else df
+        return pd.DataFrame(columns=[self.key, "time", *columns])
+
+    def latest(self) -> pd.DataFrame:
+        """Get the per lord stats of the most recent tick.
+
+        Returns:
+            pd.DataFrame: one row per lord
+        """
+        if self.latest_time is None:
+            return pd.DataFrame()
+        return self.frame(since=self.latest_time)
@@ -0,0 +1,99 @@
+"""This script contains the compact column types of the per lord tick table.
+
+Raw lord stats keep the width of their memory type, aggregated counts are stored as `uint16` and
+summed hit points as `uint32`.
+Integer columns are never widened to float, a nullable type is only used for raw stats that
+actually contain missing values, missing counts are zero.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .lord import Lord, stat_dtype
+from .unit import Unit
+
+nullable_dtypes: dict[type, str] = {
+    np.uint8: "UInt8",
+    np.uint16: "UInt16",
+    np.uint32: "UInt32",
+    np.int8: "Int8",
+    np.int16: "Int16",
+    np.int32: "Int32",
+    np.bool_: "boolean",
+}
+
+ID_DTYPE = np.uint8
+COUNT_DTYPE = np.uint16
+TOTAL_DTYPE = np.uint32
+BUILDING_COUNTS = ["num_buildings", "workers_needed", "workers_working", "workers_missing", "snoozed", "not_working"]
+UNIT_COUNTS = ["melee", "ranged", "wounded_units"]
+UNIT_TOTALS = ["army_hp"]
+# Summed per lord by the event tracker from the unit tables of two consecutive ticks
+EVENT_TOTALS = ["army_hp_lost"]
+
+
+class TickSchema:
+    """Column types of the per lord tick table."""
+
+    def __init__(self, raw: dict[str, type], counts: list[str], totals: list[str] | None = None) -> None:
+        """Initialize the schema.
+
+        Args:
+            raw (dict[str, type]): dtype of each stat read directly from memory
+            counts (list[str]): columns counting objects per lord
+            totals (list[str] | None, optional): columns summing object values per lord. Defaults to None.
+        """
+        self.raw = raw
+        self.counts = counts
+        self.totals = totals or []
+
+    @staticmethod
+    def from_readers(lord: Lord, unit: Unit) -> "TickSchema":
+        """Derive the schema from the memory layouts of the readers.
+
+        Args:
+            lord (Lord): lord reader
+            unit (Unit): unit reader
+
+        Returns:
+            TickSchema: schema of the tick table
+        """
+        raw: dict[str, type] = {"p_ID": ID_DTYPE}
+        for block in [*lord.lord_global, *lord.lord_stat]:
+            for extra_off in block["stat_offsets"]:
+                raw[extra_off["name"]] = stat_dtype(extra_off)
+        counts = [*BUILDING_COUNTS, *dict.fromkeys(unit.unit_names.values()), *UNIT_COUNTS]
+        return TickSchema(raw, counts, [*UNIT_TOTALS, *EVENT_TOTALS])
+
+    def dtypes(self) -> dict[str, type]:
+        """Get the dtype of every known column.
+
+        Returns:
+            dict[str, type]: dtype per column
+        """
+        return {
+            **self.raw,
+            **{col: COUNT_DTYPE for col in self.counts},
+            **{col: TOTAL_DTYPE for col in self.totals},
+        }
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Cast the known columns of a tick table to their compact dtype.
+
+        Args:
+            df (pd.DataFrame): per lord stats
+
+        Returns:
+            pd.DataFrame: per lord stats with compact dtypes, other columns are unchanged
+        """
+        dtypes = {}
+        fill = {}
+        for col, dtype in self.raw.items():
+            if col in df.columns:
+                dtypes[col] = nullable_dtypes[dtype] if df[col].isna().any() else dtype
+        for cols, dtype in ((self.counts, COUNT_DTYPE), (self.totals, TOTAL_DTYPE)):
+            for col in cols:
+                if col in df.columns:
+                    fill[col] = 0
+                    dtypes[col] = dtype
+        return df.fillna(fill).astype(dtypes)
@@ -0,0 +1,406 @@
+"""Resolve the memory addresses of the game tables by byte signatures of the code referencing them.
+
+Signatures are generated once on a game build matching the configured addresses. On other builds
+the signatures are searched in the executable sections of the game image and the resolved
+addresses are cached on disk, keyed by the hash of the executable, so every build is scanned once.
+
+Usage:
+    python -m src.parser.signatures generate   # write signatures for the running, configured build
+    python -m src.parser.signatures resolve    # scan the running build and print the addresses
+"""
+
+import argparse
+import copy
+import hashlib
+import logging
+import pathlib
+import struct
+from typing import Any
+
+import numpy as np
+import psutil
+import yaml
+
+from src import PROCESS_NAME
+
+from .read_data import (
+    MemoryReadError,
+    MemorySource,
+    ProcessMemory,
+    find_pid,
+    read_config,
+)
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = pathlib.Path.cwd() / "cache" / "addresses"
+SIGNATURE_PATH = pathlib.Path.cwd() / "config_files" / "memory" / "signatures.yaml"
+IMAGE_SCN_MEM_EXECUTE = 0x20000000
+MIN_FIXED_BYTES = 6
+
+
+def parse_pattern(pattern: str) -> tuple[np.ndarray, np.ndarray]:
+    """Parse a hex byte pattern with `??` wildcards.
+
+    Args:
+        pattern (str): pattern like ``8B 0D ?? ?? ?? ?? 85 C9``
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: byte values and mask of the fixed bytes
+    """
+    tokens = pattern.split()
+    mask = np.array([token != "??" for token in tokens], dtype=bool)
+    values = np.array([int(token, 16) if token != "??" else 0 for token in tokens], dtype=np.uint8)
+    return values, mask
+
+
+def format_pattern(values: np.ndarray, mask: np.ndarray) -> str:
+    """Format byte values and mask as a hex pattern with `??` wildcards."""
+    return " ".join(f"{value:02X}" if fixed else "??" for value, fixed in zip(values.tolist(), mask.tolist()))
+
+
+def find_pattern(data: bytes, values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Find all matches of a masked byte pattern.
+
+    The longest run of fixed bytes is searched with the substring search of `bytes.find`, a
+    Boyer-Moore style search running in C, and all candidates are verified at once with NumPy.
+
+    Args:
+        data (bytes): memory to search
+        values (np.ndarray): pattern byte values
+        mask (np.ndarray): mask of the fixed pattern bytes
+
+    Returns:
+        np.ndarray: start offsets of all matches
+    """
+    size = len(values)
+    best_start, best_len, run_start = 0, 0, None
+    for i, fixed in enumerate([*mask.tolist(), False]):
+        if fixed and run_start is None:
+            run_start = i
+        elif not fixed and run_start is not None:
+            if i - run_start > best_len:
+                best_start, best_len = run_start, i - run_start
+            run_start = None
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    if best_len == 0:
+        return np.arange(max(len(data) - size + 1, 0))
+    anchor = values[best_start : best_start + best_len].tobytes()  # noqa: E203
+    hits = []
+    pos = data.find(anchor)
+    while pos != -1:
+        start = pos - best_start
+        if 0 <= start <= len(data) - size:
+            hits.append(start)
+        pos = data.find(anchor, pos + 1)
+    if not hits:
+        return np.empty(0, dtype=np.intp)
+    starts = np.array(hits, dtype=np.intp)
+    windows = buffer[starts[:, None] + np.arange(size)]
+    return starts[((windows == values) | ~mask).all(axis=1)]
+
+
+def absolute_references(code: np.ndarray, low: int, high: int) -> np.ndarray:
+    """Find every byte offset holding a little endian 4 byte value within an address range.
+
+    Args:
+        code (np.ndarray): code bytes
+        low (int): first address of the range
+        high (int): end of the range
+
+    Returns:
+        np.ndarray: sorted offsets of the references
+    """
+    sites = []
+    for k in range(4):
+        words = code[k : k + 4 * ((len(code) - k) // 4)].view("<u4")  # noqa: E203
+        sites.append(k + 4 * np.flatnonzero((words >= low) & (words < high)))
+    return np.sort(np.concatenate(sites))
+
+
+def executable_sections(memory: MemorySource, image_base: int) -> tuple[int, list[tuple[int, bytes]]]:
+    """Read the executable sections of a loaded PE image.
+
+    Args:
+        memory (MemorySource): memory holding the image
+        image_base (int): address the image is loaded at
+
+    Returns:
+        tuple[int, list[tuple[int, bytes]]]: size of the image, address and bytes of each executable section
+    """
+    pe_offset = struct.unpack("<I", memory.read_bytes(image_base + 0x3C, 4))[0]
+    header = bytes(memory.read_bytes(image_base + pe_offset, 24))
+    if header[:4] != b"PE\0\0":
+        raise MemoryReadError("No PE image found.", address=image_base)
+    num_sections, optional_size = struct.unpack_from("<H12xH", header, 6)
+    size_of_image = struct.unpack("<I", memory.read_bytes(image_base + pe_offset + 24 + 56, 4))[0]
+    table = bytes(memory.read_bytes(image_base + pe_offset + 24 + optional_size, 40 * num_sections))
+    sections = []
+    for i in range(num_sections):
+        _, virtual_size, virtual_address, *_, characteristics = struct.unpack_from("<8sIIIIIIHHI", table, 40 * i)
+        if characteristics & IMAGE_SCN_MEM_EXECUTE:
+            address = image_base + virtual_address
+            sections.append((address, bytes(memory.read_bytes(address, virtual_size))))
+    return size_of_image, sections
+
+
+def generate_signature(
+    sections: list[tuple[int, bytes]],
+    address: int,
+    image_range: tuple[int, int],
+    window: tuple[int, int] = (0x100, 0x1000),
+    max_context: int = 32,
+) -> dict | None:
+    """Build a unique signature of code referencing an address or a field close to it.
+
+    Bytes of other absolute addresses in the context are wildcarded, since they move between builds.
+
+    Args:
+        sections (list[tuple[int, bytes]]): address and bytes of the executable sections
+        address (int): address to resolve
+        image_range (tuple[int, int]): address range of the image
+        window (tuple[int, int], optional): referenced addresses accepted below and above. Defaults to (0x100, 0x1000).
+        max_context (int, optional): maximum context bytes on each side. Defaults to 32.
+
+    Returns:
+        dict | None: `pattern`, `operand` and `displacement`, None if no unique signature exists
+    """
+    candidates = []
+    for index, (_, data) in enumerate(sections):
+        code = np.frombuffer(data, dtype=np.uint8)
+        relocated = np.zeros(len(code) + 4, dtype=bool)
+        image_references = absolute_references(code, *image_range)
+        for k in range(4):
+            relocated[image_references + k] = True
+        for site in absolute_references(code, address - window[0], address + window[1]).tolist():
+            value = int(code[site : site + 4].view("<u4")[0])  # noqa: E203
+            candidates.append((abs(value - address), index, site, value, relocated))
+    # Fields referenced by many instructions are the most likely to be real table accesses
+    counts: dict[int, int] = {}
+    for candidate in candidates:
+        counts[candidate[3]] = counts.get(candidate[3], 0) + 1
+    candidates.sort(key=lambda candidate: (-counts[candidate[3]], *candidate[:3]))
+    for _, index, site, value, relocated in candidates:
+        data = sections[index][1]
+        code = np.frombuffer(data, dtype=np.uint8)
+        for context in range(4, max_context + 1, 4):
+            start, end = max(site - context, 0), min(site + 4 + context, len(code))
+            values = code[start:end]
+            mask = ~relocated[start:end]
+            mask[site - start : site - start + 4] = False  # noqa: E203
+            if mask.sum() < MIN_FIXED_BYTES:
+                continue
+            matches = sum(len(find_pattern(other, values, mask)) for _, other in sections)
+            if matches == 1:
+                return {
+                    "pattern": format_pattern(values, mask),
+                    "operand": site - start,
+                    "displacement": address - value,
+                }
+    return None
+
+
+def resolve_signature(sections: list[tuple[int, bytes]], signature: dict) -> int | None:
+    """Resolve an address by its signature.
+
+    Args:
+        sections (list[tuple[int, bytes]]): address and bytes of the executable sections
+        signature (dict): `pattern`, `operand` and `displacement` of the signature
+
+    Returns:
+        int | None: resolved address, None unless the signature matches exactly once
+    """
+    values, mask = parse_pattern(signature["pattern"])
+    matches = [(data, int(start)) for _, data in sections for start in find_pattern(data, values, mask)]
+    if len(matches) != 1:
+        return None
+    data, start = matches[0]
+    operand = struct.unpack_from("<I", data, start + signature["operand"])[0]
+    return operand + signature["displacement"]
+
+
+def executable_hash(process_name: str, pid: int | None = None) -> str:
+    """Hash the executable file of the running game.
+
+    Args:
+        process_name (str): name of the game process
+        pid (int | None, optional): id of one of several game processes. Defaults to the first game process.
+
+    Returns:
+        str: sha256 hex digest
+    """
+    digest = hashlib.sha256()
+    with open(psutil.Process(find_pid(process_name, pid)).exe(), "rb") as file:
+        for chunk in iter(lambda: file.read(2**20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def signature_digest(signatures: dict) -> str:
+    """Hash the signature definitions, so cached addresses are rescanned when they change."""
+    return hashlib.sha256(yaml.safe_dump(signatures, sort_keys=True).encode()).hexdigest()
+
+
+def scan_addresses(memory: MemorySource, config: dict) -> dict[str, int]:
+    """Resolve all signatures in the image of the game.
+
+    Args:
+        memory (MemorySource): memory of the game process or a snapshot holding its image
+        config (dict): signature config
+
+    Returns:
+        dict[str, int]: resolved address per signature name
+    """
+    _, sections = executable_sections(memory, config["image_base"])
+    addresses = {}
+    for name, signature in config["signatures"].items():
+        if not signature.get("pattern"):
+            continue
+        address = resolve_signature(sections, signature)
+        if address is None:
+            logger.warning(f"Signature {name} not found, keeping the configured address.")
+        else:
+            addresses[name] = address
+    return addresses
+
+
+def configured_addresses(config: dict) -> dict[str, int]:
+    """Get the addresses of the memory configs resolved by the signatures.
+
+    Args:
+        config (dict): signature config
+
+    Returns:
+        dict[str, int]: configured address per signature name
+    """
+    addresses = {}
+    for name, signature in config["signatures"].items():
+        value: Any = read_config(signature["config"], "memory")
+        for part in signature["key"]:
+            value = value[part]
+        addresses[name] = int(value)
+    return addresses
+
+
+def resolve_addresses(process_name: str = PROCESS_NAME, pid: int | None = None) -> dict[str, int]:
+    """Get the addresses of the running game build, scanning only if the build is not cached yet.
+
+    If no signature has a pattern, the game is not running or the scan fails, e.g. on a game still
+    starting, the configured addresses are returned and nothing is cached.
+
+    Args:
+        process_name (str, optional): name of the game process. Defaults to PROCESS_NAME.
+        pid (int | None, optional): id of one of several game processes, which may run different builds.
+            Defaults to the first game process.
+
+    Returns:
+        dict[str, int]: resolved address per signature name
+    """
+    config = read_config("signatures", "memory")
+    if not any(signature.get("pattern") for signature in config["signatures"].values()):
+        return configured_addresses(config)
+    try:
+        exe_hash = executable_hash(process_name, pid)
+    except (MemoryReadError, OSError, psutil.Error) as e:
+        logger.debug(f"Not resolving addresses by signature: {e}")
+        return configured_addresses(config)
+    digest = signature_digest(config)
+    cache_path = CACHE_DIR / f"{exe_hash}.yaml"
+    if cache_path.exists():
+        with open(cache_path, "r", encoding="utf8") as file:
+            cached = yaml.safe_load(file)
+        if isinstance(cached, dict) and cached.get("signatures") == digest:
+            return cached["addresses"]
+    try:
+        addresses = {**configured_addresses(config), **scan_addresses(ProcessMemory(process_name, pid), config)}
+    except Exception:
+        logger.exception(f"Scanning game build {exe_hash[:12]} failed, using the configured addresses.")
+        return configured_addresses(config)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(cache_path, "w", encoding="utf8") as file:
+        yaml.safe_dump({"signatures": digest, "addresses": addresses}, file)
+    logger.info(f"Resolved {len(addresses)} addresses for game build {exe_hash[:12]}.")
+    return addresses
+
+
+def read_memory_config(name: str, addresses: dict[str, int] | None = None) -> dict:
+    """Read a memory config with its addresses resolved for a game build.
+
+    If the game is not running, or a signature is missing or not found, the configured addresses
+    are kept.
+
+    Args:
+        name (str): memory config file
+        addresses (dict[str, int] | None, optional): resolved address per signature name, see
+            `resolve_addresses`. Defaults to resolving the build of the first game process.
+
+    Returns:
+        dict: contents of the config file
+    """
+    if addresses is None:
+        addresses = resolve_addresses()
+    config = read_config(name, "memory")
+    for signature_name, signature in read_config("signatures", "memory")["signatures"].items():
+        if signature["config"] == name and signature_name in addresses:
+            *path, key = signature["key"]
+            parent = config
+            for part in path:
+                parent = parent[part]
+            parent[key] = addresses[signature_name]
+    return config
+
+
+def generate_signatures(memory: MemorySource) -> dict:
+    """Generate signatures for all configured addresses on a build matching the configs.
+
+    Args:
+        memory (MemorySource): memory of the game process
+
+    Returns:
+        dict: signature config with the generated patterns
+    """
+    config = copy.deepcopy(read_config("signatures", "memory"))
+    size_of_image, sections = executable_sections(memory, config["image_base"])
+    image_range = (config["image_base"], config["image_base"] + size_of_image)
+    for name, address in configured_addresses(config).items():
+        signature = config["signatures"][name]
+        generated = generate_signature(sections, address, image_range)
+        if generated is None:
+            logger.warning(f"No unique signature found for {name} at {hex(address)}.")
+            continue
+        signature.update(generated)
+        logger.info(f"Generated signature for {name}: {generated['pattern']}")
+    return config
+
+
+def write_signatures(config: dict, path: str | pathlib.Path = SIGNATURE_PATH) -> None:
+    """Write a signature config, keeping the comment block at the top of the existing file.
+
+    Args:
+        config (dict): signature config
+        path (str | pathlib.Path, optional): signature file. Defaults to SIGNATURE_PATH.
+    """
+    path = pathlib.Path(path)
+    header = []
+    if path.exists():
+        with open(path, "r", encoding="utf8") as file:
+            for line in file:
+                if not line.startswith("#"):
+                    break
+                header.append(line)
+    with open(path, "w", encoding="utf8") as file:
+        file.writelines(header)
+        yaml.safe_dump(config, file, sort_keys=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate or resolve the address signatures of the game.")
+    parser.add_argument("command", choices=["generate", "resolve"])
+    args = parser.parse_args()
+    if args.command == "generate":
+        write_signatures(generate_signatures(ProcessMemory(PROCESS_NAME)))
+    else:
+        for signature_name, resolved in scan_addresses(
+            ProcessMemory(PROCESS_NAME), read_config("signatures", "memory")
+        ).items():
+            print(f"{signature_name}: {hex(resolved)}")
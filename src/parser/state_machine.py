@@ -5,10 +5,10 @@ class StateMachine:
     def __init__(self):
         self.previous_state = None  # Tracks the last state
 
-    def update_state(self, process_name: str) -> str:
+    def update_state(self, process_name: str, pid: int | None = None) -> str:
         # Read current conditions
-        is_year_zero = read_memory(process_name, 0x24BA938, D_Types.INT) == 0
-        in_game = not is_year_zero and read_memory(process_name, 0x1311607, D_Types.STRING) != "shc_back.tgx"
+        is_year_zero = read_memory(process_name, 0x24BA938, D_Types.INT, pid) == 0
+        in_game = not is_year_zero and read_memory(process_name, 0x1311607, D_Types.STRING, pid) != "shc_back.tgx"
 
         # Determine the next state
         if is_year_zero:
@@ -0,0 +1,136 @@
+"""This script contains the code to assemble the per lord stats of a single game tick."""
+
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from .building import BUILDING_COLUMNS, Building, BuildingAggregates
+from .derived import StrengthScores
+from .lord import Lord
+from .read_data import CHUNK_RECORDS
+from .schema import TickSchema
+from .unit import UNIT_COLUMNS, Unit, UnitAggregates
+
+
+def read_tick(
+    lord: Lord,
+    building: Building,
+    unit: Unit,
+    units: pd.DataFrame | None = None,
+    strength: StrengthScores | None = None,
+    buildings: pd.DataFrame | None = None,
+) -> pd.DataFrame:
+    """Read and aggregate all per lord stats of the current game tick.
+
+    The columns are cast to the compact dtypes of the tick schema.
+
+    Args:
+        lord (Lord): lord reader, with active lords already read
+        building (Building): building reader
+        unit (Unit): unit reader
+        units (pd.DataFrame | None, optional): unit list of this tick. Defaults to reading it from memory.
+        strength (StrengthScores | None, optional): weighted strength stage. Defaults to None.
+        buildings (pd.DataFrame | None, optional): building list of this tick. Defaults to reading it from memory.
+
+    Returns:
+        pd.DataFrame: one row of stats per lord
+    """
+    if buildings is None:
+        buildings = building.list_buildings()
+    if units is None:
+        units = unit.list_units()
+    building_aggregates = BuildingAggregates()
+    building_aggregates.visit({col: buildings[col].to_numpy() for col in BUILDING_COLUMNS})
+    unit_aggregates = UnitAggregates(unit.unit_names)
+    unit_aggregates.visit({col: units[col].to_numpy() for col in UNIT_COLUMNS})
+    return assemble_tick(lord, unit, building_aggregates, unit_aggregates, strength)
+
+
+def read_tick_chunked(
+    lord: Lord,
+    building: Building,
+    unit: Unit,
+    strength: StrengthScores | None = None,
+    unit_visitors: list[Callable[[dict[str, np.ndarray]], None]] | None = None,
+    building_visitors: list[Callable[[dict[str, np.ndarray]], None]] | None = None,
+    chunk_records: int = CHUNK_RECORDS,
+) -> pd.DataFrame:
+    """Read all per lord stats of the current game tick, walking the object tables in chunks.
+
+    Unlike `read_tick` no unit or building list is built, every chunk is folded into the per lord
+    aggregates and passed to the visitors right away, so the peak memory is independent of the
+    number of units and buildings.
+
+    Args:
+        lord (Lord): lord reader, with active lords already read
+        building (Building): building reader
+        unit (Unit): unit reader
+        strength (StrengthScores | None, optional): weighted strength stage. Defaults to None.
+        unit_visitors (list[Callable] | None, optional): further consumers of the unit chunks. Defaults to None.
+        building_visitors (list[Callable] | None, optional): further consumers of the building chunks.
+            Defaults to None.
+        chunk_records (int, optional): table slots per chunk. Defaults to CHUNK_RECORDS.
+
+    Returns:
+        pd.DataFrame: one row of stats per lord
+    """
+    building_aggregates = BuildingAggregates()
+    building.fold_buildings([building_aggregates.visit, *(building_visitors or [])], chunk_records)
+    unit_aggregates = UnitAggregates(unit.unit_names)
+    unit.fold_units([unit_aggregates.visit, *(unit_visitors or [])], chunk_records)
+    return assemble_tick(lord, unit, building_aggregates, unit_aggregates, strength)
+
+
+def assemble_tick(
+    lord: Lord,
+    unit: Unit,
+    building_aggregates: BuildingAggregates,
+    unit_aggregates: UnitAggregates,
+    strength: StrengthScores | None = None,
+) -> pd.DataFrame:
+    """Join the lord stats with the building and unit aggregates of a tick.
+
+    The columns are cast to the compact dtypes of the tick schema.
+
+    Args:
+        lord (Lord): lord reader, with active lords already read
+        unit (Unit): unit reader
+        building_aggregates (BuildingAggregates): building counts of the tick
+        unit_aggregates (UnitAggregates): unit counts of the tick
+        strength (StrengthScores | None, optional): weighted strength stage. Defaults to None.
+
+    Returns:
+        pd.DataFrame: one row of stats per lord
+    """
+    lord_glob_df = lord.get_lord_global_stats()
+    lord_det_df = lord.get_lord_detailed_stats()
+    tick_df = (
+        pd.concat([lord_glob_df, lord_det_df], axis=1)
+        .merge(building_aggregates.stats(), how="left", on="p_ID")
+        .merge(unit_aggregates.stats(), how="left", on="p_ID")
+    )
+    tick_df = TickSchema.from_readers(lord, unit).apply(tick_df)
+    if strength is not None:
+        tick_df = tick_df.merge(
+            strength.compute_counts(
+                tick_df, building_aggregates.counts, unit_aggregates.counts, unit_aggregates.health
+            ),
+            how="left",
+            on="p_ID",
+        )
+    return tick_df
+
+
+def tick_regions(lord: Lord, building: Building, unit: Unit) -> list[tuple[int, int]]:
+    """List all memory blocks needed to decode a tick with `read_tick`.
+
+    Args:
+        lord (Lord): lord reader
+        building (Building): building reader
+        unit (Unit): unit reader
+
+    Returns:
+        list[tuple[int, int]]: address and size of each block
+    """
+    return [*lord.memory_regions(), *building.memory_regions(), *unit.memory_regions()]
@@ -1,10 +1,42 @@
 """Script containing code to manage unit related tasks and calculations."""
 
+from typing import Callable, Iterator
+
 import numpy as np
 import pandas as pd
 
 from src import PROCESS_NAME
-from src.parser.read_data import D_Types, read_config, read_memory, read_memory_chunk
+from src.parser.read_data import (
+    CHUNK_RECORDS,
+    D_Types,
+    MemorySource,
+    ProcessMemory,
+    band_span,
+    iter_records,
+    read_config,
+    type_sizes,
+)
+
+UNIT_COLUMNS = ["p_ID", "ID", "is_ranged", "cur_hp", "max_hp"]
+
+
+def dirty_runs(dirty: np.ndarray, max_gap: int = 0) -> list[tuple[int, int]]:
+    """Group dirty slots into contiguous ranges, merging ranges separated by few clean slots.
+
+    Args:
+        dirty (np.ndarray): dirty flag of every slot
+        max_gap (int, optional): clean slots allowed within one range. Defaults to 0.
+
+    Returns:
+        list[tuple[int, int]]: start and stop slot of every range
+    """
+    idx = np.flatnonzero(dirty)
+    if not len(idx):
+        return []
+    breaks = np.flatnonzero(np.diff(idx) > max_gap + 1)
+    starts = idx[np.concatenate(([0], breaks + 1))]
+    stops = idx[np.concatenate((breaks, [len(idx) - 1]))] + 1
+    return list(zip(starts.tolist(), stops.tolist()))
 
 
 class MemoryAddress:
@@ -37,14 +69,24 @@ class MemoryAddress:
 class Unit:
     """Class to read unit values and calculate statistics."""
 
-    def __init__(self, base: int, offsets: dict, total_units: int) -> None:
+    def __init__(
+        self,
+        base: int,
+        offsets: dict,
+        total_units: int,
+        memory: MemorySource | None = None,
+        incremental: dict | None = None,
+    ) -> None:
         """Initialize the unit class with memory address and offsets.
 
         Args:
             base (int): base memory address
             offsets (dict): dictionary with offset values
             total_units (int): address with total unit value
+            memory (MemorySource | None, optional): memory source. Defaults to the game process.
+            incremental (dict | None, optional): settings of the incremental unit reads. Defaults to full reads.
         """
+        self.memory = memory or ProcessMemory(PROCESS_NAME)
         self.unit_names = read_config("names", "memory")["Units"]
         self.base = base
         self.offset = offsets.pop("offset", 0)
@@ -54,18 +96,42 @@ class Unit:
         ]
 
         self.total_units = total_units
+        incremental = incremental or {}
+        self.incremental = incremental.get("enabled", False)
+        self.header_size = incremental.get("header_size", 0x78)
+        self.hp_size = incremental.get("hp_size", 0x8)
+        self.full_refresh = incremental.get("full_refresh", 60)
+        self.max_gap = incremental.get("max_gap", 4)
+        self.bytes_read = 0
+        self.dirty_units = 0
+        self._headers: np.ndarray | None = None
+        self._rows: np.ndarray | None = None
+        self._cached_reads = 0
 
     @staticmethod
-    def from_dict(config: dict) -> "Unit":
+    def from_dict(config: dict, memory: MemorySource | None = None) -> "Unit":
         """Instantiate the class from a config dicionary.
 
         Args:
             config (dict): configuration dict
+            memory (MemorySource | None, optional): memory source. Defaults to the game process.
 
         Returns:
             Unit: instantiated class object
         """
-        return Unit(config["address"], config["offsets"], config["total"])
+        return Unit(config["address"], config["offsets"], config["total"], memory, config.get("incremental"))
+
+    def memory_regions(self) -> list[tuple[int, int]]:
+        """List the memory blocks holding the unit count and the unit array.
+
+        Returns:
+            list[tuple[int, int]]: address and size of each block
+        """
+        num_units = int(self.memory.read(self.total_units, D_Types.INT))
+        regions = [(self.total_units, 4)]
+        if num_units:
+            regions.append((self.base, num_units * self.offset))
+        return regions
 
     def list_units(self, player_id: int | None = None) -> pd.DataFrame:
         """Read unit data from memory into a dataframe.
@@ -76,7 +142,7 @@ class Unit:
         Returns:
             pd.DataFrame: dataframe with memory values
         """
-        num_units = int(read_memory(PROCESS_NAME, self.total_units, D_Types.INT))
+        num_units = int(self.memory.read(self.total_units, D_Types.INT))
         if num_units == 0:
             return pd.DataFrame(
                 columns=[
@@ -86,41 +152,131 @@ class Unit:
                     *self.value_offsets.keys(),
                 ],
             )
-        offset_list = [0, *self.value_offsets.values()]
-        unit_info = read_memory_chunk(
-            PROCESS_NAME,
-            self.base,
-            [i * self.offset + extra_off for i in range(num_units) for extra_off in offset_list],
-            D_Types.WORD,
-        )
-        unit_arr = np.array(unit_info).reshape((num_units, len(offset_list)))
+        unit_arr = self.read_unit_rows(num_units)
         if player_id is not None:
             mask = unit_arr[:, 2] == player_id
         else:
-            mask = (unit_arr[:, 2] >= 0) & (unit_arr[:, 2] <= 8)
+            mask = unit_arr[:, 2] <= 8
 
         filtered_units = unit_arr[mask]
-
-        unit_names_array = np.vectorize(self.unit_names.get)(filtered_units[:, 0])
-        address_array = (self.base + np.arange(unit_arr.shape[0]) * self.offset)[mask].reshape(-1, 1)
-        unit_arr = np.column_stack((address_array, unit_names_array, filtered_units))
         return pd.DataFrame(
-            unit_arr,
-            columns=[
-                "address",
-                "unit_name",
-                "ID",
-                *self.value_offsets.keys(),
-            ],
-        ).astype(
             {
-                "address": pd.Int64Dtype(),
-                "unit_name": pd.StringDtype(),
-                "ID": pd.Int64Dtype(),
-                **{key: pd.Int64Dtype() for key in self.value_offsets.keys()},
+                "address": (self.base + np.flatnonzero(mask) * self.offset).astype(np.uint32),
+                "unit_name": pd.array(
+                    [self.unit_names.get(unit_id) for unit_id in filtered_units[:, 0].tolist()],
+                    dtype=pd.StringDtype(),
+                ),
+                "ID": filtered_units[:, 0],
+                **{key: filtered_units[:, i] for i, key in enumerate(self.value_offsets.keys(), start=1)},
             }
         )
 
+    def count_units(self) -> int:
+        """Read the number of unit slots."""
+        return int(self.memory.read(self.total_units, D_Types.INT))
+
+    def iter_units(self, chunk_records: int = CHUNK_RECORDS) -> Iterator[dict[str, np.ndarray]]:
+        """Read the unit table chunk by chunk, keeping the units `list_units` keeps.
+
+        In incremental mode the rows are served from the slot cache, which holds the whole table.
+
+        Args:
+            chunk_records (int, optional): unit slots per chunk. Defaults to CHUNK_RECORDS.
+
+        Yields:
+            Iterator[dict[str, np.ndarray]]: `address`, `ID` and value offset columns of the units of a chunk
+        """
+        num_units = self.count_units()
+        if num_units == 0:
+            return
+        offset_list = [0, *self.value_offsets.values()]
+        chunks: Iterator[tuple[int, np.ndarray]]
+        if self.incremental:
+            rows = self.read_unit_rows(num_units)
+            chunks = ((start, rows[start : start + chunk_records]) for start in range(0, num_units, chunk_records))
+        else:
+            chunks = iter_records(
+                self.memory, self.base, self.offset, num_units, offset_list, D_Types.WORD, chunk_records
+            )
+        for start, chunk in chunks:
+            idx = np.flatnonzero(chunk[:, 2] <= 8)
+            yield {
+                "address": (self.base + (start + idx) * self.offset).astype(np.uint32),
+                "ID": chunk[idx, 0],
+                **{key: chunk[idx, i] for i, key in enumerate(self.value_offsets.keys(), start=1)},
+            }
+
+    def fold_units(
+        self, visitors: list[Callable[[dict[str, np.ndarray]], None]], chunk_records: int = CHUNK_RECORDS
+    ) -> None:
+        """Pass every chunk of the unit table to the visitors, without building the unit list.
+
+        Args:
+            visitors (list[Callable[[dict[str, np.ndarray]], None]]): functions folding a chunk into their state
+            chunk_records (int, optional): unit slots per chunk. Defaults to CHUNK_RECORDS.
+        """
+        for units in self.iter_units(chunk_records):
+            for visit in visitors:
+                visit(units)
+
+    def _read_rows(self, start: int, count: int) -> np.ndarray:
+        offset_list = [0, *self.value_offsets.values()]
+        rows = np.empty((count, len(offset_list)), dtype=np.uint16)
+        for first, chunk in iter_records(
+            self.memory, self.base + start * self.offset, self.offset, count, offset_list, D_Types.WORD
+        ):
+            rows[first : first + len(chunk)] = chunk  # noqa: E203
+            self.bytes_read += (len(chunk) - 1) * self.offset + max(offset_list) + type_sizes[D_Types.WORD]
+        return rows
+
+    def read_unit_rows(self, num_units: int) -> np.ndarray:
+        """Read the raw values of all unit slots.
+
+        In incremental mode only the header band at the start of every slot, holding type, color,
+        moving flag, hp bar and owner, and the band holding the exact hit points are compared with
+        the previous tick. Both bands of a chunk of slots are read at once, spanning most of every
+        slot, so this saves decoding rather than reading. Only slots whose bands changed or which are
+        moving are read completely, the other rows are taken from the previous tick. Changes outside
+        both bands are caught by rereading all slots every `full_refresh` ticks.
+
+        Args:
+            num_units (int): number of unit slots
+
+        Returns:
+            np.ndarray: unit type and value offsets of every slot
+        """
+        if not self.incremental:
+            self.dirty_units = num_units
+            return self._read_rows(0, num_units)
+        bands = [(0, self.header_size)]
+        hp = self.value_offsets.get("cur_hp")
+        if hp is not None and hp >= self.header_size:
+            bands.append((hp, self.hp_size))
+        headers = np.frombuffer(
+            self.memory.read_bands(self.base, self.offset, bands, num_units), dtype=np.uint8
+        ).reshape(num_units, -1)
+        # Both bands of a chunk of slots are read at once, including the bytes between them
+        first, end = band_span(bands)
+        for start in range(0, num_units, CHUNK_RECORDS):
+            self.bytes_read += (min(CHUNK_RECORDS, num_units - start) - 1) * self.offset + end - first
+        previous, previous_rows = self._headers, self._rows
+        dirty = np.ones(num_units, dtype=bool)
+        rows = np.empty((num_units, len(self.value_offsets) + 1), dtype=np.uint16)
+        cached = 0
+        if previous is not None and previous_rows is not None and self._cached_reads < self.full_refresh:
+            cached = min(len(previous_rows), num_units)
+            dirty[:cached] = (headers[:cached] != previous[:cached]).any(axis=1)
+            rows[:cached] = previous_rows[:cached]
+        moving = self.value_offsets.get("moving")
+        if moving is not None and moving + 2 <= self.header_size:
+            dirty |= headers[:, moving : moving + 2].copy().view(np.uint16)[:, 0] != 0  # noqa: E203
+        for start, stop in dirty_runs(dirty, self.max_gap):
+            rows[start:stop] = self._read_rows(start, stop - start)
+        self.dirty_units = int(np.count_nonzero(dirty))
+        self._cached_reads = self._cached_reads + 1 if cached else 0
+        self._headers, self._rows = headers, rows
+        return rows
+
     def list_units_exp(self, player_id: int | None = None) -> pd.DataFrame:
         """List the unknown flags data into a dataframe.
 
@@ -130,10 +286,9 @@ class Unit:
         Returns:
             pd.DataFrame: dataframe with memory values
         """
-        num_units = int(read_memory(PROCESS_NAME, self.total_units, D_Types.INT))
+        num_units = int(self.memory.read(self.total_units, D_Types.INT))
         offset_list = [0, *[obj.val_offset for obj in self.unknown]]
-        unit_info = read_memory_chunk(
-            PROCESS_NAME,
+        unit_info = self.memory.read_chunk(
             self.base,
             [i * self.offset + extra_off for i in range(num_units) for extra_off in offset_list],
             D_Types.WORD,
@@ -159,23 +314,93 @@ class Unit:
             ],
         )
 
-    def calculate_units(self, player_id: int | None = None) -> pd.DataFrame:
+    def calculate_units(self, player_id: int | None = None, units: pd.DataFrame | None = None) -> pd.DataFrame:
         """Calculate unit stats from data.
 
         Args:
             player_id (int | None, optional): player to filter. Defaults to None.
+            units (pd.DataFrame | None, optional): already read unit data. Defaults to reading it from memory.
 
         Returns:
             pd.DataFrame: dataframe with the unit stats
         """
-        units = self.list_units(player_id)
-        unit_list = [18, 35, 39, 40, 41, 42, 43, 44, 106, 109, 190, 191, 192, 193, 195, 196, 199]
-        siege_engines = [62, 83, 84, 120, 121, 123, 124, 197]
-        army = units.loc[units.ID.isin(unit_list)]
-        se_army = units.loc[units.ID.isin(siege_engines)]
-        se_stats_df = se_army.groupby(["p_ID", "unit_name"]).size().unstack(fill_value=0)
-        unit_stats_df = army.groupby(["p_ID", "unit_name"]).size().unstack(fill_value=0)
-        unit_stats_df = pd.concat([unit_stats_df, se_stats_df], axis=1)
-        tmp_result = army.groupby(["p_ID", "is_ranged"]).size().unstack(fill_value=0)
-        unit_stats_df[["melee", "ranged"]] = tmp_result.reindex(columns=[0, 1], fill_value=0).fillna(0)
-        return unit_stats_df
+        if units is None:
+            units = self.list_units(player_id)
+        aggregates = UnitAggregates(self.unit_names)
+        aggregates.visit({col: units[col].to_numpy() for col in UNIT_COLUMNS})
+        return aggregates.stats()
+
+
+class UnitAggregates:
+    """Per player unit counts and army health, folded from the unit table one chunk at a time."""
+
+    army_ids = [18, 35, 39, 40, 41, 42, 43, 44, 106, 109, 190, 191, 192, 193, 195, 196, 199]
+    siege_engines = [62, 83, 84, 120, 121, 123, 124, 197]
+
+    def __init__(self, unit_names: dict[int, str], num_ids: int = 256, num_players: int = 9) -> None:
+        """Initialize the empty counts.
+
+        Args:
+            unit_names (dict[int, str]): unit names by type id
+            num_ids (int, optional): number of unit type ids counted. Defaults to 256.
+            num_players (int, optional): number of players including neutral. Defaults to 9.
+        """
+        self.unit_names = unit_names
+        self.num_ids = num_ids
+        self.num_players = num_players
+        self.counts = np.zeros((num_players, num_ids), dtype=np.int64)
+        self.health = np.zeros((num_players, num_ids), dtype=np.float64)
+        self.ranged = np.zeros((num_players, 2), dtype=np.int64)
+        self.army_hp = np.zeros(num_players, dtype=np.int64)
+        self.wounded = np.zeros(num_players, dtype=np.int64)
+
+    def visit(self, units: dict[str, np.ndarray]) -> None:
+        """Add the units of a chunk.
+
+        The health of a unit is its share of its maximum hit points, units without maximum hit
+        points count as unhurt.
+
+        Args:
+            units (dict[str, np.ndarray]): `p_ID`, `ID`, `is_ranged`, `cur_hp` and `max_hp` of each unit
+        """
+        owners = units["p_ID"].astype(np.intp)
+        ids = units["ID"].astype(np.intp)
+        is_ranged = units["is_ranged"].astype(np.intp)
+        cur_hp = units["cur_hp"].astype(np.int64)
+        max_hp = units["max_hp"].astype(np.int64)
+        mask = (owners >= 0) & (owners < self.num_players) & (ids >= 0) & (ids < self.num_ids)
+        flat_idx = owners[mask] * self.num_ids + ids[mask]
+        self.counts += np.bincount(flat_idx, minlength=self.counts.size).reshape(self.counts.shape)
+        health = np.divide(cur_hp[mask], max_hp[mask], out=np.ones(len(flat_idx)), where=max_hp[mask] > 0)
+        self.health += np.bincount(flat_idx, weights=np.minimum(health, 1), minlength=self.health.size).reshape(
+            self.health.shape
+        )
+        in_army = mask & np.isin(ids, self.army_ids)
+        army = in_army & ((is_ranged == 0) | (is_ranged == 1))
+        self.ranged += np.bincount(owners[army] * 2 + is_ranged[army], minlength=self.ranged.size).reshape(
+            self.ranged.shape
+        )
+        self.army_hp += np.bincount(owners[in_army], weights=cur_hp[in_army], minlength=self.num_players).astype(
+            np.int64
+        )
+        wounded = in_army & (cur_hp < max_hp)
+        self.wounded += np.bincount(owners[wounded], minlength=self.num_players)
+
+    def _by_name(self, ids: list[int]) -> pd.DataFrame:
+        names = [self.unit_names.get(unit_id) for unit_id in ids]
+        df = pd.DataFrame(self.counts[:, ids], columns=names).T
+        df = df.loc[df.index.notna()].groupby(level=0).sum().T
+        return df.loc[df.sum(axis=1) > 0, df.sum(axis=0) > 0]
+
+    def stats(self) -> pd.DataFrame:
+        """Get the unit stats of all players with army units or siege engines.
+
+        Returns:
+            pd.DataFrame: count per army unit and siege engine name plus `melee`, `ranged`, `army_hp` and
+                `wounded_units`, indexed by `p_ID`
+        """
+        unit_stats_df = pd.concat([self._by_name(self.army_ids), self._by_name(self.siege_engines)], axis=1)
+        unit_stats_df[["melee", "ranged"]] = self.ranged[unit_stats_df.index]
+        unit_stats_df["army_hp"] = self.army_hp[unit_stats_df.index]
+        unit_stats_df["wounded_units"] = self.wounded[unit_stats_df.index]
+        return unit_stats_df.rename_axis("p_ID")
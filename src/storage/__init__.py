@@ -0,0 +1,16 @@
+"""This module stores finished matches and their pre-aggregated summaries in the database."""
+
+from src import engine
+
+from .export import export_match  # noqa: F401
+from .matches import load_match_ticks, save_match  # noqa: F401
+from .summaries import (  # noqa: F401
+    final_values_by_lord,
+    months_to_threshold,
+    stat_curves_by_map,
+    stored_maps,
+    values_at_year,
+)
+from .tables import metadata
+
+metadata.create_all(engine)
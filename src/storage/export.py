@@ -0,0 +1,162 @@
+"""Export the tick history of a stored match to an Excel workbook.
+
+The workbook holds one sheet per stat category of `stat_categories.yaml` with one row per lord and
+game month, taken from the last tick of the month, or with one row per lord and tick. The workbook
+is written in write-only mode and the rows are generated chunk by chunk from the archived columns,
+neither a data frame of the match nor the cells of the workbook are kept in memory.
+
+Usage:
+    python -m src.storage.export MATCH_ID [--out FILE] [--every-tick]
+"""
+
+import argparse
+import logging
+import pathlib
+from typing import Iterator
+
+import numpy as np
+import sqlalchemy as sa
+from openpyxl import Workbook
+
+from src import APP_CATEGORIES, engine
+
+from .matches import ARCHIVE_DIR
+from .tables import match_lords
+
+logger = logging.getLogger(__name__)
+
+INDEX_COLUMNS = ["time", "month", "end_year", "end_month", "p_ID"]
+CHUNK_ROWS = 4096
+
+
+def lord_names(match_id: int) -> dict[int, str]:
+    """Get the lord names of a stored match.
+
+    Args:
+        match_id (int): id of the match
+
+    Returns:
+        dict[int, str]: lord name per player id
+    """
+    with engine.connect() as conn:
+        rows = conn.execute(
+            sa.select(match_lords.c.p_ID, match_lords.c.lord_name).where(match_lords.c.match_id == match_id)
+        )
+        return {int(p_id): name for p_id, name in rows}
+
+
+def iter_rows(columns: list[np.ndarray], chunk_rows: int = CHUNK_ROWS) -> Iterator[list]:
+    """Generate the rows of a table given column by column.
+
+    Missing values are written as empty cells.
+
+    Args:
+        columns (list[np.ndarray]): values of every column, all of the same length
+        chunk_rows (int, optional): rows converted to python values at once. Defaults to CHUNK_ROWS.
+
+    Yields:
+        Iterator[list]: cell values of one row
+    """
+    num_rows = len(columns[0]) if columns else 0
+    for start in range(0, num_rows, chunk_rows):
+        chunk = []
+        for values in columns:
+            values = values[start : start + chunk_rows]  # noqa: E203
+            if values.dtype.kind == "f" and np.isnan(values).any():
+                missing = np.isnan(values)
+                values = values.astype(object)
+                values[missing] = None
+            chunk.append(values.tolist())
+        yield from map(list, zip(*chunk))
+
+
+def month_rows(p_ids: np.ndarray, months: np.ndarray) -> np.ndarray:
+    """Get the last tick of every lord and game month.
+
+    Args:
+        p_ids (np.ndarray): player id of every archived row, sorted by player and time
+        months (np.ndarray): months since match start of every archived row
+
+    Returns:
+        np.ndarray: indices of the rows closing a month
+    """
+    closing = np.ones(len(p_ids), dtype=bool)
+    closing[:-1] = (p_ids[1:] != p_ids[:-1]) | (months[1:] != months[:-1])
+    return np.flatnonzero(closing)
+
+
+def write_workbook(
+    archive: str | pathlib.Path,
+    path: str | pathlib.Path,
+    lords: dict[int, str] | None = None,
+    categories: dict[str, list[str]] | None = None,
+    every_tick: bool = False,
+) -> int:
+    """Write the archived tick history of a match to a workbook.
+
+    Only the columns of one sheet are loaded from the archive at a time. Stats missing from the
+    archive are left out, categories without any stat get no sheet. Writing a cell takes the bulk
+    of the export time, a sheet of every tick of a long match takes minutes instead of seconds.
+
+    Args:
+        archive (str | pathlib.Path): `.npz` tick archive, see `src.parser.columnar.write_columns`
+        path (str | pathlib.Path): output `.xlsx` file
+        lords (dict[int, str] | None, optional): lord name per player id. Defaults to no names.
+        categories (dict[str, list[str]] | None, optional): stats per sheet. Defaults to APP_CATEGORIES.
+        every_tick (bool, optional): write every tick instead of the last tick of every month. Defaults to False.
+
+    Returns:
+        int: number of written sheets
+    """
+    lords = lords or {}
+    categories = categories or APP_CATEGORIES
+    workbook = Workbook(write_only=True)
+    num_sheets = 0
+    with np.load(archive) as data:
+        p_ids = data["p_ID"]
+        rows = slice(None) if every_tick else month_rows(p_ids, data["month"])
+        index = [col for col in INDEX_COLUMNS if col in data.files]
+        index_values = [data[col][rows] for col in index]
+        lord_column = np.array([lords.get(int(p_id), "") for p_id in p_ids[rows]], dtype=object)
+        for category, stats in categories.items():
+            stats = [stat for stat in stats if stat in data.files]
+            if not stats:
+                logger.debug(f"No stat of {category} in {archive}, the sheet is left out.")
+                continue
+            sheet = workbook.create_sheet(category[:31])
+            sheet.freeze_panes = "A2"
+            sheet.append([*index, "lord_name", *stats])
+            for row in iter_rows([*index_values, lord_column, *(data[stat][rows] for stat in stats)]):
+                sheet.append(row)
+            num_sheets += 1
+    workbook.save(path)
+    return num_sheets
+
+
+def export_match(match_id: int, path: str | pathlib.Path | None = None, every_tick: bool = False) -> pathlib.Path:
+    """Export a stored match to a workbook.
+
+    Args:
+        match_id (int): id of the match
+        path (str | pathlib.Path | None, optional): output `.xlsx` file. Defaults to the archive folder.
+        every_tick (bool, optional): write every tick instead of the last tick of every month. Defaults to False.
+
+    Returns:
+        pathlib.Path: written workbook
+    """
+    archive = ARCHIVE_DIR / f"match_{match_id}.npz"
+    if not archive.exists():
+        raise FileNotFoundError(f"No tick archive of match {match_id} in {ARCHIVE_DIR}.")
+    path = pathlib.Path(path or ARCHIVE_DIR / f"match_{match_id}.xlsx")
+    num_sheets = write_workbook(archive, path, lord_names(match_id), every_tick=every_tick)
+    logger.info(f"Exported match {match_id} with {num_sheets} sheets to {path}.")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a stored match to an Excel workbook.")
+    parser.add_argument("match_id", type=int, help="id of the stored match")
+    parser.add_argument("--out", type=pathlib.Path, help="output file, defaults to the archive folder")
+    parser.add_argument("--every-tick", action="store_true", help="write every tick instead of one row per month")
+    args = parser.parse_args()
+    export_match(args.match_id, args.out, args.every_tick)
@@ -0,0 +1,127 @@
+"""This script contains the functions to store and load finished matches."""
+
+import datetime
+import logging
+import pathlib
+
+import pandas as pd
+import sqlalchemy as sa
+
+from src import engine
+from src.parser.columnar import read_columns, write_columns
+
+from .summaries import update_summaries
+from .tables import match_events, match_lords, matches
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = pathlib.Path.cwd() / "db" / "matches"
+
+
+def with_game_date(game_df: pd.DataFrame, map_df: pd.DataFrame) -> pd.DataFrame:
+    """Attach the game date and the months since match start to every tick.
+
+    Ticks that already carry their game date keep it, otherwise it is taken from the map settings.
+
+    Args:
+        game_df (pd.DataFrame): per lord stats of every tick
+        map_df (pd.DataFrame): map settings, one row per change of the game date
+
+    Returns:
+        pd.DataFrame: ticks with `end_year`, `end_month` and `month` columns
+    """
+    dates = map_df[["time", "start_year", "start_month", "end_year", "end_month"]].sort_values("time")
+    if {"end_year", "end_month"}.issubset(game_df.columns):
+        ticks = game_df.assign(start_year=dates["start_year"].iloc[-1], start_month=dates["start_month"].iloc[-1])
+    else:
+        ticks = pd.merge_asof(game_df.sort_values("time"), dates, on="time", direction="backward")
+    ticks = ticks.dropna(subset=["end_year", "end_month"])
+    ticks["month"] = (ticks["end_year"] - ticks["start_year"]) * 12 + ticks["end_month"] - ticks["start_month"]
+    return ticks.drop(columns=["start_year", "start_month"]).sort_values(["p_ID", "time"], ignore_index=True)
+
+
+def save_match(
+    game_df: pd.DataFrame, map_df: pd.DataFrame, lord_df: pd.DataFrame, events_df: pd.DataFrame | None = None
+) -> int | None:
+    """Store a finished match and update the match summaries.
+
+    The tick history is archived column by column on disk, while the database only holds the
+    match metadata and the pre-aggregated summaries used by the analytics page.
+
+    Args:
+        game_df (pd.DataFrame): per lord stats of every tick
+        map_df (pd.DataFrame): map settings, one row per change of the game date or only the latest
+        lord_df (pd.DataFrame): lord names and teams
+        events_df (pd.DataFrame | None, optional): unit and building events. Defaults to None.
+
+    Returns:
+        int | None: id of the stored match, None if there was nothing to store
+    """
+    if game_df.empty or map_df.empty:
+        return None
+    ticks = with_game_date(game_df, map_df)
+    if ticks.empty:
+        return None
+    last_map = map_df.sort_values("time").iloc[-1]
+    with engine.begin() as conn:
+        match_id = conn.execute(
+            sa.insert(matches)
+            .values(
+                map_name=str(last_map["map_name"]),
+                start_year=int(last_map["start_year"]),
+                start_month=int(last_map["start_month"]),
+                end_year=int(last_map["end_year"]),
+                end_month=int(last_map["end_month"]),
+                num_months=int(ticks["month"].max()),
+                num_ticks=int(ticks["time"].nunique()),
+                recorded_at=datetime.datetime.now(),
+            )
+            .returning(matches.c.match_id)
+        ).scalar_one()
+        if not lord_df.empty:
+            conn.execute(
+                sa.insert(match_lords),
+                [
+                    {
+                        "match_id": match_id,
+                        "p_ID": int(row.p_ID),
+                        "lord_name": str(row.lord_names),
+                        "team": None if pd.isna(row.teams) else int(row.teams),
+                    }
+                    for row in lord_df.itertuples()
+                ],
+            )
+        if events_df is not None and not events_df.empty:
+            conn.execute(
+                sa.insert(match_events),
+                [
+                    {
+                        "match_id": match_id,
+                        "time": int(row.time),
+                        "event": str(row.event),
+                        "p_ID": int(row.p_ID),
+                        "ID": int(row.ID),
+                        "count": int(row.count),
+                        "value": float(row.value),
+                    }
+                    for row in events_df.itertuples()
+                ],
+            )
+        update_summaries(conn, match_id, ticks)
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    write_columns(ticks, ARCHIVE_DIR / f"match_{match_id}.npz")
+    logger.info(f"Stored match {match_id} on {last_map['map_name']} with {len(ticks)} tick rows.")
+    return match_id
+
+
+def load_match_ticks(match_id: int, columns: list[str] | None = None) -> pd.DataFrame:
+    """Load the archived tick history of a stored match.
+
+    Args:
+        match_id (int): id of the match
+        columns (list[str] | None, optional): columns to load. Defaults to all.
+
+    Returns:
+        pd.DataFrame: per lord stats of every tick
+    """
+    return read_columns(ARCHIVE_DIR / f"match_{match_id}.npz", columns)
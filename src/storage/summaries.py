@@ -0,0 +1,182 @@
+"""This script contains the incremental per match summaries and the queries of the analytics page."""
+
+import pandas as pd
+import sqlalchemy as sa
+
+from src import APP_CATEGORIES, engine
+from src.parser.read_data import read_config
+
+from .tables import (
+    match_lords,
+    match_snapshots,
+    match_summary,
+    match_thresholds,
+    matches,
+)
+
+SUMMARY_STATS = [stat for stats in APP_CATEGORIES.values() for stat in stats]
+THRESHOLDS: dict[str, list[int]] = read_config("summary_thresholds", "app")
+
+
+def summarize_match(ticks: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Aggregate the tick history of a single match.
+
+    Args:
+        ticks (pd.DataFrame): per lord stats of every tick with a `month` column
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: summary, yearly snapshot and threshold rows
+    """
+    stats = [stat for stat in SUMMARY_STATS if stat in ticks.columns]
+    long_df = (
+        ticks.sort_values(["p_ID", "time"])
+        .melt(id_vars=["p_ID", "time", "month"], value_vars=stats, var_name="stat")
+        .dropna(subset=["value"])
+    )
+    long_df["value"] = long_df["value"].astype(float)
+    grouped = long_df.groupby(["p_ID", "stat"], sort=False)
+    summary_df = grouped["value"].agg(final_value="last", peak_value="max", mean_value="mean")
+    summary_df["peak_month"] = long_df.loc[grouped["value"].idxmax(), "month"].to_numpy()
+    summary_df = summary_df.reset_index()
+
+    long_df["game_year"] = long_df["month"] // 12
+    snapshot_df = long_df.groupby(["p_ID", "stat", "game_year"], sort=False)["value"].last().reset_index()
+
+    threshold_frames = []
+    for stat, thresholds in THRESHOLDS.items():
+        stat_df = long_df.loc[long_df["stat"] == stat]
+        for threshold in thresholds:
+            reached = stat_df.loc[stat_df["value"] >= threshold].groupby("p_ID")["month"].min()
+            threshold_frames.append(
+                pd.DataFrame({"p_ID": reached.index, "stat": stat, "threshold": threshold, "months": reached.values})
+            )
+    threshold_df = pd.concat(threshold_frames, ignore_index=True) if threshold_frames else pd.DataFrame()
+    return summary_df, snapshot_df, threshold_df
+
+
+def update_summaries(conn: sa.Connection, match_id: int, ticks: pd.DataFrame) -> None:
+    """Add the summaries of a newly stored match, leaving all other matches untouched.
+
+    Args:
+        conn (sa.Connection): open database transaction
+        match_id (int): id of the new match
+        ticks (pd.DataFrame): per lord stats of every tick with a `month` column
+    """
+    for table, df in zip((match_summary, match_snapshots, match_thresholds), summarize_match(ticks)):
+        if df.empty:
+            continue
+        df = df.assign(match_id=match_id)
+        conn.execute(sa.insert(table), df.astype(object).where(df.notna(), None).to_dict("records"))
+
+
+def stored_maps() -> list[str]:
+    """List the maps of all stored matches.
+
+    Returns:
+        list[str]: map names
+    """
+    with engine.connect() as conn:
+        return list(conn.execute(sa.select(matches.c.map_name).distinct().order_by(matches.c.map_name)).scalars())
+
+
+def _filter_maps(query: sa.Select, maps: list[str] | None) -> sa.Select:
+    return query.where(matches.c.map_name.in_(maps)) if maps else query
+
+
+def stat_curves_by_map(stat: str, maps: list[str] | None = None) -> pd.DataFrame:
+    """Average a stat per map and game year over all stored matches and lords.
+
+    Args:
+        stat (str): stat column
+        maps (list[str] | None, optional): maps to include. Defaults to all.
+
+    Returns:
+        pd.DataFrame: map name, game year, mean value and number of matches
+    """
+    query = (
+        sa.select(
+            matches.c.map_name,
+            match_snapshots.c.game_year,
+            sa.func.avg(match_snapshots.c.value).label("value"),
+            sa.func.count(sa.distinct(match_snapshots.c.match_id)).label("num_matches"),
+        )
+        .join(matches, matches.c.match_id == match_snapshots.c.match_id)
+        .where(match_snapshots.c.stat == stat)
+        .group_by(matches.c.map_name, match_snapshots.c.game_year)
+        .order_by(matches.c.map_name, match_snapshots.c.game_year)
+    )
+    with engine.connect() as conn:
+        return pd.read_sql(_filter_maps(query, maps), conn)
+
+
+def final_values_by_lord(stat: str, maps: list[str] | None = None) -> pd.DataFrame:
+    """List the final value of a stat per lord in every stored match.
+
+    Args:
+        stat (str): stat column
+        maps (list[str] | None, optional): maps to include. Defaults to all.
+
+    Returns:
+        pd.DataFrame: lord name and final value
+    """
+    query = (
+        sa.select(match_lords.c.lord_name, match_summary.c.final_value)
+        .join(
+            match_lords,
+            (match_lords.c.match_id == match_summary.c.match_id) & (match_lords.c.p_ID == match_summary.c.p_ID),
+        )
+        .join(matches, matches.c.match_id == match_summary.c.match_id)
+        .where(match_summary.c.stat == stat)
+    )
+    with engine.connect() as conn:
+        return pd.read_sql(_filter_maps(query, maps), conn)
+
+
+def values_at_year(stat: str, game_year: int, maps: list[str] | None = None) -> pd.DataFrame:
+    """List the value of a stat at the end of a game year for every lord in every stored match.
+
+    Args:
+        stat (str): stat column
+        game_year (int): game years since match start
+        maps (list[str] | None, optional): maps to include. Defaults to all.
+
+    Returns:
+        pd.DataFrame: map name and value
+    """
+    query = (
+        sa.select(matches.c.map_name, match_snapshots.c.value)
+        .join(matches, matches.c.match_id == match_snapshots.c.match_id)
+        .where((match_snapshots.c.stat == stat) & (match_snapshots.c.game_year == game_year))
+    )
+    with engine.connect() as conn:
+        return pd.read_sql(_filter_maps(query, maps), conn)
+
+
+def months_to_threshold(stat: str, maps: list[str] | None = None) -> pd.DataFrame:
+    """Average the months needed to reach each threshold of a stat per lord.
+
+    Args:
+        stat (str): stat column
+        maps (list[str] | None, optional): maps to include. Defaults to all.
+
+    Returns:
+        pd.DataFrame: lord name, threshold, mean months and number of lords reaching it
+    """
+    query = (
+        sa.select(
+            match_lords.c.lord_name,
+            match_thresholds.c.threshold,
+            sa.func.avg(match_thresholds.c.months).label("months"),
+            sa.func.count().label("num_reached"),
+        )
+        .join(
+            match_lords,
+            (match_lords.c.match_id == match_thresholds.c.match_id) & (match_lords.c.p_ID == match_thresholds.c.p_ID),
+        )
+        .join(matches, matches.c.match_id == match_thresholds.c.match_id)
+        .where(match_thresholds.c.stat == stat)
+        .group_by(match_lords.c.lord_name, match_thresholds.c.threshold)
+        .order_by(match_thresholds.c.threshold)
+    )
+    with engine.connect() as conn:
+        return pd.read_sql(_filter_maps(query, maps), conn)
@@ -0,0 +1,79 @@
+"""This script contains the database tables of stored matches and their summaries."""
+
+import sqlalchemy as sa
+
+metadata = sa.MetaData()
+
+matches = sa.Table(
+    "matches",
+    metadata,
+    sa.Column("match_id", sa.Integer, primary_key=True, autoincrement=True),
+    sa.Column("map_name", sa.String),
+    sa.Column("start_year", sa.Integer),
+    sa.Column("start_month", sa.Integer),
+    sa.Column("end_year", sa.Integer),
+    sa.Column("end_month", sa.Integer),
+    sa.Column("num_months", sa.Integer),
+    sa.Column("num_ticks", sa.Integer),
+    sa.Column("recorded_at", sa.DateTime),
+)
+
+match_lords = sa.Table(
+    "match_lords",
+    metadata,
+    sa.Column("match_id", sa.Integer, sa.ForeignKey("matches.match_id"), primary_key=True),
+    sa.Column("p_ID", sa.Integer, primary_key=True),
+    sa.Column("lord_name", sa.String),
+    sa.Column("team", sa.Integer),
+)
+
+# Per lord and stat aggregates over the whole match
+match_summary = sa.Table(
+    "match_summary",
+    metadata,
+    sa.Column("match_id", sa.Integer, sa.ForeignKey("matches.match_id"), primary_key=True),
+    sa.Column("p_ID", sa.Integer, primary_key=True),
+    sa.Column("stat", sa.String, primary_key=True),
+    sa.Column("final_value", sa.Float),
+    sa.Column("peak_value", sa.Float),
+    sa.Column("peak_month", sa.Integer),
+    sa.Column("mean_value", sa.Float),
+    sa.Index("ix_match_summary_stat", "stat"),
+)
+
+# Per lord and stat value at the end of every game year, counted from the match start
+match_snapshots = sa.Table(
+    "match_snapshots",
+    metadata,
+    sa.Column("match_id", sa.Integer, sa.ForeignKey("matches.match_id"), primary_key=True),
+    sa.Column("p_ID", sa.Integer, primary_key=True),
+    sa.Column("stat", sa.String, primary_key=True),
+    sa.Column("game_year", sa.Integer, primary_key=True),
+    sa.Column("value", sa.Float),
+    sa.Index("ix_match_snapshots_stat_year", "stat", "game_year"),
+)
+
+# Months after match start until a lord first reached a stat threshold
+match_thresholds = sa.Table(
+    "match_thresholds",
+    metadata,
+    sa.Column("match_id", sa.Integer, sa.ForeignKey("matches.match_id"), primary_key=True),
+    sa.Column("p_ID", sa.Integer, primary_key=True),
+    sa.Column("stat", sa.String, primary_key=True),
+    sa.Column("threshold", sa.Integer, primary_key=True),
+    sa.Column("months", sa.Integer),
+    sa.Index("ix_match_thresholds_stat", "stat", "threshold"),
+)
+
+# Unit and building events per tick, aggregated by event type, lord and object type
+match_events = sa.Table(
+    "match_events",
+    metadata,
+    sa.Column("match_id", sa.Integer, sa.ForeignKey("matches.match_id"), index=True),
+    sa.Column("time", sa.Integer),
+    sa.Column("event", sa.String),
+    sa.Column("p_ID", sa.Integer),
+    sa.Column("ID", sa.Integer),
+    sa.Column("count", sa.Integer),
+    sa.Column("value", sa.Float),
+)
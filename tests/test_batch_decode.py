@@ -0,0 +1,122 @@
+"""Tests of decoding captured game memory, on a small synthetic game."""
+
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.parser.batch_decode import decode_captures, decode_records
+from src.parser.building import Building
+from src.parser.capture import CaptureReader, CaptureWriter
+from src.parser.columnar import read_columns
+from src.parser.lord import Lord
+from src.parser.read_data import D_Types, read_config, struct_formats
+from src.parser.unit import Unit
+
+NUM_TICKS = 5
+NUM_UNITS = 6
+START_YEAR = 1200
+
+
+def pack_field(block: bytearray, offset: int, type_name: str, value: int | str) -> None:
+    if type_name == "string":
+        data = str(value).encode()
+        block[offset : offset + len(data)] = data  # noqa: E203
+    else:
+        struct_formats[D_Types[type_name.upper()]].pack_into(block, offset, value)
+
+
+def game_blocks(lord: Lord, unit: Unit, building: Building, tick: int) -> dict[int, bytes]:
+    """Build the memory of a game with two lords, one game month per tick."""
+    blocks = {address: bytearray(size) for address, size in lord.memory_regions()}
+    map_values = {"map_name": "Valley", "start_year": START_YEAR, "start_month": 0, "end_year": START_YEAR}
+    map_values["end_month"] = tick
+    for field in lord.map_settings["stat_offsets"]:
+        if field["name"] in map_values:
+            pack_field(blocks[lord.map_settings["address"]], field["offset"], field["type"], map_values[field["name"]])
+    basic_values = {"active": [True, True] + [False] * 6, "team": [1, 2] + [-1] * 6}
+    for block in lord.lord_basic:
+        for field in block["stat_offsets"]:
+            for i, value in enumerate(basic_values[field["name"]]):
+                pack_field(blocks[block["address"]], i * lord.lord_basic_off + field["offset"], field["type"], value)
+    for block in lord.lord_name:
+        for i in range(2):
+            pack_field(blocks[block["address"]], i * lord.lord_name_off, "string", f"Lord{i + 1}")
+    for blocks_config, stride in ((lord.lord_global, lord.lord_global_off), (lord.lord_stat, lord.lord_stat_off)):
+        for block in blocks_config:
+            for field in block["stat_offsets"]:
+                for i in range(8):
+                    pack_field(blocks[block["address"]], i * stride + field["offset"], field["type"], 100 * i + tick)
+
+    # Archers alternating between the lords, the first one loses 10 hit points per tick
+    blocks[unit.total_units] = bytearray(struct.pack("<I", NUM_UNITS))
+    units = bytearray(NUM_UNITS * unit.offset)
+    for k in range(NUM_UNITS):
+        base = k * unit.offset
+        struct.pack_into("<H", units, base, 18)
+        struct.pack_into("<H", units, base + unit.value_offsets["p_ID"], k % 2 + 1)
+        struct.pack_into("<H", units, base + unit.value_offsets["cur_hp"], 100 - 10 * tick if k == 0 else 100)
+        struct.pack_into("<H", units, base + unit.value_offsets["max_hp"], 100)
+    blocks[unit.base] = units
+    blocks[building.total_buildings] = bytearray(struct.pack("<I", 2))
+    buildings = bytearray(2 * building.offset)
+    for k in range(2):
+        struct.pack_into("<H", buildings, k * building.offset, 1)
+        struct.pack_into("<H", buildings, k * building.offset + building.owner, k + 1)
+    blocks[building.base] = buildings
+    return {address: bytes(block) for address, block in blocks.items()}
+
+
+@pytest.fixture(scope="module")
+def capture(tmp_path_factory):
+    lord = Lord.from_dict(read_config("lord", "memory"))
+    unit = Unit.from_dict(read_config("unit", "memory"))
+    building = Building.from_dict(read_config("building", "memory"))
+    path = tmp_path_factory.mktemp("captures") / "game.shccap"
+    with CaptureWriter(path) as writer:
+        for tick in range(NUM_TICKS):
+            writer.write_tick(tick, list(game_blocks(lord, unit, building, tick).items()), 1000.0 + tick)
+    with CaptureReader(path) as reader:
+        offsets = reader.record_offsets()
+    return path, offsets
+
+
+def test_decode_records(capture):
+    path, offsets = capture
+    df = decode_records(str(path), offsets)
+    assert len(df) == 2 * NUM_TICKS
+    ticks = df.groupby("time").first()
+    assert ticks.index.tolist() == list(range(NUM_TICKS))
+    assert ticks["timestamp"].tolist() == [1000.0 + tick for tick in range(NUM_TICKS)]
+    # Game months are stored like the collector stores them, year * 12 plus the zero based month
+    assert ticks["month"].tolist() == [START_YEAR * 12 + tick for tick in range(NUM_TICKS)]
+    assert ticks["end_year"].tolist() == [START_YEAR] * NUM_TICKS
+    assert ticks["end_month"].tolist() == [tick + 1 for tick in range(NUM_TICKS)]
+    losses = df.pivot(index="time", columns="p_ID", values="army_hp_lost")
+    np.testing.assert_array_equal(losses[1], [0] + [10] * (NUM_TICKS - 1))
+    np.testing.assert_array_equal(losses[2], [0] * NUM_TICKS)
+
+
+def test_decode_primed_ranges(capture):
+    path, offsets = capture
+    full = decode_records(str(path), offsets)
+    # The second range decodes its preceding record only to diff the army losses against it
+    split = pd.concat(
+        [decode_records(str(path), offsets[:2]), decode_records(str(path), offsets[1:], primed=True)],
+        ignore_index=True,
+    )
+    pd.testing.assert_frame_equal(split, full)
+
+
+def test_decode_captures(capture, tmp_path):
+    path, offsets = capture
+    (out_path,) = decode_captures([path], tmp_path, workers=2, ticks_per_task=2)
+    table = read_columns(out_path)
+    full = decode_records(str(path), offsets)
+    assert len(table) == len(full)
+    pd.testing.assert_series_equal(
+        table.sort_values(["time", "p_ID"])["month"].reset_index(drop=True),
+        full.sort_values(["time", "p_ID"])["month"].reset_index(drop=True),
+        check_dtype=False,
+    )
@@ -0,0 +1,64 @@
+"""Tests of the capture file format and the replay memory source."""
+
+import pytest
+
+from src.parser.capture import CaptureReader, CaptureWriter, SnapshotMemory
+from src.parser.read_data import D_Types, MemoryReadError
+
+
+def write_capture(path, num_ticks: int) -> list[dict[int, bytes]]:
+    ticks = [{0x1000: bytes([tick]) * 16, 0x2000: bytes(range(tick, tick + 8))} for tick in range(num_ticks)]
+    with CaptureWriter(path) as writer:
+        for tick, blocks in enumerate(ticks):
+            writer.capture_tick(tick, SnapshotMemory(blocks), [(0x1000, 16), (0x2004, 4)])
+    return ticks
+
+
+def test_capture_round_trip(tmp_path):
+    path = tmp_path / "game.shccap"
+    ticks = write_capture(path, 3)
+    with CaptureReader(path) as reader:
+        records = [
+            (tick, bytes(memory.read_bytes(0x1000, 16)), memory.read(0x2004, D_Types.INT))
+            for tick, _, memory in reader
+        ]
+        assert len(reader.record_offsets()) == 3
+    assert records == [
+        (tick, blocks[0x1000], int.from_bytes(blocks[0x2000][4:8], "little")) for tick, blocks in enumerate(ticks)
+    ]
+
+
+def test_capture_random_access(tmp_path):
+    path = tmp_path / "game.shccap"
+    write_capture(path, 4)
+    with CaptureReader(path) as reader:
+        offsets = reader.record_offsets()
+        tick, timestamp, memory = reader.read_record(offsets[2])
+        assert tick == 2 and timestamp > 0
+        assert memory.read_chunk(0x1000, [4, 0], D_Types.BYTE) == [2, 2]
+        del memory
+
+
+def test_truncated_record_is_ignored(tmp_path):
+    path = tmp_path / "game.shccap"
+    write_capture(path, 2)
+    data = path.read_bytes()
+    path.write_bytes(data[:-3])
+    with CaptureReader(path) as reader:
+        assert len(reader.record_offsets()) == 1
+
+
+def test_not_a_capture(tmp_path):
+    path = tmp_path / "game.shccap"
+    path.write_bytes(bytes(64))
+    with pytest.raises(ValueError):
+        CaptureReader(path)
+
+
+def test_snapshot_missing_range():
+    memory = SnapshotMemory({0x1000: bytes(16)})
+    assert len(memory.read_bytes(0x1008, 8)) == 8
+    with pytest.raises(MemoryReadError):
+        memory.read_bytes(0x1008, 9)
+    with pytest.raises(MemoryReadError):
+        memory.read_bytes(0x0FFF, 1)
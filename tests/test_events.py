@@ -0,0 +1,98 @@
+"""Tests of the event extraction from consecutive ticks."""
+
+import pandas as pd
+
+from src.parser.events import EVENT_COLUMNS, EventLog, EventTracker
+
+UNIT_BASE = 0x1000
+UNIT_STRIDE = 0x10
+BUILDING_BASE = 0x8000
+BUILDING_STRIDE = 0x8
+
+
+def make_tracker() -> EventTracker:
+    return EventTracker(
+        UNIT_BASE,
+        UNIT_STRIDE,
+        BUILDING_BASE,
+        BUILDING_STRIDE,
+        {18: "archer", 39: "spearman", 62: "trebuchet"},
+        {1: "stockpile", 2: "granary"},
+        num_players=3,
+    )
+
+
+def units(rows: list[tuple[int, int, int, int]]) -> pd.DataFrame:
+    """Build a unit list from slot, type id, owner and hit points."""
+    df = pd.DataFrame(rows, columns=["slot", "ID", "p_ID", "cur_hp"])
+    return df.assign(address=UNIT_BASE + df["slot"] * UNIT_STRIDE)
+
+
+def buildings(rows: list[tuple[int, int, int]]) -> pd.DataFrame:
+    """Build a building list from slot, type id and owner."""
+    df = pd.DataFrame(rows, columns=["slot", "ID", "owner"])
+    return df.assign(address=BUILDING_BASE + df["slot"] * BUILDING_STRIDE)
+
+
+def run_ticks(tracker: EventTracker) -> list[pd.DataFrame]:
+    first = tracker.update(0, units([(0, 18, 1, 100), (1, 39, 2, 50), (2, 62, 1, 80)]), buildings([(0, 1, 1)]))
+    # Archer damaged, spearman died, trebuchet damaged, new archer, stockpile replaced by a granary
+    second = tracker.update(1, units([(0, 18, 1, 70), (2, 62, 1, 60), (3, 18, 2, 100)]), buildings([(0, 2, 2)]))
+    return [first, second]
+
+
+def test_first_tick_has_no_events():
+    tracker = make_tracker()
+    first, _ = run_ticks(tracker)
+    assert first.empty
+    assert list(first.columns) == EVENT_COLUMNS
+
+
+def test_tick_diff():
+    tracker = make_tracker()
+    _, events = run_ticks(tracker)
+    rows = {(row.event, row.p_ID, row.ID): (row.name, row.count, row.value) for row in events.itertuples()}
+    assert rows == {
+        ("spawned", 2, 18): ("archer", 1, 0),
+        ("died", 2, 39): ("spearman", 1, 0),
+        ("damaged", 1, 18): ("archer", 1, 30),
+        ("damaged", 1, 62): ("trebuchet", 1, 20),
+        ("building_built", 2, 2): ("granary", 1, 0),
+        ("building_lost", 1, 1): ("stockpile", 1, 0),
+    }
+    assert (events["time"] == 1).all()
+
+
+def test_army_losses():
+    tracker = make_tracker()
+    run_ticks(tracker)
+    # Siege engines are not part of the army, died units lose their last hit points
+    assert tracker.losses().to_dict("list") == {"p_ID": [1, 2], "army_hp_lost": [30, 50]}
+
+
+def test_reused_slot_counts_as_new_unit():
+    tracker = make_tracker()
+    tracker.update(0, units([(0, 18, 1, 100)]), buildings([]))
+    events = tracker.update(1, units([(0, 18, 2, 100)]), buildings([]))
+    assert sorted(events["event"].astype(str)) == ["died", "spawned"]
+
+
+def test_reset_forgets_previous_tick():
+    tracker = make_tracker()
+    run_ticks(tracker)
+    tracker.reset()
+    assert tracker.update(2, units([(5, 18, 1, 10)]), buildings([])).empty
+    assert tracker.losses()["army_hp_lost"].sum() == 0
+
+
+def test_event_log_since():
+    tracker = make_tracker()
+    log = EventLog(capacity=2)
+    for events in run_ticks(tracker):
+        log.append(events)
+    log.append(tracker.update(2, units([(0, 18, 1, 70), (2, 62, 1, 60)]), buildings([(0, 2, 2)])))
+    assert log.size == 7
+    assert log.frame(since=2)["event"].tolist() == ["died"]
+    pd.testing.assert_frame_equal(log.frame(since=1).iloc[:6].reset_index(drop=True), run_ticks(make_tracker())[1])
+    log.reset()
+    assert log.frame().empty
@@ -0,0 +1,116 @@
+"""Tests of the binary frame format."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.parser.frames import (
+    FrameReader,
+    FrameWriter,
+    decode_varints,
+    encode_cursor,
+    encode_varints,
+    open_frame_file,
+    read_frame_file,
+    unzigzag,
+    zigzag,
+)
+
+COLUMNS = ["gold", "ratio"]
+
+
+def make_ticks(num_ticks: int) -> list[np.ndarray]:
+    rng = np.random.default_rng(0)
+    ticks = []
+    for time in range(num_ticks):
+        values = np.column_stack((rng.integers(0, 5000, 3) + time, rng.normal(0, 100, 3)))
+        values[time % 3, 1] = np.nan
+        ticks.append(values)
+    return ticks
+
+
+def encode_ticks(writer: FrameWriter, ticks: list[np.ndarray]) -> bytes:
+    return b"".join(
+        writer.encode(time, 100.0 + time, 14400 + time, COLUMNS, values) for time, values in enumerate(ticks)
+    )
+
+
+def test_zigzag_round_trip():
+    values = np.array([0, -1, 1, -2, 2**40, -(2**40)], dtype=np.int64)
+    np.testing.assert_array_equal(zigzag(values)[:5], [0, 1, 2, 3, 2**41])
+    np.testing.assert_array_equal(unzigzag(zigzag(values)), values)
+
+
+def test_varint_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 2**63 + 5], dtype=np.uint64)
+    data = encode_varints(values)
+    assert len(data) == 1 + 1 + 1 + 2 + 2 + 10
+    np.testing.assert_array_equal(decode_varints(data, len(values)), values)
+    with pytest.raises(ValueError):
+        decode_varints(data[:-1], len(values))
+
+
+def test_frame_round_trip():
+    ticks = make_ticks(7)
+    data = encode_ticks(FrameWriter({"gold"}, decimals=3, keyframe_interval=3), ticks)
+    frames = FrameReader().feed(data)
+    assert [(time, timestamp, month) for time, timestamp, month, _, _ in frames] == [
+        (time, 100.0 + time, 14400 + time) for time in range(7)
+    ]
+    for (_, _, _, schema, values), expected in zip(frames, ticks):
+        assert schema.columns == COLUMNS
+        np.testing.assert_array_equal(values[:, 0], expected[:, 0])
+        np.testing.assert_allclose(values[:, 1], np.round(expected[:, 1], 3), atol=1e-9)
+
+
+def test_frame_stream_fed_in_pieces():
+    ticks = make_ticks(5)
+    data = encode_ticks(FrameWriter({"gold"}), ticks[:3]) + encode_cursor({"version": 3})
+    reader = FrameReader()
+    frames = []
+    for i in range(0, len(data), 7):
+        frames.extend(reader.feed(data[i : i + 7]))  # noqa: E203
+    assert [frame[0] for frame in frames] == [0, 1, 2]
+    assert reader.cursor == {"version": 3}
+    assert not reader.buffer
+
+
+def test_schema_change_starts_keyframe():
+    writer = FrameWriter({"gold"})
+    data = writer.encode(0, 0.0, 0, ["gold"], np.array([[1.0]]))
+    data += writer.encode(1, 1.0, 0, ["gold", "food"], np.array([[2.0, 3.5]]))
+    frames = FrameReader().feed(data)
+    assert frames[1][3].columns == ["gold", "food"]
+    np.testing.assert_array_equal(frames[1][4], [[2.0, 3.5]])
+
+
+def test_delta_frame_without_keyframe():
+    writer = FrameWriter({"gold"})
+    writer.encode(0, 0.0, 0, ["gold"], np.array([[1.0]]))
+    delta = writer.encode(1, 1.0, 0, ["gold"], np.array([[2.0]]))
+    assert writer.schema is not None
+    with pytest.raises(ValueError):
+        FrameReader().feed(writer.schema.encode() + delta)
+
+
+def test_corrupt_stream():
+    with pytest.raises(ValueError):
+        FrameReader().feed(b"XXXX" + bytes(32))
+
+
+def test_table_round_trip(tmp_path):
+    df = pd.DataFrame(
+        {
+            "p_ID": [1, 2, 1, 2],
+            "time": [0, 0, 1, 1],
+            "timestamp": [10.0, 10.0, 11.0, 11.0],
+            "month": [14400, 14400, 14401, 14401],
+            "gold": [100.0, 200.0, 150.0, np.nan],
+        }
+    )
+    path = tmp_path / "match.frames"
+    with open_frame_file(path) as file:
+        file.write(FrameWriter({"gold"}).encode_table(df, num_players=2))
+    table = read_frame_file(path)
+    # The row without any value is dropped
+    pd.testing.assert_frame_equal(table.reset_index(drop=True), df.iloc[:3].reset_index(drop=True), check_dtype=False)
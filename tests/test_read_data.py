@@ -0,0 +1,66 @@
+"""Tests of the raw memory decoding helpers."""
+
+import struct
+
+import numpy as np
+
+from src.parser.capture import SnapshotMemory
+from src.parser.read_data import (
+    D_Types,
+    band_span,
+    decode_memory_chunk,
+    extract_bands,
+    iter_records,
+)
+
+BASE = 0x1000
+STRIDE = 8
+
+
+def make_records(count: int) -> bytes:
+    """Build `count` records holding the words `i` and `1000 + i` at offsets 0 and 4."""
+    return b"".join(struct.pack("<HxxHxx", i, 1000 + i) for i in range(count))
+
+
+def test_iter_records_chunks():
+    memory = SnapshotMemory({BASE: make_records(10)})
+    chunks = [
+        (start, values.copy()) for start, values in iter_records(memory, BASE, STRIDE, 10, [0, 4], chunk_records=4)
+    ]
+    assert [start for start, _ in chunks] == [0, 4, 8]
+    assert [len(values) for _, values in chunks] == [4, 4, 2]
+    values = np.concatenate([values for _, values in chunks])
+    np.testing.assert_array_equal(values[:, 0], np.arange(10))
+    np.testing.assert_array_equal(values[:, 1], 1000 + np.arange(10))
+
+
+def test_iter_records_reuses_buffer():
+    memory = SnapshotMemory({BASE: make_records(6)})
+    chunks = [values for _, values in iter_records(memory, BASE, STRIDE, 6, [0], chunk_records=3)]
+    # Both views share the buffer, which holds the last chunk
+    np.testing.assert_array_equal(chunks[0][:, 0], [3, 4, 5])
+    np.testing.assert_array_equal(chunks[1][:, 0], [3, 4, 5])
+
+
+def test_iter_records_empty():
+    memory = SnapshotMemory({BASE: make_records(1)})
+    assert list(iter_records(memory, BASE, STRIDE, 0, [0])) == []
+
+
+def test_extract_bands():
+    block = make_records(3)
+    bands = [(0, 2), (4, 2)]
+    assert band_span(bands) == (0, 6)
+    assert extract_bands(block, STRIDE, bands, 3) == b"".join(struct.pack("<HH", i, 1000 + i) for i in range(3))
+
+
+def test_snapshot_read_bands_offset_start():
+    memory = SnapshotMemory({BASE: make_records(3)})
+    assert memory.read_bands(BASE, STRIDE, [(4, 2)], 3) == b"".join(struct.pack("<H", 1000 + i) for i in range(3))
+    assert memory.read_bands(BASE, STRIDE, [(4, 2)], 0) == b""
+
+
+def test_decode_memory_chunk_sorts_offsets():
+    buffer = struct.pack("<I", 7) + b"lord\0xx" + struct.pack("<H", 3)
+    values = decode_memory_chunk(buffer, [11, 0, 4], [D_Types.WORD, D_Types.INT, D_Types.STRING])
+    assert values == [7, "lord", 3]
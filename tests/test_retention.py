@@ -0,0 +1,125 @@
+"""Tests of the tiered retention store."""
+
+import numpy as np
+import pandas as pd
+
+from src.parser.retention import DateIndex, Tier, TieredStore
+
+
+def add_ticks(tier: Tier, ticks: range) -> None:
+    for time in ticks:
+        tier.add(time, float(time), 0, np.array([[float(time)]]))
+
+
+def test_tier_compacts_when_full():
+    tier = Tier(bucket=2, capacity=4, compact=True, num_players=1, num_cols=1)
+    add_ticks(tier, range(8))
+    assert tier.size == 4
+    add_ticks(tier, range(8, 10))
+    order = tier._order()
+    assert tier.bucket == 4
+    np.testing.assert_array_equal(tier.times[order], [0, 4, 8])
+    np.testing.assert_array_equal(tier.mean[order, 0, 0], [1.5, 5.5, 8.5])
+    np.testing.assert_array_equal(tier.min[order, 0, 0], [0, 4, 8])
+    np.testing.assert_array_equal(tier.max[order, 0, 0], [3, 7, 9])
+    # The merged bucket keeps the timestamp of its last tick
+    np.testing.assert_array_equal(tier.timestamps[order], [3, 7, 9])
+
+
+def test_tier_compact_keeps_odd_bucket():
+    tier = Tier(bucket=1, capacity=3, compact=True, num_players=1, num_cols=1)
+    add_ticks(tier, range(3))
+    tier._compact()
+    order = tier._order()
+    np.testing.assert_array_equal(tier.times[order], [0, 2])
+    np.testing.assert_array_equal(tier.mean[order, 0, 0], [0.5, 2])
+
+
+def test_tier_compact_ignores_missing_values():
+    tier = Tier(bucket=2, capacity=2, compact=True, num_players=1, num_cols=1)
+    for time, value in enumerate([np.nan, np.nan, 4.0, np.nan]):
+        tier.add(time, float(time), 0, np.array([[value]]))
+    tier._compact()
+    assert tier.size == 1
+    assert tier.mean[0, 0, 0] == 4.0
+    assert tier.min[0, 0, 0] == 4.0
+
+
+def test_tier_ring_drops_oldest():
+    tier = Tier(bucket=1, capacity=3, compact=False, num_players=1, num_cols=1)
+    add_ticks(tier, range(5))
+    assert tier.oldest_time == 2
+    np.testing.assert_array_equal(tier.times[tier.select(3, None)], [3, 4])
+    np.testing.assert_array_equal(tier.times[tier.select(None, 4)], [2, 3])
+    assert tier.times[tier.locate(4)] == 4
+    assert tier.locate(1) is None
+
+
+def make_store(num_ticks: int) -> TieredStore:
+    store = TieredStore([{"bucket": 1, "capacity": 4}, {"bucket": 2, "capacity": 8}], num_players=2)
+    for time in range(num_ticks):
+        tick_df = pd.DataFrame({"p_ID": [1, 2], "gold": [10 * time + 1, 10 * time + 2]})
+        store.append(time, 100.0 + time, 14400 + time // 4, tick_df)
+    return store
+
+
+def test_store_frame_merges_tiers():
+    df = make_store(10).frame()
+    lord = df.loc[df["p_ID"] == 1]
+    # Ticks older than the finest tier are served as the mean of their bucket
+    assert lord["time"].tolist() == [0, 2, 4, 6, 7, 8, 9]
+    assert lord["gold"].tolist() == [6, 26, 46, 61, 71, 81, 91]
+    assert lord["month"].tolist() == [14400, 14400, 14401, 14401, 14401, 14402, 14402]
+    assert df.loc[df["p_ID"] == 2, "gold"].tolist() == [7, 27, 47, 62, 72, 82, 92]
+
+
+def test_store_frame_since_and_until():
+    df = make_store(10).frame(since=4, until=8)
+    assert df.loc[df["p_ID"] == 1, "time"].tolist() == [4, 6, 7]
+
+
+def test_store_frame_max_points_and_range():
+    df = make_store(10).frame(max_points=5, with_range=True)
+    lord = df.loc[df["p_ID"] == 1]
+    assert lord["time"].tolist() == [0, 2, 4, 6, 8]
+    assert lord["gold_min"].tolist() == [1, 21, 41, 61, 81]
+    assert lord["gold_max"].tolist() == [11, 31, 51, 71, 91]
+
+
+def test_store_frame_empty():
+    store = TieredStore([{"bucket": 1, "capacity": 4}])
+    assert store.frame().empty
+    assert store.latest().empty
+
+
+def make_index() -> DateIndex:
+    index = DateIndex(capacity=2)
+    for time, month in enumerate([100, 100, 101, 103]):
+        index.add(month, time)
+    return index
+
+
+def test_date_index_add():
+    index = make_index()
+    np.testing.assert_array_equal(index.months, [100, 101, 103])
+    np.testing.assert_array_equal(index.times, [0, 2, 3])
+    assert index.start_of(101) == 2
+    assert index.start_of(102) is None
+
+
+def test_date_index_tick_range():
+    index = make_index()
+    assert index.tick_range(100, 100) == (0, 2)
+    assert index.tick_range(100, 101) == (0, 3)
+    assert index.tick_range(101, 103) == (2, None)
+    # A month without ticks selects an empty range
+    assert index.tick_range(102, 102) == (3, 3)
+    assert index.tick_range(104, 105) == (4, None)
+
+
+def test_date_index_tick_at():
+    index = make_index()
+    assert index.tick_at(99) is None
+    assert index.tick_at(100) == 1
+    assert index.tick_at(102) == 2
+    assert index.tick_at(103) == 3
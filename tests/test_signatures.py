@@ -0,0 +1,68 @@
+"""Tests of the byte signature search."""
+
+import struct
+
+import numpy as np
+
+from src.parser.signatures import (
+    absolute_references,
+    find_pattern,
+    format_pattern,
+    generate_signature,
+    parse_pattern,
+    resolve_signature,
+)
+
+
+def test_parse_and_format_pattern():
+    values, mask = parse_pattern("8B 0D ?? ?? ?? ?? 85 c9")
+    np.testing.assert_array_equal(values, [0x8B, 0x0D, 0, 0, 0, 0, 0x85, 0xC9])
+    np.testing.assert_array_equal(mask, [True, True, False, False, False, False, True, True])
+    assert format_pattern(values, mask) == "8B 0D ?? ?? ?? ?? 85 C9"
+
+
+def test_find_pattern():
+    data = b"\x00\x8b\x0d\x01\x02\x03\x04\x85\xc9\x8b\x0d\xff\xff\xff\xff\x85\xc9\x8b\x0d\x00\x00\x00\x00\x85\x00"
+    values, mask = parse_pattern("8B 0D ?? ?? ?? ?? 85 C9")
+    np.testing.assert_array_equal(find_pattern(data, values, mask), [1, 9])
+
+
+def test_find_pattern_anchor_not_at_start():
+    # The longest fixed run is searched first and the match start recovered from its position
+    data = bytes([1, 2, 0xAA, 3, 4, 5, 0xAA, 9, 4, 5])
+    values, mask = parse_pattern("AA ?? 04 05")
+    np.testing.assert_array_equal(find_pattern(data, values, mask), [2, 6])
+
+
+def test_find_pattern_edges():
+    values, mask = parse_pattern("?? 01 02")
+    # A match would start before the data
+    assert len(find_pattern(bytes([1, 2, 0, 1, 2]), values, mask)) == 1
+    assert len(find_pattern(bytes([3, 3, 3]), values, mask)) == 0
+    values, mask = parse_pattern("?? ??")
+    np.testing.assert_array_equal(find_pattern(bytes(4), values, mask), [0, 1, 2])
+
+
+def test_absolute_references():
+    code = np.frombuffer(b"\x90" + struct.pack("<I", 0x401000) + b"\x90\x90" + struct.pack("<I", 0x500000), np.uint8)
+    np.testing.assert_array_equal(absolute_references(code, 0x400000, 0x500000), [1])
+    np.testing.assert_array_equal(absolute_references(code, 0x400000, 0x500001), [1, 7])
+
+
+def test_generate_and_resolve_signature():
+    rng = np.random.default_rng(1)
+    code = bytearray(rng.integers(0, 0x40, 4096, dtype=np.uint8).tobytes())
+    # mov ecx, [0x24ba560 + 4] followed by test ecx, ecx
+    code[1000:1008] = b"\x8b\x0d" + struct.pack("<I", 0x24BA564) + b"\x85\xc9"
+    sections = [(0x401000, bytes(code))]
+    signature = generate_signature(sections, 0x24BA560, (0x400000, 0x3000000))
+    assert signature is not None
+    assert signature["displacement"] == -4
+    assert resolve_signature(sections, signature) == 0x24BA560
+
+    # A build moving the table is resolved to the new address
+    moved = bytearray(code)
+    moved[1002:1006] = struct.pack("<I", 0x24BB564)
+    assert resolve_signature([(0x401000, bytes(moved))], signature) == 0x24BB560
+    # Ambiguous matches are not resolved
+    assert resolve_signature([(0x401000, bytes(code)), (0x402000, bytes(code))], signature) is None